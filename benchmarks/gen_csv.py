@@ -0,0 +1,116 @@
+"""
+Script for generating synthetic strings csv files to benchmark the generator with.
+"""
+import argparse
+import csv
+import random
+from typing import List
+
+# Characters of the generated words
+ASCII_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+# Non-ASCII characters that every game encoding supports (iso-8859-1 and UTF-16)
+NON_ASCII_LETTERS = "àâçéèêëîïôùûüäöß"
+
+LENGTH_DISTRIBUTIONS = [
+    "uniform", # every length between the min and max length is as likely
+    "exponential", # mostly short strings with a long tail, like menu labels and dialogue
+]
+
+# Address of the first string with a target address, past the default strings address of every game
+MANUAL_ADDRESS = 0x1000000
+
+def gen_string(rng: random.Random, length: int, non_ascii_share: float) -> str:
+    """
+    Returns a string of words with the given number of characters, where about
+    non_ascii_share of the letters are non-ASCII
+    """
+    chars = []
+    while len(chars) < length:
+        if len(chars) != 0 and rng.random() < 0.15:
+            chars.append(" ")
+        elif rng.random() < non_ascii_share:
+            chars.append(rng.choice(NON_ASCII_LETTERS))
+        else:
+            chars.append(rng.choice(ASCII_LETTERS))
+    return "".join(chars)
+
+def gen_length(rng: random.Random, distribution: str, min_length: int, max_length: int, mean_length: float) -> int:
+    """
+    Returns a string length from the distribution, between min_length and max_length
+    """
+    if distribution == "uniform":
+        return rng.randint(min_length, max_length)
+    length = min_length + int(rng.expovariate(1 / max(mean_length - min_length, 1)))
+    return min(length, max_length)
+
+def gen_rows(num_rows: int, min_length: int = 4, max_length: int = 200, mean_length: float = 40, distribution: str = "exponential",
+             id_density: float = 1.0, manual_fraction: float = 0.0, non_ascii_share: float = 0.0, first_id: int = 1000, seed: int = 0) -> List[List[str]]:
+    """
+    Returns the rows of a synthetic strings csv. The string IDs are spread so about id_density
+    of the IDs between the first and last one are used, and about manual_fraction of the rows
+    have a target address (laid out one after the other).
+    """
+    if distribution not in LENGTH_DISTRIBUTIONS:
+        raise ValueError(f"Error: Length distribution not supported ({distribution})")
+    if not 0 < id_density <= 1:
+        raise ValueError(f"Error: ID density must be more than 0 and at most 1 ({id_density})")
+    if min_length > max_length:
+        raise ValueError(f"Error: Min length is more than max length ({min_length} > {max_length})")
+
+    rng = random.Random(seed)
+    id_range = max(num_rows, int(num_rows / id_density))
+    string_ids = sorted(rng.sample(range(first_id, first_id + id_range), num_rows))
+
+    rows = []
+    address = MANUAL_ADDRESS
+    for string_id in string_ids:
+        string = gen_string(rng, gen_length(rng, distribution, min_length, max_length, mean_length), non_ascii_share)
+        if rng.random() < manual_fraction:
+            rows.append([str(string_id), string, f"{address:X}"])
+            # Leave room for UTF-16 characters with the byte order mark and terminator, word aligned
+            address += (len(string) * 2 + 4 + 3) & ~3
+        else:
+            rows.append([str(string_id), string])
+    return rows
+
+def write_csv(csv_file: str, rows: List[List[str]]) -> None:
+    """
+    Writes the rows to a csv file
+    """
+    with open(csv_file, "w", encoding="utf-8", newline="") as file:
+        csv.writer(file, lineterminator="\n").writerows(rows)
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the options of the synthetic csv to an argument parser
+    """
+    parser.add_argument("--min-length", type=int, default=4, help="Shortest string length (default is 4)")
+    parser.add_argument("--max-length", type=int, default=200, help="Longest string length (default is 200)")
+    parser.add_argument("--mean-length", type=float, default=40, help="Mean string length of the exponential distribution (default is 40)")
+    parser.add_argument("--length-dist", type=str, choices=LENGTH_DISTRIBUTIONS, default="exponential", help="Distribution of the string lengths (default is exponential)")
+    parser.add_argument("--id-density", type=float, default=1.0, help="Share of the IDs between the first and last string ID that are used (default is 1.0)")
+    parser.add_argument("--manual-fraction", type=float, default=0.0, help="Share of the rows with a target address (default is 0.0)")
+    parser.add_argument("--non-ascii", type=float, default=0.0, help="Share of the letters that are non-ASCII (default is 0.0)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator (default is 0)")
+
+def gen_rows_from_args(num_rows: int, args: argparse.Namespace) -> List[List[str]]:
+    """
+    Returns the rows of a synthetic csv with the options parsed by add_corpus_arguments
+    """
+    return gen_rows(num_rows, args.min_length, args.max_length, args.mean_length, args.length_dist,
+        args.id_density, args.manual_fraction, args.non_ascii, seed=args.seed)
+
+def main():
+    """
+    Main function, writes a synthetic strings csv
+    """
+    parser = argparse.ArgumentParser(description="Generates a synthetic strings csv for benchmarks.")
+    parser.add_argument("output_file", type=str, help="Path of the csv file to write")
+    parser.add_argument("-n", "--rows", type=int, default=1000, help="Number of rows (default is 1000)")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    write_csv(args.output_file, gen_rows_from_args(args.rows, args))
+
+if __name__ == "__main__":
+    main()
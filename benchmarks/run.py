@@ -0,0 +1,170 @@
+"""
+Script for timing each stage of a build on synthetic csv files of different sizes, for both patch
+formats with and without a language. The results are written to a JSON file, and can be compared
+against the results of an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from benchmarks.gen_csv import add_corpus_arguments, gen_rows_from_args, write_csv
+from generator import Generator, Strings, Trampoline
+from generator.generator import VERSION
+
+DEFAULT_ROWS = [100, 1000, 10000, 100000]
+
+# Build configurations: name, game, region, language and patch format
+CONFIGS = [
+    ("pnach", 2, "ntsc", None, "pnach"),
+    ("clps2c", 2, "ntsc", None, "clps2c"),
+    ("pnach-lang", 2, "pal", "fr", "pnach"),
+    ("clps2c-lang", 2, "pal", "fr", "clps2c"),
+]
+
+# Stages in the order they run
+STAGES = [
+    "Strings.gen_pnach_chunks", # read the csv and lay out the strings
+    "Trampoline.gen_asm", # assembly text of the linear trampoline
+    "Generator.assemble", # assemble the trampoline with Keystone (only for --keystone-check)
+    "Generator._gen_code", # encode the trampoline (what builds use)
+    "Generator.generate_patches", # the whole build in memory
+    "Chunk.get_code_lines", # patch lines of every chunk
+    "Pnach.__str__", # text of every patch
+    "write", # stream the patches to a file
+]
+
+def time_stage(func: Callable, repeat: int) -> float:
+    """
+    Runs the function the given number of times and returns the fastest time in milliseconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def has_keystone() -> bool:
+    """
+    Returns whether Keystone can be imported
+    """
+    try:
+        import keystone # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return False
+    return True
+
+def run_case(csv_file: str, game: int, region: str, lang: Optional[str], patch_format: str, out_dir: str, repeat: int, keystone: bool) -> Dict[str, Optional[float]]:
+    """
+    Times each stage of a build of the csv file, and returns the time of each stage in
+    milliseconds (None for stages that were skipped)
+    """
+    generator = Generator(game, region, lang)
+    hook_delayslot = generator.game_info.hook_delayslot
+    timings = {}
+
+    def gen_strings():
+        strings_obj = Strings(csv_file, generator.strings_adr, "utf-8", generator.game_info.encoding)
+        return strings_obj.gen_pnach_chunks(patch_format)
+    timings["Strings.gen_pnach_chunks"] = time_stage(gen_strings, repeat)
+    auto_strings_chunk, _, string_pointers = gen_strings()
+
+    asm = Trampoline(string_pointers).gen_asm(hook_delayslot)
+    timings["Trampoline.gen_asm"] = time_stage(lambda: Trampoline(string_pointers).gen_asm(hook_delayslot), repeat)
+    timings["Generator.assemble"] = time_stage(lambda: Generator.assemble(asm), repeat) if keystone else None
+
+    table_address = (auto_strings_chunk.get_address() + auto_strings_chunk.size + 3) & ~3
+    timings["Generator._gen_code"] = time_stage(lambda: generator._gen_code(string_pointers, table_address, patch_format), repeat) # pylint: disable=protected-access
+
+    timings["Generator.generate_patches"] = time_stage(lambda: generator.generate_patches(csv_file, patch_format=patch_format), repeat)
+    patches = generator.generate_patches(csv_file, patch_format=patch_format)
+    chunks = [chunk for patch in patches for chunk in patch.get_chunks()]
+    timings["Chunk.get_code_lines"] = time_stage(lambda: [chunk.get_code_lines() for chunk in chunks], repeat)
+    timings["Pnach.__str__"] = time_stage(lambda: [str(patch) for patch in patches], repeat)
+
+    def write():
+        with open(os.path.join(out_dir, f"out.{patch_format}"), "w", encoding="iso-8859-1", newline="\n") as file:
+            for patch in patches:
+                patch.write(file)
+    timings["write"] = time_stage(write, repeat)
+
+    return timings
+
+def get_metadata(args: argparse.Namespace) -> Dict:
+    """
+    Returns the details of the run that are saved with the results
+    """
+    return {
+        "version": VERSION,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {key: getattr(args, key) for key in ["min_length", "max_length", "mean_length", "length_dist", "id_density", "manual_fraction", "non_ascii", "seed"]},
+        "repeat": args.repeat,
+    }
+
+def compare_results(old_results: List[Dict], new_results: List[Dict]) -> None:
+    """
+    Prints the time of each stage in both runs and how much faster or slower it got
+    """
+    old_timings = {(result["config"], result["rows"]): result["stages"] for result in old_results}
+    print(f"{'case':<20} {'stage':<28} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for result in new_results:
+        old_stages = old_timings.get((result["config"], result["rows"]))
+        if old_stages is None:
+            continue
+        for stage in STAGES:
+            old_ms, new_ms = old_stages.get(stage), result["stages"].get(stage)
+            if old_ms is None or new_ms is None:
+                continue
+            change = f"{(new_ms / old_ms - 1) * 100:+.0f}%" if old_ms > 0 else "-"
+            print(f"{result['config'] + '/' + str(result['rows']):<20} {stage:<28} {old_ms:>10.2f} {new_ms:>10.2f} {change:>8}")
+
+def main():
+    """
+    Main function, runs the benchmarks and writes the results
+    """
+    parser = argparse.ArgumentParser(description="Times each stage of a build on synthetic strings csv files.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Numbers of rows to benchmark (default is 100 1000 10000 100000)")
+    parser.add_argument("--config", type=str, nargs="+", choices=[config[0] for config in CONFIGS], help="Build configurations to benchmark (default is all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each stage runs, the fastest time is kept (default is 3)")
+    parser.add_argument("--no-keystone", action="store_true", help="Skip assembling with Keystone")
+    parser.add_argument("-o", "--output", type=str, default="benchmark_results.json", help="JSON file to write the results to (default is benchmark_results.json)")
+    parser.add_argument("--compare", type=str, help="JSON results of an earlier run to compare against")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    keystone = not args.no_keystone and has_keystone()
+    if not args.no_keystone and not keystone:
+        print("Keystone isn't installed, skipping Generator.assemble")
+    configs = [config for config in CONFIGS if args.config is None or config[0] in args.config]
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for num_rows in args.rows:
+            csv_file = os.path.join(temp_dir, f"strings_{num_rows}.csv")
+            write_csv(csv_file, gen_rows_from_args(num_rows, args))
+            for name, game, region, lang, patch_format in configs:
+                timings = run_case(csv_file, game, region, lang, patch_format, temp_dir, args.repeat, keystone)
+                results.append({"config": name, "rows": num_rows, "game": game, "region": region, "lang": lang, "format": patch_format, "stages": timings})
+                stages = ", ".join(f"{stage} {ms:.2f}" for stage, ms in timings.items() if ms is not None)
+                print(f"{name}/{num_rows}: {stages} (ms)")
+                sys.stdout.flush()
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"meta": get_metadata(args), "results": results}, file, indent=2)
+    print(f"Wrote results to {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            old_results = json.load(file)["results"]
+        compare_results(old_results, results)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 """
 Pnach generator module
 """
-from .generator import Generator
+from .generator import Generator, BuildResult
 from .strings import Strings
 from .trampoline import Trampoline
 from .pnach import Pnach
+from .perfect_hash import PerfectHash
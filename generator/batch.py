@@ -0,0 +1,240 @@
+"""
+This file contains the functions for building many targets at once (every combination of csv
+files, games, regions, languages and formats), spread over a pool of worker processes.
+
+A manifest is a JSON file with optional defaults and a list of targets:
+
+    {
+        "defaults": {"output_dir": "./out/", "author": "Me"},
+        "targets": [
+            {"csv": "mods/*.csv", "game": 2, "region": ["ntsc", "pal"], "lang": ["fr", "it"], "format": ["pnach", "clps2c"]}
+        ]
+    }
+
+Each target takes the same options as the Generator and generate_patch_file. The csv (a glob),
+game, region, lang and format can be lists, and every combination of them is built.
+"""
+import glob
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+from generator.generator import Generator, GAME_INFO
+
+# Options of a target that can be lists, in the order they are combined
+MATRIX_KEYS = ["csv", "game", "region", "lang", "format"]
+
+# Options of a target that are passed to the Generator, and the parameter each one is passed as
+GENERATOR_PARAMS = {
+    "game": "game",
+    "region": "region",
+    "lang": "lang",
+    "strings_address": "strings_address",
+    "code_address": "code_address",
+    "lookup": "lookup",
+    "range_threshold": "range_threshold",
+    "keystone_check": "keystone_check",
+    "cache_dir": "cache_dir",
+    "compress_strings": "compress_strings",
+    "baseline_dump": "baseline_dump",
+    "static_placement": "static_placement",
+    "lang_gate": "lang_gate",
+    "multi_lang": "multi_lang",
+    "string_table_dump": "string_table_dump",
+    "string_table": "string_table_address",
+    "stable_layout": "stable_layout",
+}
+
+# Default options of a target
+TARGET_DEFAULTS = {
+    "lang": None,
+    "format": "pnach",
+    "name": None,
+    "author": "Sly String Toolkit",
+    "output_dir": "./out/",
+    "csv_encoding": "utf-8",
+    "strings_address": None,
+    "code_address": None,
+    "lookup": "linear",
+    "range_threshold": 3,
+    "keystone_check": False,
+    "compress_strings": False,
+    "baseline_dump": None,
+    "static_placement": "continuous",
+    "lang_gate": "all",
+    "multi_lang": False,
+    "string_table_dump": None,
+    "string_table": None,
+    "stable_layout": False,
+    "cache_dir": None,
+}
+
+def load_manifest(manifest_file: str) -> List[Dict]:
+    """
+    Loads a manifest and returns its targets with the defaults applied. Relative paths
+    are relative to the manifest's directory.
+    """
+    with open(manifest_file, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    defaults = manifest.get("defaults", {})
+    specs = []
+    for target in manifest.get("targets", []):
+        spec = {**defaults, **target}
+        for key in ["csv", "output_dir", "baseline_dump", "string_table_dump"]:
+            if key in spec and spec[key] is not None:
+                if isinstance(spec[key], list):
+                    spec[key] = [os.path.join(base_dir, path) for path in spec[key]]
+                else:
+                    spec[key] = os.path.join(base_dir, spec[key])
+        specs.append(spec)
+    return specs
+
+def expand_targets(spec: Dict) -> List[Dict]:
+    """
+    Returns every combination of the csv files (matched by the globs), games, regions,
+    languages and formats of the target spec, as targets with a single value for each
+    """
+    unknown = set(spec) - set(TARGET_DEFAULTS) - set(MATRIX_KEYS)
+    if len(unknown) != 0:
+        raise ValueError(f"Error: Unknown target options ({', '.join(sorted(unknown))})")
+    for key in ["csv", "game", "region"]:
+        if spec.get(key) is None:
+            raise ValueError(f"Error: Target is missing the {key} option")
+
+    values = []
+    for key in MATRIX_KEYS:
+        value = spec.get(key, TARGET_DEFAULTS.get(key))
+        values.append(value if isinstance(value, list) else [value])
+
+    # Expand the csv globs
+    csv_files = []
+    for pattern in values[0]:
+        matches = sorted(glob.glob(pattern))
+        if len(matches) == 0:
+            raise ValueError(f"Error: No csv files match {pattern}")
+        csv_files += [os.path.abspath(match) for match in matches]
+    values[0] = csv_files
+
+    targets = []
+    for combination in itertools.product(*values):
+        target = {**TARGET_DEFAULTS, **spec, **dict(zip(MATRIX_KEYS, combination))}
+        target["region"] = target["region"].lower()
+
+        # Languages only apply to PAL, so NTSC targets are built once without one
+        if target["region"] == "ntsc":
+            target["lang"] = None
+        if target not in targets:
+            targets.append(target)
+    return targets
+
+def get_target_label(target: Dict) -> str:
+    """
+    Returns a short description of the target for the summary
+    """
+    lang = "all" if target["lang"] is None else target["lang"]
+    return f"{os.path.basename(target['csv'])} sly{target['game']} {target['region']} {lang} {target['format']}"
+
+def get_target_name(target: Dict) -> str:
+    """
+    Returns the mod name of the target, which gets the language appended so that targets
+    for different languages of the same game don't write the same file
+    """
+    name = target["name"] or os.path.splitext(os.path.basename(target["csv"]))[0]
+    if target["lang"] is not None:
+        name = f"{name}_{target['lang']}"
+    return name
+
+def create_generator(target: Dict) -> Generator:
+    """
+    Returns a generator with the options of the target
+    """
+    return Generator(**{param: target[key] for key, param in GENERATOR_PARAMS.items()})
+
+def build_target(target: Dict, strings_cache: Dict = None) -> Dict:
+    """
+    Builds one target and returns its result, with the output file, how long it took,
+    and the error if it failed
+    """
+    start = time.perf_counter()
+    result = {"label": get_target_label(target), "outfile": None, "error": None}
+    try:
+        generator = create_generator(target)
+        generator.strings_cache = strings_cache
+        name = get_target_name(target)
+        generator.generate_patch_file(target["csv"], target["output_dir"], name, target["author"], target["csv_encoding"], target["format"])
+        result["outfile"] = generator.get_output_path(target["csv"], target["output_dir"], name, target["format"])
+    except Exception as err:
+        result["error"] = str(err) or type(err).__name__
+    result["time"] = time.perf_counter() - start
+    return result
+
+def _build_group(targets: List[Dict]) -> List[Dict]:
+    """
+    Builds a group of targets in one worker process. The targets share the strings read
+    from each csv file, so a csv is only read and encoded once per encoding.
+    """
+    strings_cache = {}
+    return [build_target(target, strings_cache) for target in targets]
+
+def _get_encoding(target: Dict) -> str:
+    """
+    Returns the encoding the target's strings are written in, or None if the target is invalid
+    """
+    try:
+        return GAME_INFO[target["game"]][target["region"]].encoding
+    except KeyError:
+        return None
+
+def group_targets(targets: List[Dict], jobs: int) -> List[List[Dict]]:
+    """
+    Groups the targets by csv file and encodings, so each group only reads its csv once.
+    Groups are split up if there are fewer of them than jobs, to keep every worker busy.
+    """
+    groups = {}
+    for target in targets:
+        key = (target["csv"], target["csv_encoding"], _get_encoding(target))
+        groups.setdefault(key, []).append(target)
+
+    groups = list(groups.values())
+    while len(groups) < jobs:
+        largest = max(groups, key=len, default=[])
+        if len(largest) < 2:
+            break
+        groups.remove(largest)
+        groups += [largest[:len(largest) // 2], largest[len(largest) // 2:]]
+    return groups
+
+def build_all(targets: List[Dict], jobs: int = None) -> List[Dict]:
+    """
+    Builds the targets on a pool of worker processes (one per CPU by default), and returns
+    their results in the same order as the targets
+    """
+    jobs = jobs or os.cpu_count() or 1
+    groups = group_targets(targets, jobs)
+    if jobs == 1 or len(groups) == 1:
+        results = [result for group in groups for result in _build_group(group)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(groups))) as executor:
+            results = [result for group_results in executor.map(_build_group, groups) for result in group_results]
+
+    targets_in_groups = [target for group in groups for target in group]
+    results_by_target = {id(target): result for target, result in zip(targets_in_groups, results)}
+    return [results_by_target[id(target)] for target in targets]
+
+def print_summary(results: List[Dict], elapsed: float) -> None:
+    """
+    Prints the time each target took and whether it failed
+    """
+    label_width = max((len(result["label"]) for result in results), default=0)
+    print()
+    print(f"{'Target':<{label_width}}  {'Time':>9}  Result")
+    for result in results:
+        status = result["outfile"] if result["error"] is None else f"FAILED: {result['error']}"
+        print(f"{result['label']:<{label_width}}  {result['time'] * 1000:>6.0f} ms  {status}")
+
+    num_failed = sum(1 for result in results if result["error"] is not None)
+    print(f"Built {len(results) - num_failed} of {len(results)} targets in {elapsed:.2f} s" + (f", {num_failed} failed" if num_failed else ""))
@@ -0,0 +1,171 @@
+"""
+This file contains the BuildCache class, which stores generated patches on disk keyed by a
+hash of everything that goes into them, so unchanged mods don't have to be generated again.
+"""
+import filecmp
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import List, Optional, Pattern
+
+# Number of builds to keep in the cache before the oldest ones are removed
+MAX_ENTRIES = 100
+
+def get_default_cache_dir() -> str:
+    """
+    Returns the default cache directory in the user's cache folder
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "sly-string-toolkit")
+
+def hash_files(patterns: List[str]) -> str:
+    """
+    Returns a hash of the names and contents of the files that match the glob patterns
+    """
+    files_hash = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "rb") as file:
+                data = file.read()
+            files_hash.update(f"{os.path.basename(path)}\x00{len(data)}\x00".encode("utf-8"))
+            files_hash.update(data)
+    return files_hash.hexdigest()
+
+def get_temp_path(path: str) -> str:
+    """
+    Returns the path of a temporary file next to the file, unique to this process and thread
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def has_contents(path: str, data: bytes, ignore: Pattern[bytes] = None) -> bool:
+    """
+    Returns whether the file exists and has the same contents as the data, apart from
+    the parts that match the ignore pattern (if set)
+    """
+    if not os.path.isfile(path):
+        return False
+    if ignore is None and os.path.getsize(path) != len(data):
+        return False
+
+    with open(path, "rb") as file:
+        contents = file.read()
+    if ignore is None:
+        return contents == data
+    return ignore.sub(b"", contents) == ignore.sub(b"", data)
+
+def write_file_if_changed(path: str, data: bytes, ignore: Pattern[bytes] = None) -> bool:
+    """
+    Writes the data to the file unless it already has the same contents (apart from
+    the parts that match the ignore pattern, if set). Returns whether the file was written.
+    """
+    if has_contents(path, data, ignore):
+        return False
+
+    # Write to a temporary file first so other processes never see a partial file
+    temp_path = get_temp_path(path)
+    with open(temp_path, "wb") as file:
+        file.write(data)
+    os.replace(temp_path, path)
+    return True
+
+def replace_file_if_changed(temp_path: str, path: str, ignore: Pattern[bytes] = None) -> bool:
+    """
+    Moves the temporary file over the file unless it already has the same contents (apart
+    from the parts that match the ignore pattern, if set), in which case the temporary file
+    is removed. Returns whether the file was replaced.
+    """
+    if ignore is None:
+        unchanged = os.path.isfile(path) and filecmp.cmp(temp_path, path, shallow=False)
+    else:
+        with open(temp_path, "rb") as file:
+            unchanged = has_contents(path, file.read(), ignore)
+    if unchanged:
+        os.remove(temp_path)
+        return False
+
+    os.replace(temp_path, path)
+    return True
+
+def copy_file_if_changed(source_path: str, path: str) -> bool:
+    """
+    Copies the source file over the file unless it already has the same contents.
+    Returns whether the file was written.
+    """
+    if os.path.isfile(path) and filecmp.cmp(source_path, path, shallow=False):
+        return False
+
+    # Copy to a temporary file first so other processes never see a partial file
+    temp_path = get_temp_path(path)
+    shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, path)
+    return True
+
+class BuildCache:
+    """
+    BuildCache class, stores the strings blob, machine code and patch text of each build
+    """
+    def __init__(self, cache_dir: str = None):
+        """
+        Initializes the cache in the given directory (default is the user's cache folder)
+        """
+        self.cache_dir = get_default_cache_dir() if cache_dir is None else cache_dir
+
+    @staticmethod
+    def get_key(csv_bytes: bytes, params: dict) -> str:
+        """
+        Returns the cache key for a build of the given csv contents with the given parameters
+        """
+        key_hash = hashlib.sha256()
+        key_hash.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+        key_hash.update(b"\x00")
+        key_hash.update(csv_bytes)
+        return key_hash.hexdigest()
+
+    def _get_entry_dir(self, key: str) -> str:
+        """
+        Returns the directory of the cache entry with the given key
+        """
+        return os.path.join(self.cache_dir, key)
+
+    def get_patch_path(self, key: str) -> Optional[str]:
+        """
+        Returns the path of the cached patch file for the key, or None if it isn't cached
+        """
+        patch_path = os.path.join(self._get_entry_dir(key), "patch.txt")
+        if not os.path.isfile(patch_path):
+            return None
+
+        # Mark the entry as recently used so it isn't pruned
+        os.utime(patch_path)
+        return patch_path
+
+    def store(self, key: str, strings_bytes: bytes, code_bytes: bytes, patch_file: str) -> None:
+        """
+        Stores the strings blob, machine code and a copy of the patch file of a build
+        """
+        entry_dir = self._get_entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        write_file_if_changed(os.path.join(entry_dir, "strings.bin"), strings_bytes)
+        write_file_if_changed(os.path.join(entry_dir, "code.bin"), code_bytes)
+
+        # The patch text is written last since its presence marks the entry as complete
+        copy_file_if_changed(patch_file, os.path.join(entry_dir, "patch.txt"))
+
+        self._prune()
+
+    def _prune(self) -> None:
+        """
+        Removes the oldest entries if the cache has more than MAX_ENTRIES of them
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            patch_path = os.path.join(self._get_entry_dir(key), "patch.txt")
+            if os.path.isfile(patch_path):
+                entries.append((os.path.getmtime(patch_path), key))
+
+        entries.sort()
+        for _, key in entries[:-MAX_ENTRIES]:
+            shutil.rmtree(self._get_entry_dir(key), ignore_errors=True)
@@ -0,0 +1,187 @@
+"""
+This file contains the LZ compressor for the strings blob and the Decompressor class, which
+generates the MIPS code that expands the compressed strings in game RAM on the first string load.
+
+The compressed data is a sequence of tokens, each group of 8 tokens preceded by a control
+byte whose bits (lowest first) say if the token is a literal (1) or a match (0):
+
+    literal: 1 byte, copied to the output
+    match:   2 bytes b0 b1, copies (b1 & 0xF) + 3 bytes from
+             ((b1 >> 4) << 8 | b0) + 1 bytes back in the output
+"""
+import zlib
+from utils.encoder import Encoder
+
+# Limits of the match tokens
+WINDOW_SIZE = 0x1000
+MIN_MATCH = 3
+MAX_MATCH = 0xF + MIN_MATCH
+
+# Number of earlier positions with the same prefix to check for each match
+MAX_CHAIN = 64
+
+def compress(data: bytes) -> bytes:
+    """
+    Compresses the data using greedy matching over the last WINDOW_SIZE bytes
+    """
+    out = bytearray()
+    positions = {}
+    pos = 0
+    while pos < len(data):
+        control_index = len(out)
+        out.append(0)
+        for bit in range(8):
+            if pos >= len(data):
+                break
+
+            # Find the longest earlier match for the bytes at pos
+            best_length = 0
+            best_distance = 0
+            max_length = min(MAX_MATCH, len(data) - pos)
+            for candidate in reversed(positions.get(data[pos:pos + MIN_MATCH], [])[-MAX_CHAIN:]):
+                distance = pos - candidate
+                if distance > WINDOW_SIZE:
+                    break
+                length = MIN_MATCH
+                while length < max_length and data[candidate + length] == data[pos + length]:
+                    length += 1
+                if length > best_length:
+                    best_length = length
+                    best_distance = distance
+                    if length == max_length:
+                        break
+
+            if best_length >= MIN_MATCH:
+                out.append((best_distance - 1) & 0xFF)
+                out.append(((best_distance - 1) >> 8) << 4 | (best_length - MIN_MATCH))
+                length = best_length
+            else:
+                out[control_index] |= 1 << bit
+                out.append(data[pos])
+                length = 1
+
+            for start in range(pos, pos + length):
+                positions.setdefault(data[start:start + MIN_MATCH], []).append(start)
+            pos += length
+
+    return bytes(out)
+
+def decompress(data: bytes, size: int) -> bytes:
+    """
+    Decompresses the data until the output is the given size, the same way as the MIPS code
+    """
+    out = bytearray()
+    pos = 0
+    control = 1
+    while len(out) < size:
+        if control == 1:
+            control = data[pos] | 0x100
+            pos += 1
+        if control & 1:
+            out.append(data[pos])
+            pos += 1
+        else:
+            distance = ((data[pos + 1] >> 4) << 8 | data[pos]) + 1
+            for _ in range((data[pos + 1] & 0xF) + MIN_MATCH):
+                out.append(out[-distance])
+            pos += 2
+        control >>= 1
+
+    return bytes(out)
+
+class Decompressor:
+    """
+    Decompressor class, generates the code that expands the compressed strings once
+    """
+    def __init__(self, compressed_data: bytes, compressed_address: int, out_address: int, out_size: int, flag_address: int):
+        """
+        Initializes the decompressor for the compressed data at the given address, which
+        expands to out_size bytes at out_address. The flag word must be in RAM that isn't
+        written by the patch.
+        """
+        self.compressed_address = compressed_address
+        self.out_address = out_address
+        self.out_size = out_size
+        self.flag_address = flag_address
+
+        # The flag holds a checksum of the data so the strings are expanded again if they change
+        self.flag_value = zlib.crc32(compressed_data) or 1
+
+    def gen_code(self, encoder: Encoder) -> None:
+        """
+        Generates the decompressor code, which falls through to the code after it.
+        Only uses $t0-$t6, so the registers of the hooked function are left alone.
+        """
+        out_end = self.out_address + self.out_size
+
+        encoder.comment("skip the decompressor if the strings are already expanded")
+        encoder.lui("$t0", self.flag_address >> 16)
+        encoder.ori("$t0", "$t0", self.flag_address & 0xFFFF)
+        encoder.memory("lw", "$t1", 0, "$t0")
+        encoder.lui("$t2", self.flag_value >> 16)
+        encoder.ori("$t2", "$t2", self.flag_value & 0xFFFF)
+        encoder.branch("beq", "$t1", "$t2", "decompress_end")
+        encoder.nop()
+
+        encoder.comment("$t0 = compressed data, $t1 = output, $t2 = end of output, $t3 = control bits")
+        encoder.lui("$t0", self.compressed_address >> 16)
+        encoder.ori("$t0", "$t0", self.compressed_address & 0xFFFF)
+        encoder.lui("$t1", self.out_address >> 16)
+        encoder.ori("$t1", "$t1", self.out_address & 0xFFFF)
+        encoder.lui("$t2", out_end >> 16)
+        encoder.ori("$t2", "$t2", out_end & 0xFFFF)
+        encoder.ori("$t3", "$zero", 1)
+
+        encoder.comment("read the next control byte when the control bits run out")
+        encoder.label("decompress_token")
+        encoder.branch("beq", "$t1", "$t2", "decompress_done")
+        encoder.ori("$t4", "$zero", 1)
+        encoder.branch("bne", "$t3", "$t4", "decompress_bit")
+        encoder.nop()
+        encoder.memory("lbu", "$t3", 0, "$t0")
+        encoder.immediate("addiu", "$t0", "$t0", 1)
+        encoder.ori("$t3", "$t3", 0x100)
+        encoder.label("decompress_bit")
+        encoder.immediate("andi", "$t4", "$t3", 1)
+        encoder.branch("beq", "$t4", "$zero", "decompress_match")
+        encoder.shift("srl", "$t3", "$t3", 1)
+
+        encoder.comment("copy a literal byte")
+        encoder.memory("lbu", "$t4", 0, "$t0")
+        encoder.immediate("addiu", "$t0", "$t0", 1)
+        encoder.memory("sb", "$t4", 0, "$t1")
+        encoder.branch("beq", "$zero", "$zero", "decompress_token")
+        encoder.immediate("addiu", "$t1", "$t1", 1)
+
+        encoder.comment("$t4 = start of the match, $t5 = length of the match")
+        encoder.label("decompress_match")
+        encoder.memory("lbu", "$t4", 0, "$t0")
+        encoder.memory("lbu", "$t5", 1, "$t0")
+        encoder.immediate("addiu", "$t0", "$t0", 2)
+        encoder.shift("srl", "$t6", "$t5", 4)
+        encoder.shift("sll", "$t6", "$t6", 8)
+        encoder.register("or", "$t4", "$t4", "$t6")
+        encoder.register("subu", "$t4", "$t1", "$t4")
+        encoder.immediate("addiu", "$t4", "$t4", -1)
+        encoder.immediate("andi", "$t5", "$t5", 0xF)
+        encoder.immediate("addiu", "$t5", "$t5", MIN_MATCH)
+
+        encoder.comment("copy the match one byte at a time, since it can overlap the output")
+        encoder.label("decompress_copy")
+        encoder.memory("lbu", "$t6", 0, "$t4")
+        encoder.immediate("addiu", "$t4", "$t4", 1)
+        encoder.immediate("addiu", "$t5", "$t5", -1)
+        encoder.memory("sb", "$t6", 0, "$t1")
+        encoder.branch("bne", "$t5", "$zero", "decompress_copy")
+        encoder.immediate("addiu", "$t1", "$t1", 1)
+        encoder.branch("beq", "$zero", "$zero", "decompress_token")
+        encoder.nop()
+
+        encoder.comment("mark the strings as expanded")
+        encoder.label("decompress_done")
+        encoder.lui("$t0", self.flag_address >> 16)
+        encoder.ori("$t0", "$t0", self.flag_address & 0xFFFF)
+        encoder.lui("$t2", self.flag_value >> 16)
+        encoder.ori("$t2", "$t2", self.flag_value & 0xFFFF)
+        encoder.memory("sw", "$t2", 0, "$t0")
+        encoder.label("decompress_end")
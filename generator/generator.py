@@ -1,14 +1,49 @@
 """
 Generator class which generates a pnach file from a CSV file.
 """
+import hashlib
+import io
+import logging
+import mmap
 import os
+import re
 from datetime import datetime
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, TextIO, Tuple, Union
 import struct
-import keystone
+import zlib
 from generator import strings, trampoline, pnach
-from utils import Assembler
-from dataclasses import dataclass
+from generator.compression import Decompressor
+from generator.layout import StringLayout
+from generator.cache import BuildCache, replace_file_if_changed, write_file_if_changed, get_temp_path, hash_files
+from utils.dump_string_table import read_string_table
+from utils.encoder import Encoder
+from dataclasses import dataclass, asdict
+
+# Version of the toolkit
+VERSION = "1.2.0"
+
+# Source files the generated patches depend on. Their hash is part of the build cache key,
+# so builds cached by an older version of the code (even one with the same VERSION) aren't used.
+TOOLKIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE_SOURCES = [
+    os.path.join(TOOLKIT_DIR, "generator", "*.py"),
+    os.path.join(TOOLKIT_DIR, "utils", "encoder.py"),
+    os.path.join(TOOLKIT_DIR, "utils", "dump_string_table.py"),
+]
+
+# Mod name of builds from rows or file objects without a file name
+DEFAULT_MOD_NAME = "strings"
+
+# Format of the date in the patch header
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Date in the patch header, in pnach (date=...) and CLPS2C (SR "\ndate=...") output. Patch
+# files that only differ in the date aren't written again.
+DATE_LINE = re.compile(rb'^((?:SR "\\n)?date=)[^"\n]*', re.MULTILINE)
+
+# A csv file path, a file object opened in text mode, or the rows themselves
+CsvSource = Union[str, TextIO, Iterable[List[str]]]
 
 @dataclass
 class GameInfo:
@@ -20,7 +55,11 @@ class GameInfo:
     asm_adr: int
     strings_adr: int
     encoding: str
-    #string_table: int
+    string_table: int = None
+    # Machine code of the hook at the default code address (j asm_adr; nop) and of the
+    # hook cancel (jr $ra; hook_delayslot), so they don't have to be encoded on every build
+    hook_code: bytes = None
+    cancel_hook_code: bytes = None
 
 GAME_INFO = {
     2: {
@@ -32,7 +71,9 @@ GAME_INFO = {
             lang_adr=None,
             asm_adr=0x2E60B0,
             strings_adr=0x3C7980,
-            encoding='iso-8859-1'
+            encoding='iso-8859-1',
+            hook_code=bytes.fromhex("2c980b0800000000"),
+            cancel_hook_code=bytes.fromhex("0800e0030400828c")
         ),
         "pal": GameInfo(
             title="Sly 2: Band of Thieves (Europe)",
@@ -42,7 +83,9 @@ GAME_INFO = {
             lang_adr=0x2E9254,
             asm_adr=0x2ED500,
             strings_adr=0x3CF190,
-            encoding='iso-8859-1'
+            encoding='iso-8859-1',
+            hook_code=bytes.fromhex("40b50b0800000000"),
+            cancel_hook_code=bytes.fromhex("0800e0030400828c")
         )
     },
     3: {
@@ -54,8 +97,10 @@ GAME_INFO = {
             lang_adr=None,
             asm_adr=0x45af00,
             strings_adr=0x0F1050,
-            encoding='UTF-16'
-            #string_table=x47A2D8
+            encoding='UTF-16',
+            string_table=0x47A2D8,
+            hook_code=bytes.fromhex("c06b110800000000"),
+            cancel_hook_code=bytes.fromhex("0800e0030400628c")
         )#,
         #"pal": GameInfo(
             #title="Sly 3: Honour Among Thieves (Europe)",
@@ -80,25 +125,67 @@ LANGUAGE_IDS = {
     "sv": 10, # swedish
 }
 
-class Generator:
+LOOKUP_MODES = [
+    "linear", # compare chain with one check per string ID
+    "binsearch", # binary search over a sorted (id, ptr) table
+    "hash", # minimal perfect hash into an (id, ptr) table
+    "ranges", # direct pointer tables for runs of consecutive IDs, compare chain for the rest
+]
+
+STATIC_PLACEMENTS = [
+    "continuous", # write the code, strings and tables every frame like the hook
+    "once", # write them once when the game boots (pnach only)
+    "sentinel", # write them until a sentinel word after the strings is set
+]
+
+LANG_GATES = [
+    "all", # only write the whole mod when the game is set to the language (only the hook with once or sentinel placement)
+    "hook", # only gate the hook, and write the code, strings and tables for any language
+]
+
+@dataclass
+class BuildResult:
     """
-    Generator class, generates a pnach file from a CSV file
+    Result of a build: the patch objects and all of their chunks, the string pointers
+    ((id, pointer) pairs, or a list of them for each language ID in multi-language builds),
+    the mod's machine code and the rendered patch text
     """
-    # Init variables
-    verbose = False
-    debug = False
+    patches: List[pnach.Pnach]
+    chunks: List[pnach.Chunk]
+    string_pointers: Union[List[Tuple[int, int]], Dict[int, List[Tuple[int, int]]]]
+    code: bytes
+    text: str
+
+@lru_cache(maxsize=None)
+def get_code_hash() -> str:
+    """
+    Returns the hash of the code the generated patches depend on, computed once per process
+    """
+    return hash_files(CODE_SOURCES)
 
-    def __init__(self, game: int, region: str, lang: str = None, strings_address: int = None, code_address: int = None):
+class Generator:
+    """
+    Generator class, generates a pnach file from a CSV file. Builds only use the options of
+    the instance, so several generators can build at the same time on different threads.
+    """
+    def __init__(self, game: int, region: str, lang: str = None, strings_address: int = None, code_address: int = None, lookup: str = "linear", range_threshold: int = 3, keystone_check: bool = False, cache_dir: str = None, compress_strings: bool = False, baseline_dump: str = None, static_placement: str = "continuous", lang_gate: str = "all", multi_lang: bool = False, string_table_dump: str = None, string_table_address: int = None, stable_layout: bool = False, verbose: bool = False, debug_dir: str = None, logger: logging.Logger = None):
         """
-        Initializes the generator with the specified region and addresses
+        Initializes the generator with the specified region and addresses. Messages go to
+        the given logger (default is this module's logger), with the details of each build
+        if verbose is set. If debug_dir is set, the assembly and machine code of each build
+        are written there as mod.asm and mod.bin.
         """
+        self.verbose = verbose
+        self.debug_dir = debug_dir
+        self.logger = logging.getLogger(__name__) if logger is None else logger
+
         # Set region
         self.region = region.lower()
 
         try:
             self.game_info = GAME_INFO[game][region]
         except KeyError as e:
-            raise(f"Error: Game or region not supported ({game}/{region})")
+            raise ValueError(f"Error: Game or region not supported ({game}/{region})")
 
         self.strings_adr = self.game_info.strings_adr if strings_address is None else strings_address
         self.code_address = self.game_info.asm_adr if code_address is None else code_address
@@ -106,11 +193,55 @@ class Generator:
         self.lang_adr = self.game_info.lang_adr
 
         if lang is not None and region == "ntsc":
-            print("Warning: Language selection is not supported for NTSC region, using English")
+            self.logger.warning("Warning: Language selection is not supported for NTSC region, using English")
             self.lang = LANGUAGE_IDS["en"]
         else:
             self.lang = LANGUAGE_IDS[lang.lower()] if lang is not None else None
 
+        if lookup not in LOOKUP_MODES:
+            raise ValueError(f"Error: Lookup mode not supported ({lookup})")
+        self.lookup = lookup
+
+        if range_threshold < 1:
+            raise ValueError(f"Error: Range threshold must be at least 1 ({range_threshold})")
+        self.range_threshold = range_threshold
+        self.keystone_check = keystone_check
+        self.compress_strings = compress_strings
+        self.baseline_dump = baseline_dump
+
+        if static_placement not in STATIC_PLACEMENTS:
+            raise ValueError(f"Error: Static placement not supported ({static_placement})")
+        self.static_placement = static_placement
+
+        if lang_gate not in LANG_GATES:
+            raise ValueError(f"Error: Language gate not supported ({lang_gate})")
+        self.lang_gate = lang_gate
+
+        if multi_lang and self.lang_adr is None:
+            raise ValueError(f"Error: Multi-language builds are not supported for this game or region ({game}/{region})")
+        if multi_lang and lang is not None:
+            raise ValueError("Error: Multi-language builds can't be limited to one language")
+        if multi_lang and lookup not in ("linear", "binsearch"):
+            self.logger.warning(f"Warning: Multi-language builds always use binsearch lookup, ignoring {lookup}")
+        self.multi_lang = multi_lang
+
+        self.string_table_dump = string_table_dump
+        self.string_table = self.game_info.string_table if string_table_address is None else string_table_address
+        if isinstance(self.string_table, str):
+            self.string_table = int(self.string_table, 16)
+        if string_table_dump is not None and self.string_table is None:
+            raise ValueError(f"Error: The string table address of this game or region is unknown ({game}/{region}), set it manually")
+        if string_table_dump is not None and (self.lang is not None or multi_lang):
+            raise ValueError("Error: Direct string table patching can't be used with language selection")
+
+        self.stable_layout = stable_layout
+        # String layout kept in memory between builds (used for live editing instead of the sidecar file)
+        self.layout = None
+        # Strings read from csv files, keyed by file and encodings (can be shared by generators
+        # that build the same csv for several targets)
+        self.strings_cache = None
+        self.cache = BuildCache(cache_dir) if cache_dir is not None else None
+
         # Ensure addresses are ints
         if isinstance(self.strings_adr, str):
             self.strings_adr = int(self.strings_adr, 16)
@@ -119,29 +250,15 @@ class Generator:
         if isinstance(self.hook_adr, str):
             self.hook_adr = int(self.hook_adr, 16)
 
-    @staticmethod
-    def set_verbose(verbose: bool) -> None:
-        """
-        Sets the verbose flag
-        """
-        Generator.verbose = verbose
-        if verbose:
-            print("Verbose output enabled")
-
-    @staticmethod
-    def set_debug(debug: bool) -> None:
-        """
-        Sets the debug flag
-        """
-        Generator.debug = debug
-        if debug:
-            print("Debug output enabled")
-
     @staticmethod
     def assemble(asm_code: str) -> Tuple[bytes, int]:
         """
         Assembles the given assembly code to binary and converts it to a byte array
         """
+        # Keystone is only needed to cross-check the encoder, so it's imported on first use
+        import keystone
+        from utils.assembler import Assembler
+
         # Assemble the assembly code
         assembler = Assembler(keystone.KS_ARCH_MIPS, keystone.KS_MODE_MIPS32 + keystone.KS_MODE_LITTLE_ENDIAN)
         binary, count = assembler.assemble(asm_code)
@@ -149,76 +266,244 @@ class Generator:
         # Convert the binary to bytes
         machine_code_bytes = struct.pack('B' * len(binary), *binary)
 
-        # Print machine code bytes if verbose
-        if Generator.verbose:
-            print(f"Assembled {count} bytes of machine code")
-            print("Machine code bytes:")
-            print(binary)
-
-        # Write machine code bytes to file if debug
-        if Generator.debug:
-            print("Writing binary code to file...")
-            with open("./out/mod.bin", "wb+") as file:
-                file.write(machine_code_bytes)
-
         return machine_code_bytes, count
 
-    def _gen_strings_from_csv(self, csv_file: str, csv_encoding: str = "utf-8", patch_format: str = "pnach") -> Tuple[pnach.Chunk, List[pnach.Chunk], List[Tuple[int, int]]]:
+    def _gen_strings_from_csv(self, csv_file: CsvSource, csv_encoding: str = "utf-8", patch_format: str = "pnach") -> Tuple[pnach.Chunk, List[pnach.Chunk], List[Tuple[int, int]], Decompressor]:
         """
-        Generates the strings pnach and populate string pointers
+        Generates the strings pnach and populate string pointers, along with the
+        decompressor for the strings if they are compressed
         """
         if self.verbose:
-            print(f"Reading strings from {csv_file} to 0x{self.strings_adr:X}...")
+            self.logger.info(f"Reading strings from {self._get_source_name(csv_file) or 'rows'} to 0x{self.strings_adr:X}...")
 
         # Ensure file exists
-        if not os.path.isfile(csv_file):
+        if isinstance(csv_file, str) and not os.path.isfile(csv_file):
             raise Exception(f"Error: File {csv_file} does not exist")
 
         out_encoding = self.game_info.encoding
         strings_obj = strings.Strings(csv_file, self.strings_adr, csv_encoding, out_encoding)
-        auto_strings_chunk, manual_string_chunks, string_pointers = strings_obj.gen_pnach_chunks(patch_format)
+        use_strings_cache = self.strings_cache is not None and isinstance(csv_file, str)
+        if use_strings_cache:
+            cache_key = (os.path.abspath(csv_file), csv_encoding, out_encoding)
+            strings_obj.parsed = self.strings_cache.get(cache_key)
+        layout = self._load_layout(csv_file)
+        auto_strings_chunk, manual_string_chunks, string_pointers = strings_obj.gen_pnach_chunks(patch_format, self.compress_strings, layout)
+        if use_strings_cache:
+            self.strings_cache[cache_key] = strings_obj.parsed
+        self._save_layout(csv_file, layout)
 
         # Print string pointers if verbose
         if self.verbose:
-            print("String pointers:")
+            self.logger.info("String pointers:")
             for string_id, string_ptr in string_pointers:
-                print(f"ID: {hex(string_id)} | Ptr: {hex(string_ptr)}")
-            print("Auto strings pnach:")
-            print(auto_strings_chunk)
-            print("Manual strings pnach:")
-            print('\n'.join([str(chunk) for chunk in manual_string_chunks]))
+                self.logger.info(f"ID: {hex(string_id)} | Ptr: {hex(string_ptr)}")
+            self.logger.info(f"String pool saved {strings_obj.bytes_saved} bytes")
+            if strings_obj.decompressor is not None:
+                self.logger.info(f"Compressed {strings_obj.decompressor.out_size} bytes of strings to {auto_strings_chunk.size} bytes")
+            self.logger.info("Auto strings pnach:")
+            self.logger.info(auto_strings_chunk)
+            self.logger.info("Manual strings pnach:")
+            self.logger.info('\n'.join([str(chunk) for chunk in manual_string_chunks]))
 
-        return auto_strings_chunk, manual_string_chunks, string_pointers
+        return auto_strings_chunk, manual_string_chunks, string_pointers, strings_obj.decompressor
 
-    def _gen_asm(self, string_pointers: list) -> str:
+    @staticmethod
+    def get_layout_path(csv_file: str) -> str:
+        """
+        Returns the path of the string layout sidecar file for a csv file
+        """
+        return os.path.splitext(csv_file)[0] + ".layout.json"
+
+    def _load_layout(self, csv_file: CsvSource) -> StringLayout:
+        """
+        Loads the string layout of the csv file if stable layout is enabled
         """
-        Generates the mod assembly code
+        if self.layout is not None:
+            return self.layout
+        if not self.stable_layout:
+            return None
+        if not isinstance(csv_file, str):
+            raise ValueError("Error: Stable layout needs a csv file path to keep the layout next to")
+        return StringLayout.load(self.get_layout_path(csv_file), self.strings_adr)
+
+    def _save_layout(self, csv_file: CsvSource, layout: StringLayout) -> None:
         """
+        Saves the string layout of the csv file if stable layout is enabled
+        """
+        if layout is None:
+            return
+        if self.stable_layout:
+            layout.save(self.get_layout_path(csv_file))
         if self.verbose:
-            print("Generating assembly code...")
+            free_bytes = sum(size for _, size in layout.free)
+            self.logger.info(f"String layout: {len(layout.slots)} slots ({layout.moved} new or moved), {free_bytes} bytes free of {layout.size}")
+
+    def _new_encoder(self) -> Encoder:
+        """
+        Creates an encoder, keeping the assembly text if it will be printed or cross-checked
+        """
+        return Encoder(keep_asm=self.verbose or self.debug_dir is not None or self.keystone_check)
+
+    def _get_machine_code(self, encoder: Encoder) -> bytes:
+        """
+        Returns the machine code from the encoder, cross-checking it against Keystone if enabled
+        """
+        machine_code_bytes = encoder.get_bytes()
+
+        if self.keystone_check:
+            keystone_bytes, count = self.assemble(encoder.get_asm())
+            if keystone_bytes != machine_code_bytes:
+                raise Exception("Error: Encoded machine code does not match Keystone output")
+
+        return machine_code_bytes
+
+    def _gen_code(self, string_pointers: list, table_address: int, patch_format: str = "pnach", decompressor: Decompressor = None) -> Tuple[bytes, List[pnach.Chunk]]:
+        """
+        Generates the mod machine code and the chunks for any lookup tables it reads.
+        If a decompressor is given, its code runs before the trampoline.
+        """
+        if self.verbose:
+            self.logger.info(f"Generating machine code ({self.lookup} lookup)...")
 
         trampoline_obj = trampoline.Trampoline(string_pointers)
-        mips_code = trampoline_obj.gen_asm(self.game_info.hook_delayslot)
+        encoder = self._new_encoder()
+        hook_delayslot = self.game_info.hook_delayslot
+        table_chunks = []
+        if decompressor is not None:
+            decompressor.gen_code(encoder)
+        if self.lookup == "binsearch":
+            table_bytes = trampoline_obj.gen_binsearch_table()
+            table_chunk = pnach.Chunk(table_address, table_bytes, patch_format=patch_format)
+            table_chunk.set_header(f"Writing {len(table_bytes) // 8} lookup table entries ({len(table_bytes)} bytes) at {hex(table_address)}")
+            table_chunks.append(table_chunk)
+            trampoline_obj.gen_code_binsearch(encoder, hook_delayslot, table_address)
+        elif self.lookup == "hash":
+            perfect_hash = trampoline_obj.get_perfect_hash()
+            table_bytes = trampoline_obj.gen_hash_table(perfect_hash)
+            table_chunk = pnach.Chunk(table_address, table_bytes, patch_format=patch_format)
+            table_chunk.set_header(f"Writing {perfect_hash.num_keys} hash table entries ({len(table_bytes)} bytes) at {hex(table_address)}")
+            table_chunks.append(table_chunk)
+            trampoline_obj.gen_code_hash(encoder, hook_delayslot, perfect_hash, table_address)
+        elif self.lookup == "ranges":
+            table_bytes = trampoline_obj.gen_range_tables(self.range_threshold)
+            table_chunk = pnach.Chunk(table_address, table_bytes, patch_format=patch_format)
+            table_chunk.set_header(f"Writing {len(table_bytes) // 4} range table entries ({len(table_bytes)} bytes) at {hex(table_address)}")
+            table_chunks.append(table_chunk)
+            trampoline_obj.gen_code_ranges(encoder, hook_delayslot, table_address, self.range_threshold)
+        else:
+            trampoline_obj.gen_code(encoder, hook_delayslot)
 
-        # Print assembly code if verbose
+        machine_code_bytes = self._get_mod_code(encoder)
+        return machine_code_bytes, table_chunks
+
+    def _gen_language_strings_from_csv(self, csv_file: CsvSource, csv_encoding: str = "utf-8", patch_format: str = "pnach") -> Tuple[pnach.Chunk, Dict[int, List[Tuple[int, int]]], Decompressor]:
+        """
+        Generates the strings pnach for a csv with a column per language, and returns it with the
+        string pointers of each language ID and the decompressor if the strings are compressed
+        """
         if self.verbose:
-            print("Assembly code:")
-            print(mips_code)
+            self.logger.info(f"Reading strings of all languages from {self._get_source_name(csv_file) or 'rows'} to 0x{self.strings_adr:X}...")
 
-        # Write assembly code to file if debug
-        if self.debug:
-            print("Writing assembly code to file...")
-            with open("./out/mod.asm", "w+", encoding="utf-8") as file:
-                file.write(mips_code)
+        # Ensure file exists
+        if isinstance(csv_file, str) and not os.path.isfile(csv_file):
+            raise Exception(f"Error: File {csv_file} does not exist")
+
+        strings_obj = strings.Strings(csv_file, self.strings_adr, csv_encoding, self.game_info.encoding)
+        layout = self._load_layout(csv_file)
+        auto_strings_chunk, pointers_by_code = strings_obj.gen_language_chunks(patch_format, self.compress_strings, layout)
+        self._save_layout(csv_file, layout)
+
+        language_pointers = {}
+        for language, string_pointers in pointers_by_code.items():
+            if language not in LANGUAGE_IDS:
+                raise ValueError(f"Error: Language not supported ({language}), the csv header must list the language of each column")
+            language_pointers[LANGUAGE_IDS[language]] = string_pointers
+
+        if self.verbose:
+            for language, string_pointers in pointers_by_code.items():
+                self.logger.info(f"Language {language}: {len(string_pointers)} strings")
+            self.logger.info(f"String pool saved {strings_obj.bytes_saved} bytes")
+            self.logger.info("Auto strings pnach:")
+            self.logger.info(auto_strings_chunk)
 
-        return mips_code
+        return auto_strings_chunk, language_pointers, strings_obj.decompressor
+
+    def _gen_language_code(self, language_pointers: Dict[int, List[Tuple[int, int]]], table_address: int, patch_format: str = "pnach", decompressor: Decompressor = None) -> Tuple[bytes, List[pnach.Chunk]]:
+        """
+        Generates the multi-language mod machine code, the index table with the bounds of each
+        language's lookup table, and the lookup tables (shared by languages with the same strings)
+        """
+        if self.verbose:
+            self.logger.info("Generating machine code (multi-language binsearch lookup)...")
+
+        num_languages = max(LANGUAGE_IDS.values()) + 1
+        index_address = table_address
+        lookup_table_address = index_address + num_languages * 8
+
+        # Place each different lookup table once, after the index table
+        language_codes = {language_id: code for code, language_id in LANGUAGE_IDS.items()}
+        table_bounds = {}
+        table_languages = {}
+        language_bounds = []
+        for language in range(num_languages):
+            table_bytes = trampoline.Trampoline(language_pointers.get(language, [])).gen_binsearch_table()
+            if table_bytes not in table_bounds:
+                table_bounds[table_bytes] = (lookup_table_address, lookup_table_address + len(table_bytes))
+                table_languages[table_bytes] = []
+                lookup_table_address += len(table_bytes)
+            language_bounds.append(table_bounds[table_bytes])
+            table_languages[table_bytes].append(language_codes[language])
+
+        table_chunks = []
+        for table_bytes, (start, _) in table_bounds.items():
+            if len(table_bytes) == 0:
+                continue
+            table_chunk = pnach.Chunk(start, table_bytes, patch_format=patch_format)
+            table_chunk.set_header(f"Writing {len(table_bytes) // 8} lookup table entries ({len(table_bytes)} bytes) for {', '.join(table_languages[table_bytes])} at {hex(start)}")
+            table_chunks.append(table_chunk)
+
+        index_bytes = b''.join(struct.pack('<II', start, end) for start, end in language_bounds)
+        index_chunk = pnach.Chunk(index_address, index_bytes, patch_format=patch_format)
+        index_chunk.set_header(f"Writing language table ({len(index_bytes)} bytes) at {hex(index_address)}")
+        table_chunks.insert(0, index_chunk)
+
+        encoder = self._new_encoder()
+        if decompressor is not None:
+            decompressor.gen_code(encoder)
+        trampoline.Trampoline.gen_code_binsearch_languages(encoder, self.game_info.hook_delayslot, self.lang_adr, index_address, num_languages)
+
+        machine_code_bytes = self._get_mod_code(encoder)
+        return machine_code_bytes, table_chunks
+
+    def _get_mod_code(self, encoder: Encoder) -> bytes:
+        """
+        Returns the mod machine code from the encoder, printing or writing it out if verbose or debug
+        """
+        machine_code_bytes = self._get_machine_code(encoder)
+
+        # Print assembly code if verbose
+        if self.verbose:
+            self.logger.info("Assembly code:")
+            self.logger.info(encoder.get_asm())
+            self.logger.info(f"Encoded {len(machine_code_bytes)} bytes of machine code")
+
+        # Write assembly and machine code to files if debug
+        if self.debug_dir is not None:
+            self.logger.info("Writing assembly and binary code to file...")
+            os.makedirs(self.debug_dir, exist_ok=True)
+            with open(os.path.join(self.debug_dir, "mod.asm"), "w+", encoding="utf-8") as file:
+                file.write(encoder.get_asm())
+            with open(os.path.join(self.debug_dir, "mod.bin"), "wb+") as file:
+                file.write(machine_code_bytes)
+
+        return machine_code_bytes
 
     def _gen_code_pnach(self, machine_code_bytes: bytes, patch_format: str) -> Tuple[pnach.Chunk, pnach.Chunk]:
         """
         Generates the pnach object for the mod and hook code
         """
         if self.verbose:
-            print("Generating pnach file...")
+            self.logger.info("Generating pnach file...")
 
         # Generate mod pnach code
         mod_chunk = pnach.Chunk(self.code_address, machine_code_bytes, patch_format=patch_format)
@@ -226,75 +511,226 @@ class Generator:
 
         # Print mod pnach code if verbose
         if self.verbose:
-            print("Mod pnach:")
-            print(mod_chunk)
+            self.logger.info("Mod pnach:")
+            self.logger.info(mod_chunk)
 
         # Generate pnach for function hook to jump to trampoline code
-        hook_asm = f"j {self.code_address}\n"
-        hook_code, count = self.assemble(hook_asm)
+        if self.game_info.hook_code is not None and self.code_address == self.game_info.asm_adr and not self.keystone_check:
+            hook_code = self.game_info.hook_code
+        else:
+            hook_encoder = self._new_encoder()
+            hook_encoder.j(self.code_address)
+            hook_encoder.nop()
+            hook_code = self._get_machine_code(hook_encoder)
 
         hook_chunk = pnach.Chunk(self.hook_adr, hook_code, patch_format=patch_format)
         hook_chunk.set_header(f"Hooking string load function at {hex(self.hook_adr)}")
 
         # Print hook pnach code if verbose
         if self.verbose:
-            print("Hook pnach:")
-            print(hook_chunk)
+            self.logger.info("Hook pnach:")
+            self.logger.info(hook_chunk)
 
         return (mod_chunk, hook_chunk)
 
+    def get_cancel_hook_code(self) -> bytes:
+        """
+        Returns the machine code that cancels the function hook by setting the asm back to the original
+        """
+        if self.game_info.cancel_hook_code is not None and not self.keystone_check:
+            return self.game_info.cancel_hook_code
+
+        cancel_hook_encoder = self._new_encoder()
+        cancel_hook_encoder.jr("$ra")
+        cancel_hook_encoder.parse(self.game_info.hook_delayslot)
+        return self._get_machine_code(cancel_hook_encoder)
 
-    def generate_patch_str(self, input_file: str, mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", patch_format: str = "pnach") -> str:
+    def _drop_unchanged_words(self, chunks: List[pnach.Chunk]) -> List[pnach.Chunk]:
         """
-        Generates the mod pnach text from the given input file
+        Splits the chunks into the parts that differ from the baseline EE RAM dump
         """
-        # Generate the strings, asm code, and pnach files
-        auto_strings_chunk, manual_sting_chunks, string_pointers = self._gen_strings_from_csv(input_file, csv_encoding, patch_format=patch_format)
-        trampoline_asm = self._gen_asm(string_pointers)
-        trampoline_binary, count = self.assemble(trampoline_asm)
-        mod_chunk, hook_chunk = self._gen_code_pnach(trampoline_binary, patch_format=patch_format)
+        if not os.path.isfile(self.baseline_dump):
+            raise Exception(f"Error: Baseline dump {self.baseline_dump} does not exist")
 
-        # Set the mod name (default is same as input file)
-        if (mod_name is None or mod_name == ""):
-            mod_name = os.path.splitext(os.path.basename(input_file))[0]
+        changed_chunks = []
+        with open(self.baseline_dump, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as baseline:
+            for chunk in chunks:
+                changed_chunks += chunk.split_changed(baseline)
+
+        if self.verbose:
+            num_lines = sum(chunk.get_num_lines() for chunk in chunks)
+            num_changed_lines = sum(chunk.get_num_lines() for chunk in changed_chunks)
+            self.logger.info(f"Skipped {num_lines - num_changed_lines} of {num_lines} words that match the baseline dump")
+
+        return changed_chunks
+
+    def _gen_direct_pointer_patches(self, string_pointers: List[Tuple[int, int]], patch_format: str) -> Tuple[List[Tuple[int, int]], List[pnach.Pnach]]:
+        """
+        Generates a pnach for each string ID in the game's string table (indexed from the
+        string table dump), which points the table entry straight at the custom string.
+        Returns the string pointers that aren't in the table along with the pnach objects.
+        """
+        if not os.path.isfile(self.string_table_dump):
+            raise Exception(f"Error: String table dump {self.string_table_dump} does not exist")
+
+        # Index the slots of each string ID in the game's table
+        with open(self.string_table_dump, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as dump:
+            table_entries = read_string_table(dump, self.string_table & pnach.EE_RAM_MASK, max_entries=0x10000)
+        slots = {}
+        for slot, (string_id, _) in enumerate(table_entries):
+            slots.setdefault(string_id, []).append(slot)
+
+        # Duplicate IDs keep the last pointer, like the trampoline
+        direct_patches = []
+        for string_id, string_ptr in trampoline.Trampoline(string_pointers).get_sorted_pairs():
+            for slot in slots.get(string_id, []):
+                entry_address = self.string_table + slot * 8
+                direct_patch = pnach.Pnach(patch_format=patch_format)
+                direct_patch.add_chunk(pnach.Chunk(entry_address + 4, struct.pack('<I', string_ptr),
+                    f"Pointing string {string_id} at {hex(string_ptr)}", patch_format=patch_format))
+                # Only write the pointer if the entry still has the same ID as in the dump
+                direct_patch.add_conditional(entry_address, string_id, 'eq')
+                direct_patches.append(direct_patch)
+
+        remaining_pointers = [(string_id, string_ptr) for string_id, string_ptr in string_pointers if string_id not in slots]
+
+        if self.verbose:
+            self.logger.info(f"Read {len(table_entries)} entries of the string table at {hex(self.string_table)}")
+            self.logger.info(f"Patching {len(string_pointers) - len(remaining_pointers)} string pointers directly, {len(remaining_pointers)} go through the hook")
+
+        return remaining_pointers, direct_patches
+
+    def _gen_payload_patch(self, payload_chunks: List[pnach.Chunk], sentinel_address: int, patch_format: str) -> pnach.Pnach:
+        """
+        Generates the pnach which writes the code, strings and tables separately from the
+        hook, either continuously, once when the game boots or until the sentinel word is set
+        """
+        payload_patch = pnach.Pnach(patch_format=patch_format)
+        for chunk in payload_chunks:
+            chunk.set_once(self.static_placement == "once")
+            payload_patch.add_chunk(chunk)
+
+        if self.static_placement == "sentinel":
+            # The sentinel is a checksum of the payload, so a changed mod is written again.
+            # Conditionals only compare halfwords, so it has to fit in 16 bits.
+            checksum = 0
+            for chunk in payload_chunks:
+                checksum = zlib.crc32(struct.pack('<I', chunk.get_address()), checksum)
+                checksum = zlib.crc32(chunk.get_bytes(), checksum)
+            sentinel_value = (checksum & 0xFFFF) or 1
+
+            # The sentinel is written last, so the whole payload is written in the same frame
+            sentinel_chunk = pnach.Chunk(sentinel_address, struct.pack('<I', sentinel_value), patch_format=patch_format)
+            sentinel_chunk.set_header(f"Marking the mod as written at {hex(sentinel_address)}")
+            payload_patch.add_chunk(sentinel_chunk)
+            payload_patch.add_conditional(sentinel_address, sentinel_value, 'neq')
+
+        if self.verbose:
+            self.logger.info("Payload pnach:")
+            self.logger.info(payload_patch)
+
+        return payload_patch
+
+    def generate_patches(self, input_file: CsvSource, mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", patch_format: str = "pnach") -> List[pnach.Pnach]:
+        """
+        Generates the mod pnach objects from the given input file. The first one is the mod
+        itself, followed by the payload pnach if it's written separately from the hook, the
+        direct string table pointer pnach objects, and the hook cancel pnach if a language is set.
+        """
+        return self._generate(input_file, mod_name, author, csv_encoding, patch_format)[0]
+
+    def build(self, input_file: CsvSource, mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", patch_format: str = "pnach") -> BuildResult:
+        """
+        Builds the mod from a csv file path, a file object opened in text mode or the rows
+        themselves, and returns the patches with their chunks, the string pointers, the
+        machine code and the patch text. Nothing is written to disk (unless stable layout
+        or debug_dir is set).
+        """
+        patches, string_pointers, code = self._generate(input_file, mod_name, author, csv_encoding, patch_format)
+        out = io.StringIO()
+        for patch in patches:
+            patch.write(out)
+        chunks = [chunk for patch in patches for chunk in patch.get_chunks()]
+        return BuildResult(patches, chunks, string_pointers, code, out.getvalue())
+
+    def _generate(self, input_file: CsvSource, mod_name: str, author: str, csv_encoding: str, patch_format: str) -> Tuple[List[pnach.Pnach], Union[List[Tuple[int, int]], Dict[int, List[Tuple[int, int]]]], bytes]:
+        """
+        Generates the mod pnach objects like generate_patches, and returns them with the
+        string pointers and the mod machine code
+        """
+        if self.static_placement == "once" and patch_format != "pnach":
+            raise ValueError(f"Error: One-time placement is not supported for {patch_format}, use sentinel placement instead")
+
+        # Generate the strings, asm code, and pnach files. Lookup tables go right after
+        # the auto strings, aligned to a word boundary.
+        needs_hook = True
+        if self.multi_lang:
+            auto_strings_chunk, language_pointers, decompressor = self._gen_language_strings_from_csv(input_file, csv_encoding, patch_format=patch_format)
+            manual_sting_chunks = []
+            direct_patches = []
+            table_address = (auto_strings_chunk.get_address() + auto_strings_chunk.size + 3) & ~3
+            trampoline_binary, table_chunks = self._gen_language_code(language_pointers, table_address, patch_format=patch_format, decompressor=decompressor)
+            all_string_pointers = language_pointers
+        else:
+            auto_strings_chunk, manual_sting_chunks, string_pointers, decompressor = self._gen_strings_from_csv(input_file, csv_encoding, patch_format=patch_format)
+            direct_patches = []
+            all_string_pointers = string_pointers
+            if self.string_table_dump is not None:
+                string_pointers, direct_patches = self._gen_direct_pointer_patches(string_pointers, patch_format)
+                # The hook isn't needed if every string ID is in the game's table
+                needs_hook = len(string_pointers) > 0
+            table_address = (auto_strings_chunk.get_address() + auto_strings_chunk.size + 3) & ~3
+            trampoline_binary, table_chunks = self._gen_code(string_pointers, table_address, patch_format=patch_format, decompressor=decompressor)
+        mod_chunk, hook_chunk = self._gen_code_pnach(trampoline_binary, patch_format=patch_format)
 
         # Set up pnach header lines
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        gametitle= self.game_info.title
-        header_lines = f"[{mod_name}]\n" \
-            + f"author={author}\n" \
-            + f"gametitle={gametitle}\n" \
-            + "description=Generated with Sly String Toolkit\n" \
-            + "https://github.com/theonlyzac/sly-string-toolkit\n" \
-            + f"date={timestamp}\n"
+        header_lines = self.gen_header_lines(input_file, mod_name, author)
 
-        # Add all mod chunks to final pnach
+        # Leave out the words that the game RAM already has, except for the hook
+        payload_chunks = ([mod_chunk] if needs_hook else []) + [auto_strings_chunk] + table_chunks + manual_sting_chunks
+        if self.baseline_dump is not None:
+            payload_chunks = self._drop_unchanged_words(payload_chunks)
+
+        # Add all mod chunks to final pnach, or only the hook if the rest is written
+        # once or without the language check
         final_mod_patch = pnach.Pnach(header=header_lines, patch_format=patch_format)
-        final_mod_patch.add_chunk(hook_chunk)
-        final_mod_patch.add_chunk(mod_chunk)
-        final_mod_patch.add_chunk(auto_strings_chunk)
-        for chunk in manual_sting_chunks:
-            final_mod_patch.add_chunk(chunk)
+        if needs_hook:
+            final_mod_patch.add_chunk(hook_chunk)
+        patches = [final_mod_patch]
+        if self.static_placement == "continuous" and (self.lang is None or self.lang_gate == "all"):
+            for chunk in payload_chunks:
+                final_mod_patch.add_chunk(chunk)
+        else:
+            # The sentinel goes right after the strings and tables
+            sentinel_address = (max(chunk.get_address() + chunk.size for chunk in [auto_strings_chunk] + table_chunks) + 3) & ~3
+            patches.append(self._gen_payload_patch(payload_chunks, sentinel_address, patch_format))
+
+            # Once and sentinel placement can't gate the payload on the language: patch=0 lines
+            # are applied at boot before the game has set its language, and the sentinel takes
+            # the only conditional of the payload pnach
+            if self.verbose and self.lang is not None and self.static_placement != "continuous" and self.lang_gate == "all":
+                self.logger.info(f"Only the hook is gated on the language with {self.static_placement} placement")
+
+            if self.verbose and self.lang is not None and self.static_placement == "continuous":
+                self.logger.info(f"Only gating the hook on the language removed {patches[-1].get_num_conditional_lines()} conditional lines")
 
         # Print final pnach if verbose
         if self.verbose:
-            print("Final mod pnach:")
-            print(final_mod_patch)
+            self.logger.info("Final mod pnach:")
+            self.logger.info(final_mod_patch)
+
+        # Pointers in the game's string table are written continuously, in case it's reloaded
+        patches += direct_patches
 
         if self.lang is None:
-            return str(final_mod_patch)
+            return patches, all_string_pointers, trampoline_binary
 
         # Add language check conditional to final pnach
         final_mod_patch.add_conditional(self.lang_adr, self.lang, 'eq')
 
         # Generate pnach which cancels the function hook by setting the asm back to the original
         cancel_hook_patch = pnach.Pnach(patch_format=patch_format)
-        cancel_hook_asm = "jr $ra\nlw $v0, 0x4($a0)"
-        cancel_hook_bytes, count = self.assemble(cancel_hook_asm)
-
-        # Keystone does this annoying thing where it always adds a dummy nop after a jump
-        # so we need to trim out the middle 4 bytes
-        cancel_hook_bytes = cancel_hook_bytes[:4] + cancel_hook_bytes[8:]
+        cancel_hook_bytes = self.get_cancel_hook_code()
 
         cancel_hook_chunk = pnach.Chunk(self.hook_adr, cancel_hook_bytes,
             f"Loading {len(cancel_hook_bytes)} bytes of machine code (hook cancel) at {hex(self.hook_adr)}...", patch_format=patch_format)
@@ -305,10 +741,63 @@ class Generator:
         cancel_hook_patch.add_conditional(self.lang_adr, self.lang, 'neq')
 
         if self.verbose:
-            print("Cancel hook pnach:")
-            print(cancel_hook_patch)
+            self.logger.info("Cancel hook pnach:")
+            self.logger.info(cancel_hook_patch)
+
+        return patches + [cancel_hook_patch], all_string_pointers, trampoline_binary
+
+    @staticmethod
+    def get_default_mod_name(input_file: CsvSource) -> str:
+        """
+        Returns the mod name used when none is set, which is the name of the input file
+        """
+        name = Generator._get_source_name(input_file)
+        if name is None:
+            return DEFAULT_MOD_NAME
+        return os.path.splitext(os.path.basename(name))[0]
+
+    @staticmethod
+    def _get_source_name(input_file: CsvSource) -> str:
+        """
+        Returns the path of the input file, or None if it's rows or a file object without a name
+        """
+        if isinstance(input_file, str):
+            return input_file
+        name = getattr(input_file, "name", None)
+        return name if isinstance(name, str) else None
 
-        return str(final_mod_patch) + str(cancel_hook_patch)
+    def gen_header_lines(self, input_file: CsvSource, mod_name: str = None, author: str = "Sly String Toolkit") -> str:
+        """
+        Generates the header lines of the mod pnach, with the current date
+        """
+        # Set the mod name (default is same as input file)
+        if (mod_name is None or mod_name == ""):
+            mod_name = self.get_default_mod_name(input_file)
+
+        timestamp = datetime.now().strftime(DATE_FORMAT)
+        gametitle= self.game_info.title
+        return f"[{mod_name}]\n" \
+            + f"author={author}\n" \
+            + f"gametitle={gametitle}\n" \
+            + "description=Generated with Sly String Toolkit\n" \
+            + "https://github.com/theonlyzac/sly-string-toolkit\n" \
+            + f"date={timestamp}\n"
+
+    def get_output_path(self, input_file: CsvSource, output_dir: str = "./out/", mod_name: str = None, format: str = "pnach") -> str:
+        """
+        Returns the path of the patch file for the given input file
+        """
+        # Set the mod name (default is same as input file)
+        if (mod_name is None or mod_name == ""):
+            mod_name = self.get_default_mod_name(input_file)
+
+        return os.path.join(output_dir, f"{self.game_info.crc}.{mod_name}.{format}")
+
+    def generate_patch_str(self, input_file: CsvSource, mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", patch_format: str = "pnach") -> str:
+        """
+        Generates the mod pnach text from the given input file
+        """
+        return self.build(input_file, mod_name, author, csv_encoding, patch_format).text
 
     def generate_patch_file(self, input_file: str, output_dir: str = "./out/", mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", format: str = "pnach") -> None:
         """
@@ -318,25 +807,103 @@ class Generator:
         # Create the out folder if it doesn't exist
         if not os.path.exists(output_dir):
             if self.verbose:
-                print("Output directory doesn't exist, creating it...")
-            os.mkdir(output_dir)
-
-        # Set crc based on region
-        crc = self.game_info.crc
+                self.logger.info("Output directory doesn't exist, creating it...")
+            os.makedirs(output_dir, exist_ok=True)
 
         # Set the mod name (default is same as input file)
         if (mod_name is None or mod_name == ""):
-            mod_name = os.path.splitext(os.path.basename(input_file))[0]
+            mod_name = self.get_default_mod_name(input_file)
 
-        # Generate the pnach
-        patch_lines = self.generate_patch_str(input_file, mod_name, author, csv_encoding, format)
+        outfile = self.get_output_path(input_file, output_dir, mod_name, format)
 
-        # Write the final pnach file
-        outfile = os.path.join(output_dir, f"{crc}.{mod_name}.{format}")
-        with open(outfile, "w+", encoding="iso-8859-1") as f:
-            f.write(patch_lines)
+        # Ensure file exists
+        if not os.path.isfile(input_file):
+            raise Exception(f"Error: File {input_file} does not exist")
+
+        # Check the cache for an identical build
+        cached_patch_path = None
+        if self.cache is not None:
+            with open(input_file, "rb") as file:
+                csv_bytes = file.read()
+            # The string layout sidecar changes the output too
+            layout_bytes = b""
+            if self.stable_layout and os.path.isfile(self.get_layout_path(input_file)):
+                with open(self.get_layout_path(input_file), "rb") as file:
+                    layout_bytes = file.read()
+            cache_key = self._get_cache_key(csv_bytes, mod_name, author, csv_encoding, format, layout_bytes)
+            # Cross-checking against Keystone needs an actual build, and so does writing
+            # the assembly and machine code to the debug folder
+            if not self.keystone_check and self.debug_dir is None:
+                cached_patch_path = self.cache.get_patch_path(cache_key)
+            if cached_patch_path is not None and self.verbose:
+                self.logger.info(f"Using cached build {cache_key}")
+
+        if cached_patch_path is not None:
+            # The cached patch has the date of the build that stored it
+            with open(cached_patch_path, "rb") as file:
+                timestamp = datetime.now().strftime(DATE_FORMAT).encode("iso-8859-1")
+                patch_bytes = DATE_LINE.sub(lambda match: match.group(1) + timestamp, file.read(), count=1)
+            written = write_file_if_changed(outfile, patch_bytes, DATE_LINE)
+        else:
+            # Generate the pnach and stream it to a temporary file next to the output
+            patches = self.generate_patches(input_file, mod_name, author, csv_encoding, format)
+            temp_outfile = get_temp_path(outfile)
+            with open(temp_outfile, "w", encoding="iso-8859-1", newline="\n") as f:
+                for patch in patches:
+                    patch.write(f)
+            written = replace_file_if_changed(temp_outfile, outfile, DATE_LINE)
+
+            if self.cache is not None:
+                chunks = [chunk for patch in patches for chunk in patch.get_chunks()]
+                strings_bytes = b''.join(chunk.get_bytes() for chunk in chunks if chunk.get_address() == self.strings_adr)
+                code_bytes = b''.join(chunk.get_bytes() for chunk in chunks if chunk.get_address() == self.code_address)
+                self.cache.store(cache_key, strings_bytes, code_bytes, outfile)
+
+        # Report whether the final pnach file changed
+        if written:
+            self.logger.info(f"Wrote pnach file to {outfile}")
+        else:
+            self.logger.info(f"Pnach file {outfile} is already up to date")
 
-        print(f"Wrote pnach file to {outfile}")
+    def _get_cache_key(self, csv_bytes: bytes, mod_name: str, author: str, csv_encoding: str, patch_format: str, layout_bytes: bytes = b"") -> str:
+        """
+        Returns the build cache key for the given csv contents (and string layout) and the generator settings
+        """
+        params = {
+            "code": get_code_hash(),
+            "game_info": asdict(self.game_info),
+            "lang": self.lang,
+            "strings_adr": self.strings_adr,
+            "code_address": self.code_address,
+            "hook_adr": self.hook_adr,
+            "lookup": self.lookup,
+            "range_threshold": self.range_threshold,
+            "compress_strings": self.compress_strings,
+            "baseline_dump": self._get_dump_id(self.baseline_dump),
+            "static_placement": self.static_placement,
+            "lang_gate": self.lang_gate,
+            "multi_lang": self.multi_lang,
+            "stable_layout": self.stable_layout,
+            "layout": hashlib.sha256(layout_bytes).hexdigest() if self.stable_layout else None,
+            "string_table": self.string_table,
+            "string_table_dump": self._get_dump_id(self.string_table_dump),
+            "mod_name": mod_name,
+            "author": author,
+            "csv_encoding": csv_encoding,
+            "patch_format": patch_format,
+        }
+        return BuildCache.get_key(csv_bytes, params)
+
+    @staticmethod
+    def _get_dump_id(dump_file: str) -> list:
+        """
+        Returns the path, size and modification time of a RAM dump, which
+        identify it in the cache key without hashing the whole dump
+        """
+        if dump_file is None:
+            return None
+        stat = os.stat(dump_file)
+        return [os.path.abspath(dump_file), stat.st_size, stat.st_mtime_ns]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+"""
+This file contains the PatchInjector class, which writes the chunks of generated patches straight
+into the memory of a running emulator over PINE, instead of waiting for it to reload the pnach.
+"""
+import struct
+from typing import List, Tuple
+from generator import pnach
+from utils.pine import PineClient
+
+# Number of bytes compared at a time against what was written before
+DIFF_BLOCK_SIZE = 0x100
+
+class PatchInjector:
+    """
+    PatchInjector class, remembers what it wrote so later builds only send the words that changed
+    """
+    def __init__(self, client: PineClient, hook_address: int, unhook_code: bytes = None):
+        """
+        Initializes the injector with a PINE client. Chunks at the hook address are always
+        written last, so the game never jumps to code or tables that are only half written.
+        If the code to undo the hook is given, it's written first whenever the mod changes
+        while the hook could be in place (it was written before, or the patches have it),
+        and the hook is written again at the end.
+        """
+        self.client = client
+        self.hook_address = hook_address
+        self.unhook_code = unhook_code
+
+        # Padded bytes last written at each chunk address
+        self.sent = {}
+
+    def reset(self) -> None:
+        """
+        Forgets what was written, so the next injection sends every word (like after a reboot)
+        """
+        self.sent = {}
+
+    def inject(self, patches: List[pnach.Pnach]) -> Tuple[int, int]:
+        """
+        Writes the words of the patches that changed since the last injection. Patches with a
+        conditional are only written if the condition holds in the emulator's memory right now.
+        Returns the number of words written and the number of messages they took.
+        """
+        # Read every conditional address in one go
+        conditionals = [patch.get_conditionals() for patch in patches]
+        cond_addresses = sorted({cond["address"] for cond in conditionals if len(cond) != 0})
+        cond_values = dict(zip(cond_addresses, self.client.read16_batch(cond_addresses))) if len(cond_addresses) != 0 else {}
+
+        chunks = []
+        for patch, cond in zip(patches, conditionals):
+            if len(cond) != 0:
+                is_equal = cond_values[cond["address"]] == cond["value"] & 0xFFFF
+                if is_equal != (cond["type"] == 0):
+                    continue
+            chunks += patch.get_chunks()
+
+        # Write the hook last
+        hook_chunks = [chunk for chunk in chunks if chunk.get_address() == self.hook_address]
+        payload_chunks = [chunk for chunk in chunks if chunk.get_address() != self.hook_address]
+
+        words = []
+        new_sent = {}
+        for chunk in payload_chunks:
+            data = self._get_padded_bytes(chunk)
+            words += self._get_changed_words(chunk.get_address(), data)
+            new_sent[chunk.get_address()] = data
+
+        hook_words = []
+        for chunk in hook_chunks:
+            data = self._get_padded_bytes(chunk)
+            hook_words += self._get_changed_words(chunk.get_address(), data)
+            new_sent[chunk.get_address()] = data
+
+        # Take the hook out while the code and tables change under it, then put it back. The
+        # hook could already be in memory from the pnach even if it wasn't injected before.
+        if len(words) != 0 and self.unhook_code is not None and (len(hook_chunks) != 0 or self.hook_address in self.sent) \
+            and self.sent.get(self.hook_address) != self._pad(self.unhook_code):
+            words = self._get_words(self.hook_address, self._pad(self.unhook_code)) + words
+            new_sent.setdefault(self.hook_address, self._pad(self.unhook_code))
+            hook_words = []
+            for chunk in hook_chunks:
+                hook_words += self._get_words(chunk.get_address(), new_sent[chunk.get_address()])
+
+        words += hook_words
+        num_messages = self.client.write32_batch(words)
+        self.sent.update(new_sent)
+        return len(words), num_messages
+
+    @staticmethod
+    def _pad(data: bytes) -> bytes:
+        """
+        Returns the bytes with a partial word at the end padded with zero bytes, like the patch lines
+        """
+        return bytes(data) + b"\x00" * (-len(data) % 4)
+
+    def _get_padded_bytes(self, chunk: pnach.Chunk) -> bytes:
+        """
+        Returns a copy of the chunk's bytes, padded to whole words
+        """
+        return self._pad(chunk.get_bytes())
+
+    @staticmethod
+    def _get_words(address: int, data: bytes) -> List[Tuple[int, int]]:
+        """
+        Returns the (address, value) pairs of the words in the data
+        """
+        values = struct.unpack(f"<{len(data) // 4}I", data)
+        return [(address + i * 4, value) for i, value in enumerate(values)]
+
+    def _get_changed_words(self, address: int, data: bytes) -> List[Tuple[int, int]]:
+        """
+        Returns the (address, value) pairs of the chunk's words that weren't written before,
+        comparing a block at a time and only comparing the words of blocks that differ
+        """
+        previous = self.sent.get(address)
+        if previous == data:
+            return []
+        if previous is None or len(previous) != len(data):
+            return self._get_words(address, data)
+
+        words = []
+        for block_start in range(0, len(data), DIFF_BLOCK_SIZE):
+            block = data[block_start:block_start + DIFF_BLOCK_SIZE]
+            previous_block = previous[block_start:block_start + DIFF_BLOCK_SIZE]
+            if block == previous_block:
+                continue
+            for offset in range(0, len(block), 4):
+                if block[offset:offset + 4] != previous_block[offset:offset + 4]:
+                    words.append((address + block_start + offset, struct.unpack_from("<I", block, offset)[0]))
+        return words
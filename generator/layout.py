@@ -0,0 +1,138 @@
+"""
+This file contains the StringLayout class, which gives each string a stable slot in the strings
+blob and remembers it in a sidecar file, so editing a string doesn't move the ones after it.
+"""
+import json
+import os
+from typing import List, Tuple
+from generator.cache import write_file_if_changed
+
+# Version of the sidecar file format
+LAYOUT_VERSION = 1
+
+# Each new slot gets an extra 1/SLACK_DIVISOR of the string's size, so it can grow a little
+SLACK_DIVISOR = 4
+
+# The blob is padded to a multiple of this many bytes (plus slack), so the lookup tables
+# after it don't move every time a string is added
+RESERVE_ALIGNMENT = 0x100
+
+def get_slot_capacity(size: int) -> int:
+    """
+    Returns the capacity of a new slot for a string of the given size (with slack), in whole words
+    """
+    return (size + size // SLACK_DIVISOR + 3) & ~3
+
+class StringLayout:
+    """
+    StringLayout class, allocates word-aligned slots for strings by key (like the string ID).
+    A string stays in its slot as long as it fits, and freed slots are reused by new strings.
+    """
+    def __init__(self, strings_address: int):
+        """
+        Initializes an empty layout for the strings blob at the given address
+        """
+        self.strings_address = strings_address
+        self.size = 0
+        self.reserved = 0
+        self.slots = {}
+        self.free = []
+        self.moved = 0
+
+    @staticmethod
+    def load(path: str, strings_address: int) -> "StringLayout":
+        """
+        Loads the layout from a sidecar file, or returns an empty layout if the file doesn't
+        exist or was made for a different strings address
+        """
+        layout = StringLayout(strings_address)
+        if not os.path.isfile(path):
+            return layout
+
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if data.get("version") != LAYOUT_VERSION or data.get("strings_address") != strings_address:
+            return layout
+
+        layout.size = data["size"]
+        layout.reserved = data["reserved"]
+        layout.slots = {key: tuple(slot) for key, slot in data["slots"].items()}
+        layout.free = [tuple(block) for block in data["free"]]
+        return layout
+
+    def save(self, path: str) -> bool:
+        """
+        Saves the layout to a sidecar file, unless it didn't change. Returns whether it was written.
+        """
+        data = {
+            "version": LAYOUT_VERSION,
+            "strings_address": self.strings_address,
+            "size": self.size,
+            "reserved": self.reserved,
+            "slots": self.slots,
+            "free": self.free,
+        }
+        return write_file_if_changed(path, json.dumps(data, indent=1).encode("utf-8"))
+
+    def _allocate(self, capacity: int) -> int:
+        """
+        Returns the offset of a free block of the given capacity, taking the first free
+        block that's big enough or growing the blob if there isn't one
+        """
+        for i, (offset, size) in enumerate(self.free):
+            if size >= capacity:
+                if size == capacity:
+                    del self.free[i]
+                else:
+                    self.free[i] = (offset + capacity, size - capacity)
+                return offset
+
+        offset = self.size
+        self.size += capacity
+        return offset
+
+    def _release(self, offset: int, capacity: int) -> None:
+        """
+        Adds a block to the free list, merging it with the free blocks next to it
+        """
+        self.free.append((offset, capacity))
+        self.free.sort()
+        merged = []
+        for block_offset, block_size in self.free:
+            if merged and merged[-1][0] + merged[-1][1] == block_offset:
+                merged[-1] = (merged[-1][0], merged[-1][1] + block_size)
+            else:
+                merged.append((block_offset, block_size))
+        self.free = merged
+
+    def place(self, keys: List[str], strings: List[bytes]) -> Tuple[bytes, List[int]]:
+        """
+        Places the strings in their slots and returns the blob with the offset of each string.
+        Strings that no longer fit their slot, or that are new, get a new slot, and the slots
+        of keys that aren't in the list any more are freed. For duplicate keys the last string wins.
+        """
+        latest = dict(zip(keys, strings))
+
+        # Free the slots of removed strings and strings that outgrew their slot first, so
+        # the space can be reused in the same build
+        self.moved = 0
+        for key, (offset, capacity) in list(self.slots.items()):
+            if key not in latest or len(latest[key]) > capacity:
+                self._release(offset, capacity)
+                del self.slots[key]
+
+        for key, string in latest.items():
+            if key not in self.slots:
+                capacity = get_slot_capacity(len(string))
+                self.slots[key] = (self._allocate(capacity), capacity)
+                self.moved += 1
+
+        if self.size > self.reserved:
+            self.reserved = (self.size + self.size // SLACK_DIVISOR + RESERVE_ALIGNMENT - 1) & ~(RESERVE_ALIGNMENT - 1)
+
+        blob = bytearray(self.reserved)
+        for key, string in latest.items():
+            offset = self.slots[key][0]
+            blob[offset:offset + len(string)] = string
+
+        return bytes(blob), [self.slots[key][0] for key in keys]
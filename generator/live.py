@@ -0,0 +1,308 @@
+"""
+This file contains the LiveBuild class, which regenerates a mod's patch file every time its csv
+is saved. The previous build is kept in memory, and when only the text of some strings changed
+(and they still fit their slot), just those strings and their code lines are generated again.
+"""
+import bisect
+import csv
+import io
+import os
+from typing import Callable, Dict, List, Optional
+from generator import strings
+from generator.cache import write_file_if_changed
+from generator.generator import DATE_LINE
+from generator.layout import StringLayout
+
+# Number of characters compared at a time when looking for the edited part of the csv
+DIFF_BLOCK_SIZE = 0x1000
+
+# Number of code lines in each piece of rendered text, which is the unit that is rendered again
+PIECE_LINES = 0xFF
+
+# Default time the watcher waits after the last file event before building, in milliseconds
+DEFAULT_DEBOUNCE_MS = 100
+
+def get_common_prefix_length(a: str, b: str) -> int:
+    """
+    Returns the number of characters at the start of both strings that are the same
+    """
+    length = min(len(a), len(b))
+    pos = 0
+    while pos + DIFF_BLOCK_SIZE <= length and a[pos:pos + DIFF_BLOCK_SIZE] == b[pos:pos + DIFF_BLOCK_SIZE]:
+        pos += DIFF_BLOCK_SIZE
+    while pos < length and a[pos] == b[pos]:
+        pos += 1
+    return pos
+
+def get_common_suffix_length(a: str, b: str, max_length: int) -> int:
+    """
+    Returns the number of characters (up to max_length) at the end of both strings that are the same
+    """
+    a_end = len(a)
+    b_end = len(b)
+    pos = 0
+    while pos + DIFF_BLOCK_SIZE <= max_length and a[a_end - pos - DIFF_BLOCK_SIZE:a_end - pos] == b[b_end - pos - DIFF_BLOCK_SIZE:b_end - pos]:
+        pos += DIFF_BLOCK_SIZE
+    while pos < max_length and a[a_end - pos - 1] == b[b_end - pos - 1]:
+        pos += 1
+    return pos
+
+class LiveBuild:
+    """
+    LiveBuild class, keeps the rows, chunks and rendered text of the last build of a csv file
+    """
+    def __init__(self, generator, input_file: str, output_dir: str = "./out/", mod_name: str = None, author: str = "Sly String Toolkit", csv_encoding: str = "utf-8", patch_format: str = "pnach"):
+        """
+        Initializes the live build of the input file with the given generator. The generator
+        gets a string layout that is kept between builds (loaded from the sidecar file if
+        stable layout is enabled), so each string stays in its slot while it fits.
+        """
+        self.generator = generator
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.mod_name = mod_name
+        self.author = author
+        self.csv_encoding = csv_encoding
+        self.patch_format = patch_format
+        self.outfile = generator.get_output_path(input_file, output_dir, mod_name, patch_format)
+
+        if generator.layout is None:
+            if generator.stable_layout:
+                generator.layout = StringLayout.load(generator.get_layout_path(input_file), generator.strings_adr)
+            else:
+                generator.layout = StringLayout(generator.strings_adr)
+
+        # Rows of the last build, and whether each line of the csv is one row
+        self.csv_text = None
+        self.rows = None
+        self.rows_are_lines = False
+        self.last_rows = {}
+
+        # Chunks and rendered text of the last build, and the offset of each piece in the file
+        self.patches = None
+        self.strings_chunk = None
+        self.texts = []
+        self.text_offsets = []
+        self.strings_pieces = []
+        self.strings_piece_starts = []
+        self.file_stat = None
+
+    def can_update_in_place(self) -> bool:
+        """
+        Returns whether the generator's options allow updating strings in place. The strings
+        blob has to be written as is, and the rest of the patch must not depend on its bytes.
+        """
+        generator = self.generator
+        return not generator.compress_strings and not generator.multi_lang and generator.baseline_dump is None \
+            and generator.static_placement != "sentinel"
+
+    def build(self, is_superseded: Callable[[], bool] = None) -> Optional[bool]:
+        """
+        Regenerates the patch file if the csv changed. Returns True if the changed strings
+        were updated in place, False if the whole patch was generated again, or None if
+        the csv didn't change. If is_superseded is given and returns True once the whole
+        patch is generated, the patch isn't written and None is returned, since a newer
+        build is on the way.
+        """
+        with open(self.input_file, "r", encoding=self.csv_encoding) as file:
+            csv_text = file.read()
+        if csv_text == self.csv_text:
+            return None
+
+        changed_rows = self._diff_rows(csv_text)
+        changed_pieces = None if changed_rows is None else self._update_in_place(changed_rows)
+        updated = changed_pieces is not None and self._update_file(changed_pieces)
+        if updated:
+            if self.generator.verbose:
+                self.generator.logger.info(f"Updated {len(changed_rows)} rows in place")
+        elif not self._build_all(csv_text, is_superseded):
+            return None
+
+        self.csv_text = csv_text
+        return updated
+
+    def _diff_rows(self, csv_text: str) -> Optional[Dict[int, List[str]]]:
+        """
+        Returns the rows that changed since the last build by index, only parsing the lines
+        around the edited part of the csv. Returns None if the rows can't be matched up by
+        line (like when lines were added or removed).
+        """
+        if self.rows is None or not self.rows_are_lines:
+            return None
+
+        # Find the lines that changed between the two versions of the csv
+        old_text = self.csv_text
+        prefix_length = get_common_prefix_length(old_text, csv_text)
+        suffix_length = get_common_suffix_length(old_text, csv_text, min(len(old_text), len(csv_text)) - prefix_length)
+        start = old_text.rfind("\n", 0, prefix_length) + 1
+        old_end = old_text.find("\n", len(old_text) - suffix_length)
+        old_end = len(old_text) if old_end == -1 else old_end
+        new_end = len(csv_text) - (len(old_text) - old_end)
+
+        old_lines = old_text[start:old_end].split("\n")
+        new_lines = csv_text[start:new_end].split("\n")
+        if len(old_lines) != len(new_lines):
+            return None
+
+        # A line with an open quote could continue on the next line
+        if any(line.count('"') % 2 != 0 for line in new_lines):
+            return None
+
+        first_row = old_text.count("\n", 0, start)
+        new_rows = list(csv.reader(new_lines))
+        if len(new_rows) != len(new_lines) or first_row + len(new_rows) > len(self.rows):
+            return None
+
+        return {first_row + i: row for i, row in enumerate(new_rows) if row != self.rows[first_row + i]}
+
+    def _build_all(self, csv_text: str, is_superseded: Callable[[], bool] = None) -> bool:
+        """
+        Generates the whole patch and writes it, keeping its rows, chunks and rendered text.
+        Returns False without writing it if the build was superseded.
+        """
+        self.patches = None
+        patches = self.generator.generate_patches(self.input_file, self.mod_name, self.author, self.csv_encoding, self.patch_format)
+        if is_superseded is not None and is_superseded():
+            return False
+
+        # Keep the rows, and index the last row of each string ID, since that's the string in its slot
+        self.rows = list(csv.reader(io.StringIO(csv_text)))
+        self.rows_are_lines = len(self.rows) == len(csv_text.split("\n")) - (1 if csv_text.endswith("\n") else 0)
+        self.last_rows = {}
+        if self.can_update_in_place():
+            self.last_rows = {str(int(row[0])): i for i, row in enumerate(self.rows) if not self._is_manual(row)}
+
+        # Keep the strings blob in a bytearray so the strings can be replaced in place
+        self.strings_chunk = None
+        for patch in patches:
+            for chunk in patch.get_chunks():
+                if self.strings_chunk is None and chunk.get_address() == self.generator.strings_adr:
+                    self.strings_chunk = chunk
+                    chunk.set_bytes(bytearray(chunk.get_bytes()))
+
+        # Render the text in pieces, and remember which pieces have the strings' lines
+        self.texts = []
+        self.text_offsets = []
+        self.strings_pieces = []
+        offset = 0
+        for patch in patches:
+            for text, chunk, start, count in patch.iter_text(PIECE_LINES):
+                if chunk is not None and chunk is self.strings_chunk:
+                    self.strings_pieces.append((len(self.texts), patch, start, count))
+                self.texts.append(text)
+                self.text_offsets.append(offset)
+                offset += len(text.encode("iso-8859-1"))
+        self.text_offsets.append(offset)
+        self.strings_piece_starts = [start for _, _, start, _ in self.strings_pieces]
+
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        if write_file_if_changed(self.outfile, "".join(self.texts).encode("iso-8859-1"), DATE_LINE):
+            self.generator.logger.info(f"Wrote pnach file to {self.outfile}")
+        else:
+            self.generator.logger.info(f"Pnach file {self.outfile} is already up to date")
+        self.file_stat = self._get_file_stat()
+        self.patches = patches
+        return True
+
+    def _update_in_place(self, changed_rows: Dict[int, List[str]]) -> Optional[List[int]]:
+        """
+        Writes the strings of the changed rows over their old strings in the blob and renders
+        their lines again. Returns the indexes of the pieces of text that changed, or None if
+        the whole patch has to be generated again (because an ID or address changed, a string
+        outgrew its slot, or the patch file was changed by something else).
+        """
+        if self.patches is None or self.strings_chunk is None or not self.can_update_in_place():
+            return None
+        if self._get_file_stat() != self.file_stat:
+            return None
+
+        # Make sure every changed string still fits its slot
+        layout = self.generator.layout
+        strings_obj = strings.Strings(self.input_file, self.generator.strings_adr, self.csv_encoding, self.generator.game_info.encoding)
+        updates = {}
+        for i, row in changed_rows.items():
+            old_row = self.rows[i]
+            if len(row) < 2 or len(old_row) < 2 or self._is_manual(row) or self._is_manual(old_row):
+                return None
+            try:
+                if int(row[0]) != int(old_row[0]):
+                    return None
+            except ValueError:
+                return None
+
+            # Duplicate IDs all point to the slot of the last one
+            key = str(int(row[0]))
+            last_row = self.last_rows[key]
+            updates[key] = changed_rows.get(last_row, self.rows[last_row])[1]
+
+        writes = []
+        for key, string in updates.items():
+            if key not in layout.slots:
+                return None
+            offset, capacity = layout.slots[key]
+            string_bytes = strings_obj.encode_string(string)
+            if len(string_bytes) > capacity:
+                return None
+            writes.append((offset, string_bytes.ljust(capacity, b"\x00")))
+
+        for i, row in changed_rows.items():
+            self.rows[i] = row
+
+        # Replace the strings and render the pieces with their words again
+        blob = self.strings_chunk.get_bytes()
+        pieces = set()
+        for offset, data in writes:
+            blob[offset:offset + len(data)] = data
+            first = bisect.bisect_right(self.strings_piece_starts, offset // 4) - 1
+            last = bisect.bisect_right(self.strings_piece_starts, (offset + len(data) - 1) // 4) - 1
+            pieces.update(range(first, last + 1))
+
+        changed_pieces = []
+        for piece in sorted(pieces):
+            text_index, patch, start, count = self.strings_pieces[piece]
+            self.texts[text_index] = patch.get_code_piece(self.strings_chunk, start, count)
+            changed_pieces.append(text_index)
+
+        return changed_pieces
+
+    def _update_file(self, changed_pieces: List[int]) -> bool:
+        """
+        Writes the changed pieces of text (and the header, which has the date) over the old
+        ones in the patch file. Every code line has a fixed length, so nothing else moves.
+        Returns False without writing anything if a piece would change length.
+        """
+        self.patches[0].set_header(self.generator.gen_header_lines(self.input_file, self.mod_name, self.author))
+        self.texts[0] = self.patches[0].get_header() + "\n"
+
+        writes = []
+        for text_index in [0] + changed_pieces:
+            data = self.texts[text_index].encode("iso-8859-1")
+            if len(data) != self.text_offsets[text_index + 1] - self.text_offsets[text_index]:
+                return False
+            writes.append((self.text_offsets[text_index], data))
+
+        with open(self.outfile, "r+b") as file:
+            for offset, data in writes:
+                file.seek(offset)
+                file.write(data)
+
+        self.file_stat = self._get_file_stat()
+        self.generator.logger.info(f"Wrote pnach file to {self.outfile}")
+        return True
+
+    def _get_file_stat(self) -> tuple:
+        """
+        Returns the size and modification time of the patch file, or None if it doesn't exist
+        """
+        if not os.path.isfile(self.outfile):
+            return None
+        stat = os.stat(self.outfile)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _is_manual(row: List[str]) -> bool:
+        """
+        Returns whether the row has a target address, like in Strings.gen_pnach_chunks
+        """
+        return len(row) > 2 and row[2] != ''
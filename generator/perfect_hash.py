@@ -0,0 +1,145 @@
+"""
+This file contains the PerfectHash class, which builds a minimal perfect hash over the
+custom string IDs so the trampoline can find any of them with a single table probe.
+"""
+import random
+import struct
+from typing import List
+
+# All hash arithmetic is done on 32-bit words, the same as on the EE
+WORD_MASK = 0xFFFFFFFF
+
+# Average number of keys per bucket
+KEYS_PER_BUCKET = 2
+
+# Number of multiplier pairs to try before giving up
+MAX_ATTEMPTS = 100
+
+class PerfectHash:
+    """
+    Minimal perfect hash using the hash-and-displace scheme. For a key (string ID):
+
+        h = key * mul1
+        bucket = (h * num_buckets) >> 32
+        base = ((h * mul2) * num_keys) >> 32
+        slot = (base + displacements[bucket]) % num_keys
+
+    All multiplications are 32-bit, and since both terms of the sum are less than
+    num_keys, the modulo is at most one subtraction. Every key gets its own slot
+    in [0, num_keys), so the slot table has no empty entries.
+    """
+    def __init__(self, keys: List[int], seed: int = 0):
+        """
+        Builds the hash for the given list of unique keys
+        """
+        self.keys = list(keys)
+        self.num_keys = len(self.keys)
+        self.num_buckets = max(1, self.num_keys // KEYS_PER_BUCKET)
+
+        if self.num_keys > 0x10000:
+            raise ValueError(f"Too many string IDs for the hash lookup ({self.num_keys}, max is {0x10000})")
+        if len(set(self.keys)) != self.num_keys:
+            raise ValueError("Duplicate string IDs can't be hashed")
+
+        rng = random.Random(seed)
+        for _ in range(MAX_ATTEMPTS):
+            self.mul1 = rng.getrandbits(32) | 1
+            self.mul2 = rng.getrandbits(32) | 1
+            if self._try_build():
+                return
+
+        raise ValueError(f"Failed to build a perfect hash for {self.num_keys} string IDs")
+
+    def _hash(self, key: int) -> int:
+        """
+        Returns the first-level hash of the key
+        """
+        return (key * self.mul1) & WORD_MASK
+
+    def get_bucket(self, key: int) -> int:
+        """
+        Returns the bucket of the key
+        """
+        return (self._hash(key) * self.num_buckets) >> 32
+
+    def get_base(self, key: int) -> int:
+        """
+        Returns the slot of the key before displacement
+        """
+        return ((((self._hash(key) * self.mul2) & WORD_MASK)) * self.num_keys) >> 32
+
+    def get_slot(self, key: int) -> int:
+        """
+        Returns the slot of the key in the table
+        """
+        slot = self.get_base(key) + self.displacements[self.get_bucket(key)]
+        if slot >= self.num_keys:
+            slot -= self.num_keys
+        return slot
+
+    def _try_build(self) -> bool:
+        """
+        Tries to find a displacement for every bucket with the current multipliers
+        """
+        num_keys = self.num_keys
+
+        # Group the key bases by bucket
+        buckets = [[] for _ in range(self.num_buckets)]
+        for index, key in enumerate(self.keys):
+            buckets[self.get_bucket(key)].append((self.get_base(key), index))
+
+        # Keys in a bucket are moved together, so they need different bases
+        for bucket in buckets:
+            if len(bucket) > 1 and len({base for base, _ in bucket}) != len(bucket):
+                return False
+
+        self.displacements = [0] * self.num_buckets
+        self.slots = [None] * num_keys
+        occupied = bytearray(num_keys)
+
+        # Place the biggest buckets first while the table is still empty
+        order = sorted(range(self.num_buckets), key=lambda b: len(buckets[b]), reverse=True)
+        single_start = len(order)
+        for i, bucket_index in enumerate(order):
+            bucket = buckets[bucket_index]
+            if len(bucket) < 2:
+                single_start = i
+                break
+
+            for displacement in range(num_keys):
+                slots = []
+                for base, _ in bucket:
+                    slot = base + displacement
+                    if slot >= num_keys:
+                        slot -= num_keys
+                    if occupied[slot]:
+                        break
+                    slots.append(slot)
+                else:
+                    break
+            else:
+                return False
+
+            self.displacements[bucket_index] = displacement
+            for slot, (_, index) in zip(slots, bucket):
+                occupied[slot] = 1
+                self.slots[slot] = index
+
+        # Buckets with one key can be displaced straight into any free slot
+        free_slots = (slot for slot in range(num_keys) if not occupied[slot])
+        for bucket_index in order[single_start:]:
+            bucket = buckets[bucket_index]
+            if len(bucket) == 0:
+                break
+            base, index = bucket[0]
+            slot = next(free_slots)
+            self.displacements[bucket_index] = (slot - base) % num_keys
+            self.slots[slot] = index
+
+        return True
+
+    def gen_displacement_table(self) -> bytes:
+        """
+        Returns the displacement of each bucket as little-endian halfwords
+        """
+        return struct.pack(f'<{self.num_buckets}H', *self.displacements)
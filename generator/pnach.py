@@ -1,23 +1,49 @@
 """
 This file contains the Pnach and Chunk classes which are used to generate pnach files.
 """
-from typing import Type, List
+import binascii
+import io
+import struct
+from typing import Iterator, List, TextIO, Tuple, Type
+
+# Layout of a 32-bit write line for each patch format, as the text before the address
+# (with the placement filled in for pnach), the number of address hex digits, and the
+# text between the address and the value
+LINE_FORMATS = {
+    "pnach": ("patch={place},EE,2", 7, ",extended,"),
+    "clps2c": ("W32 ", 8, " 0x"),
+}
+
+# Number of code lines formatted at a time when writing a chunk to a stream
+WRITE_BLOCK_LINES = 0x4000
+
+# The EE has 32 MB of RAM, which is mirrored across the address space
+EE_RAM_MASK = 0x01FFFFFF
+
+# Number of bytes compared at a time against a baseline RAM dump
+BASELINE_BLOCK_SIZE = 0x100
 
 class Chunk:
     """
     Chunk class, used to generate chunks of code lines for pnach files.
+    The data can be any bytes-like object, so chunks can share memory with a
+    bytearray or memoryview without copying it.
     """
-    def __init__(self, address: int, data: bytes = b"", header: str = "", patch_format: str = "pnach"):
+    __slots__ = ("_address", "_bytes", "_header", "_format", "_once")
+
+    def __init__(self, address: int, data: bytes = b"", header: str = "", patch_format: str = "pnach", once: bool = False):
         """
-        Constructor for the Chunk class.
+        Constructor for the Chunk class. If once is set, the lines are only applied
+        once when the game boots (patch=0) instead of continuously (patch=1).
         """
         self._address = address
-        self._bytes = data
+        self._bytes = data.cast("B") if isinstance(data, memoryview) else data
         self._header = header
 
         if patch_format not in ["pnach", "clps2c"]:
             raise ValueError(f"Invalid format specified for pnach chunk: {patch_format}")
         self._format = patch_format
+        self.set_once(once)
 
     # Getter and setter for address
     def get_address(self) -> int:
@@ -35,15 +61,21 @@ class Chunk:
     # Getter and setter for bytes
     def get_bytes(self) -> bytes:
         """
-        Returns the bytes of the chunk.
+        Returns the bytes of the chunk (as the bytes-like object it was created with).
         """
         return self._bytes
 
+    def get_view(self) -> memoryview:
+        """
+        Returns a read-only memoryview of the bytes of the chunk.
+        """
+        return memoryview(self._bytes).cast("B").toreadonly()
+
     def set_bytes(self, new_bytes: bytes) -> None:
         """
         Sets the bytes of the chunk.
         """
-        self._bytes = new_bytes
+        self._bytes = new_bytes.cast("B") if isinstance(new_bytes, memoryview) else new_bytes
 
     # Getter and setter for header
     def get_header(self) -> str:
@@ -63,6 +95,21 @@ class Chunk:
         """
         self._header = header
 
+    # Getter and setter for placement
+    def is_once(self) -> bool:
+        """
+        Returns whether the chunk is only applied once when the game boots.
+        """
+        return self._once
+
+    def set_once(self, once: bool) -> None:
+        """
+        Sets whether the chunk is only applied once when the game boots.
+        """
+        if once and self._format != "pnach":
+            raise ValueError(f"One-time placement is not supported for {self._format}")
+        self._once = once
+
     # Getter for size
     def get_size(self) -> int:
         """
@@ -72,47 +119,169 @@ class Chunk:
 
     size = property(get_size)
 
+    def __len__(self) -> int:
+        """
+        Returns the size of the chunk in bytes.
+        """
+        return len(self._bytes)
+
+    def slice(self, start: int, end: int = None) -> "Chunk":
+        """
+        Returns a new chunk with the bytes from start to end (offsets into this chunk),
+        sharing memory with this chunk instead of copying the bytes.
+        """
+        view = self.get_view()[start:end]
+        return Chunk(self._address + start, view, self._header, self._format, self._once)
+
+    def split_changed(self, baseline: bytes) -> List["Chunk"]:
+        """
+        Returns the parts of the chunk whose words differ from a baseline EE RAM dump
+        (any bytes-like object indexed by address, such as an mmap of the dump file).
+        The chunk is split wherever words already hold the same value in the dump.
+        Only the first part keeps the chunk's header.
+        """
+        data = memoryview(self._get_padded_bytes()).cast("B")
+        dump_start = self._address & EE_RAM_MASK
+
+        # Compare a block at a time, and only compare the words of blocks that differ
+        changed = [False] * (len(data) // 4)
+        for block_start in range(0, len(data), BASELINE_BLOCK_SIZE):
+            block_end = min(block_start + BASELINE_BLOCK_SIZE, len(data))
+            dump_block = baseline[dump_start + block_start:dump_start + block_end]
+            block = bytes(data[block_start:block_end])
+            if block == dump_block:
+                continue
+            for offset in range(0, len(block), 4):
+                if block[offset:offset + 4] != dump_block[offset:offset + 4]:
+                    changed[(block_start + offset) // 4] = True
+
+        # Make a chunk for each run of changed words
+        parts = []
+        run_start = None
+        for index, is_changed in enumerate(changed + [False]):
+            if is_changed and run_start is None:
+                run_start = index
+            elif not is_changed and run_start is not None:
+                part = self.slice(run_start * 4, index * 4)
+                if len(parts) != 0:
+                    part.set_header("")
+                parts.append(part)
+                run_start = None
+
+        return parts
+
+    # Get the chunk's data as 32-bit values
+    def _get_padded_bytes(self) -> bytes:
+        """
+        Returns the bytes of the chunk, with a partial word at the end padded with zero bytes.
+        """
+        remainder = len(self._bytes) % 4
+        if remainder == 0:
+            return self._bytes
+        return bytes(self._bytes) + b"\x00" * (4 - remainder)
+
+    def get_words(self) -> tuple:
+        """
+        Returns the bytes of the chunk as little-endian 32-bit words.
+        A partial word at the end is padded with zero bytes.
+        """
+        data = self._get_padded_bytes()
+        return struct.unpack(f"<{len(data) // 4}I", data)
+
+    # Get code lines as one string
+    def get_code_text(self, start: int = 0, count: int = None) -> str:
+        """
+        Returns the code lines of the chunk joined by newlines. If start or count
+        are given, only returns the lines of those words of the chunk.
+        """
+        data = self.get_view()
+        if start != 0 or count is not None:
+            end = len(data) if count is None else (start + count) * 4
+            data = data[start * 4:end]
+        if len(data) % 4 != 0:
+            data = bytes(data) + b"\x00" * (4 - len(data) % 4)
+        address = self._address + start * 4
+
+        num_words = len(data) // 4
+        if num_words == 0:
+            return ""
+
+        prefix, address_digits, separator = LINE_FORMATS[self._format]
+        prefix = prefix.format(place=0 if self._once else 1)
+        if address + (num_words - 1) * 4 >= 16 ** address_digits:
+            raise ValueError(f"Chunk at address {address:X} doesn't fit in a {self._format} code line")
+
+        # Every line has the same length, so instead of formatting each line, fill the hex
+        # digits of all lines at once with one strided copy per digit
+        line_template = f"{prefix}{'0' * address_digits}{separator}00000000\n".encode("ascii")
+        line_length = len(line_template)
+        text = bytearray(line_template * num_words)
+
+        # Swap the bytes of each word so the hex digits come out most significant first
+        big_endian = bytearray(len(data))
+        for i in range(4):
+            big_endian[i::4] = data[3 - i::4]
+        value_hex = binascii.hexlify(big_endian).upper()
+        address_hex = binascii.hexlify(struct.pack(f">{num_words}I", *range(address, address + num_words * 4, 4))).upper()
+
+        address_start = len(prefix)
+        for i in range(address_digits):
+            text[address_start + i::line_length] = address_hex[8 - address_digits + i::8]
+        value_start = address_start + address_digits + len(separator)
+        for i in range(8):
+            text[value_start + i::line_length] = value_hex[i::8]
+
+        return text[:-1].decode("ascii")
+
     # Get code lines as array
     def get_code_lines(self) -> List[str]:
         """
         Returns the code lines of the chunk as an array.
         """
-        code_lines = []
-        for i in range(0, self.size, 4):
-            address = self._address + i
-            word = self._bytes[i:i+4]
-            # reverse byte order
-            word = word[::-1]
-
-            value = int.from_bytes(word, 'big')
-            if self._format == "pnach":
-                line = f"patch=1,EE,2{address:07X},extended,{value:08X}"
-            elif self._format == "clps2c":
-                line = f"W32 {address:08X} 0x{value:08X}"
-            code_lines.append(line)
-        return code_lines
+        if self.size == 0:
+            return []
+        return self.get_code_text().split("\n")
+
+    # Get the number of code lines
+    def get_num_lines(self) -> int:
+        """
+        Returns the number of code lines of the chunk.
+        """
+        return (self.size + 3) // 4
+
+    def write(self, out: TextIO) -> None:
+        """
+        Writes the chunk's header + code lines to a text stream, a block of lines at a time.
+        """
+        if self._header != "":
+            out.write(self.get_header() + '\n')
+        num_lines = self.get_num_lines()
+        for start in range(0, num_lines, WRITE_BLOCK_LINES):
+            if start != 0:
+                out.write('\n')
+            out.write(self.get_code_text(start, WRITE_BLOCK_LINES))
 
     def __str__(self) -> str:
         """
         Returns a string with the chunk's header + code lines.
         """
-        chunk_str = ""
-        if self._header != "":
-            chunk_str += self.get_header() + '\n'
-        chunk_str += '\n'.join(self.get_code_lines())
-        return chunk_str
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
 
     def __repr__(self) -> str:
         """
         Returns a string representation of the chunk.
         """
-        return f"Chunk: {self._bytes} bytes at address {self._address:X}"
+        return f"Chunk: {self.size} bytes at address {self._address:X}"
 
 
 class Pnach:
     """
     Pnach class, used to generate pnach files.
     """
+    __slots__ = ("_chunks", "_conditionals", "_header", "_format")
+
     def __init__(self, address: str = "", data: bytes = b"", header: str = "", patch_format: str = "pnach"):
         """
         Constructor for the Pnach class.
@@ -189,6 +358,14 @@ class Pnach:
         # Add the conditional
         self._conditionals.update({ "address": address, "value": value, "type": condition })
 
+    def get_num_conditional_lines(self) -> int:
+        """
+        Returns the number of conditional code lines the chunks need when the pnach has
+        a conditional (one per group of 0xFF lines, or IF and ENDIF for clps2c).
+        """
+        num_groups = sum((chunk.get_num_lines() + 0xFE) // 0xFF for chunk in self._chunks)
+        return num_groups * (1 if self._format == "pnach" else 2)
+
     # Chunk methods
     def create_chunk(self, address: int, data: bytes, header: str = "") -> None:
         """
@@ -213,16 +390,13 @@ class Pnach:
         """
         Merges another pnach object's chunks into this one.
         """
-        self._chunks += other.get_chunks()
+        self._chunks.extend(other.get_chunks())
 
     def get_chunk_bytes(self) -> bytes:
         """
         Returns all the bytes from each chunk.
         """
-        chunk_bytes = b""
-        for chunk in self._chunks:
-            chunk_bytes += chunk.get_bytes()
-        return chunk_bytes
+        return b"".join(chunk.get_bytes() for chunk in self._chunks)
 
     # Write pnach to file
     def write_file(self, filename) -> None:
@@ -230,28 +404,43 @@ class Pnach:
         Writes the pnach lines to a file with header.
         """
         with open(filename, "w+", encoding="utf-8") as f:
-            if self._header != "":
-                f.write(self.get_header())
-            for chunk in self._chunks:
-                f.write(str(chunk))
-                f.write("\n")
+            self.write(f)
 
-    # String from pnach lines
-    def get_code_lines(self) -> str:
+    def write(self, out: TextIO) -> None:
         """
-        Returns a string with the pnach lines.
+        Writes the pnach lines to a text stream (a file, socket file or StringIO),
+        without building the whole text in memory.
         """
-        pnach_str = ""
+        for text, _, _, _ in self.iter_text():
+            out.write(text)
 
+    def iter_text(self, block_lines: int = WRITE_BLOCK_LINES) -> Iterator[Tuple[str, Chunk, int, int]]:
+        """
+        Yields the text of the pnach in pieces, as (text, chunk, start, count) tuples. Pieces with
+        a chunk are the code lines of count words of the chunk from start (as returned by
+        get_code_piece), so they can be rendered again if the chunk's bytes change. Other pieces
+        (headers, conditionals and line breaks) have None as the chunk.
+        """
         # Write header
         if self._header != "":
-            pnach_str += self.get_header() + "\n"
+            yield (self.get_header() + "\n", None, 0, 0)
 
         # If there are no conditionals, write all lines
         if len(self._conditionals) == 0:
             # Write all pnach code lines
-            pnach_str += '\n'.join([str(chunk) for chunk in self._chunks]) + "\n"
-            return pnach_str
+            for i, chunk in enumerate(self._chunks):
+                if i != 0:
+                    yield ("\n", None, 0, 0)
+                if chunk._header != "":
+                    yield (chunk.get_header() + "\n", None, 0, 0)
+                num_lines = chunk.get_num_lines()
+                for start in range(0, num_lines, block_lines):
+                    if start != 0:
+                        yield ("\n", None, 0, 0)
+                    count = min(block_lines, num_lines - start)
+                    yield (self.get_code_piece(chunk, start, count), chunk, start, count)
+            yield ("\n", None, 0, 0)
+            return
 
         # If there are conditionals, write conditional lines
         # Conditionals can only check 0xFF lines at a time,
@@ -270,12 +459,10 @@ class Pnach:
 
         for chunk in self._chunks:
             # Add chunk header
-            if chunk.get_header() != "":
-                pnach_str += chunk.get_header() + "\n"
+            if chunk._header != "":
+                yield (chunk.get_header() + "\n", None, 0, 0)
 
-            # Get chunk lines
-            lines = chunk.get_code_lines()
-            num_lines = len(lines)
+            num_lines = chunk.get_num_lines()
 
             # Write lines in groups of 0xFF
             for i in range(0, num_lines, 0xFF):
@@ -286,19 +473,36 @@ class Pnach:
                 num_lines_to_write = 0xFF if num_lines_remaining > 0xFF else num_lines_remaining
 
                 # Add conditional line
-                pnach_str += f"// Conditional: if *0x{cond_address:X} {cond_operator} 0x{cond_value:X} do {num_lines_to_write} lines\n"
+                cond_lines = f"// Conditional: if *0x{cond_address:X} {cond_operator} 0x{cond_value:X} do {num_lines_to_write} lines\n"
                 if self._format == "pnach":
-                    pnach_str += f"patch=1,EE,E0{num_lines_to_write:02X}{cond_value:04X},extended,{cond_type:1X}{cond_address:07X}\n"
+                    place = 0 if chunk.is_once() else 1
+                    cond_lines += f"patch={place},EE,E0{num_lines_to_write:02X}{cond_value:04X},extended,{cond_type:1X}{cond_address:07X}\n"
                 elif self._format == "clps2c":
-                    pnach_str += f"IF 0x{cond_address:X} {cond_operator} 0x{cond_value:X}\n"
+                    cond_lines += f"IF 0x{cond_address:X} {cond_operator} 0x{cond_value:X}\n"
+                yield (cond_lines, None, 0, 0)
 
                 # Write lines to pnach
-                joiner = "\n" if self._format == "pnach" else "\n    "
-                pnach_str += joiner.join(lines[i:i + num_lines_to_write]) + "\n"
-                if self._format == "clps2c":
-                    pnach_str += "ENDIF\n"
+                yield (self.get_code_piece(chunk, i, num_lines_to_write), chunk, i, num_lines_to_write)
+                yield ("\n" if self._format == "pnach" else "\nENDIF\n", None, 0, 0)
+
+    def get_code_piece(self, chunk: Chunk, start: int, count: int) -> str:
+        """
+        Returns the code lines of count words of the chunk from start, the way this pnach writes
+        them (indented after the first line inside clps2c conditionals)
+        """
+        lines = chunk.get_code_text(start, count)
+        if self._format == "clps2c" and len(self._conditionals) != 0:
+            lines = lines.replace("\n", "\n    ")
+        return lines
 
-        return pnach_str
+    # String from pnach lines
+    def get_code_lines(self) -> str:
+        """
+        Returns a string with the pnach lines.
+        """
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
 
     def __str__(self) -> str:
         return self.get_code_lines()
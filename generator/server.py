@@ -0,0 +1,188 @@
+"""
+This file contains the BuildServer class, which keeps the generator loaded and builds patches for
+requests sent over a local Unix socket, so editor integrations don't pay for starting Python and
+importing the toolkit on every build.
+
+Each connection sends one request, a JSON object on a single line with the same options as a
+target of the build subcommand (see batch.py), and gets one reply line back:
+
+    {"csv": "/path/to/mod.csv", "game": 2, "region": "pal", "lang": "fr", "format": "pnach", "output_dir": "/path/to/out"}
+
+Instead of a csv path, a request can have the csv rows inline as "rows" (a list of lists of
+strings). If output_dir is set, the patch is written there and the reply has its path as
+"outfile", otherwise the reply has the patch itself as "text". Replies also have the time
+each step took in milliseconds as "timings", or an "error" if the build failed.
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict
+from generator.cache import write_file_if_changed
+from generator.batch import TARGET_DEFAULTS, GENERATOR_PARAMS, create_generator
+from generator.generator import Generator, GAME_INFO, DATE_LINE
+from utils.build_client import get_default_socket_path
+
+# Options of a request besides the target options
+REQUEST_KEYS = ["csv", "rows", "game", "region"]
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+    """
+    BuildRequestHandler class, reads one request from a client and replies with the result
+    """
+    def handle(self) -> None:
+        """
+        Builds the request and writes the reply
+        """
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Error: The request must be a JSON object")
+            reply = self.server.build(request)
+        except Exception as err:
+            reply = {"error": str(err) or type(err).__name__}
+        reply.setdefault("timings", {})["total"] = (time.perf_counter() - start) * 1000
+        if "error" in reply:
+            print(f"Failed to build a request: {reply['error']}")
+        else:
+            print(f"Built a request in {reply['timings']['total']:.1f} ms")
+
+        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+class BuildServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    BuildServer class, builds the requests of each client on its own thread, reusing a
+    generator for every combination of options it has seen
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = None, cache_dir: str = None):
+        """
+        Initializes the server on the Unix socket (default is in the user's runtime folder).
+        Builds use the build cache in cache_dir unless it's None.
+        """
+        self.socket_path = get_default_socket_path() if socket_path is None else socket_path
+        self.cache_dir = cache_dir
+
+        # Generators by their options, and a lock for each csv (or output file) so that
+        # builds that write the same files don't run at the same time
+        self.generators = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+        self._remove_stale_socket()
+        super().__init__(self.socket_path, BuildRequestHandler)
+
+    def _remove_stale_socket(self) -> None:
+        """
+        Removes the socket file left behind by a server that didn't shut down cleanly,
+        or raises an exception if another server is still using it
+        """
+        if not os.path.exists(self.socket_path):
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+            return
+        finally:
+            sock.close()
+        raise Exception(f"Error: A build server is already running at {self.socket_path}")
+
+    def server_close(self) -> None:
+        """
+        Closes the socket and removes its file
+        """
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def warm_up(self) -> None:
+        """
+        Builds a one-string mod for every game and region, so the first request
+        is as fast as the ones after it
+        """
+        for game, regions in GAME_INFO.items():
+            for region in regions:
+                self.build({"rows": [["1", "Warm up"]], "game": game, "region": region})
+
+    def _get_generator(self, target: Dict) -> Generator:
+        """
+        Returns the generator for the options of the target, creating it the first time
+        """
+        key = tuple(target[key] for key in GENERATOR_PARAMS)
+        with self.lock:
+            generator = self.generators.get(key)
+        if generator is None:
+            generator = create_generator(target)
+            with self.lock:
+                generator = self.generators.setdefault(key, generator)
+        return generator
+
+    def _get_lock(self, key: str) -> threading.Lock:
+        """
+        Returns the lock for the file, creating it the first time
+        """
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def build(self, request: Dict) -> Dict:
+        """
+        Builds the patch of a request and returns the reply
+        """
+        unknown = set(request) - set(TARGET_DEFAULTS) - set(REQUEST_KEYS)
+        if len(unknown) != 0:
+            raise ValueError(f"Error: Unknown request options ({', '.join(sorted(unknown))})")
+        if (request.get("csv") is None) == (request.get("rows") is None):
+            raise ValueError("Error: The request needs either a csv path or rows")
+        for key in ["game", "region"]:
+            if request.get(key) is None:
+                raise ValueError(f"Error: The request is missing the {key} option")
+
+        target = {**TARGET_DEFAULTS, "cache_dir": self.cache_dir, "output_dir": None, **request}
+        target["region"] = target["region"].lower()
+        timings = {}
+
+        start = time.perf_counter()
+        generator = self._get_generator(target)
+        timings["setup"] = (time.perf_counter() - start) * 1000
+
+        source = target["csv"] if target.get("rows") is None else target["rows"]
+        output_dir = target["output_dir"]
+        outfile = None if output_dir is None else generator.get_output_path(source, output_dir, target["name"], target["format"])
+        if target.get("rows") is None:
+            lock = self._get_lock(os.path.abspath(source))
+        elif outfile is not None:
+            lock = self._get_lock(os.path.abspath(outfile))
+        else:
+            # Inline rows built to text don't share any files
+            lock = threading.Lock()
+
+        start = time.perf_counter()
+        with lock:
+            timings["wait"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            if outfile is None:
+                reply = {"text": generator.build(source, target["name"], target["author"], target["csv_encoding"], target["format"]).text}
+            elif target.get("rows") is None:
+                generator.generate_patch_file(source, output_dir, target["name"], target["author"], target["csv_encoding"], target["format"])
+                reply = {"outfile": outfile}
+            else:
+                result = generator.build(source, target["name"], target["author"], target["csv_encoding"], target["format"])
+                os.makedirs(output_dir, exist_ok=True)
+                write_file_if_changed(outfile, result.text.encode("iso-8859-1"), DATE_LINE)
+                reply = {"outfile": outfile}
+            timings["build"] = (time.perf_counter() - start) * 1000
+
+        reply["timings"] = timings
+        return reply
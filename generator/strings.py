@@ -3,58 +3,137 @@ Thie file contains the Strings class, which generates a pnach file with the stri
 and returns a tuple with the pnach object and the array of pointers to the strings.
 """
 import csv
-from typing import List, Tuple
+import logging
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple, Union
 from generator import pnach
+from generator.compression import compress, Decompressor
+from generator.layout import StringLayout
+
+logger = logging.getLogger(__name__)
+
+def gen_string_pool(strings: List[bytes]) -> Tuple[bytes, List[int]]:
+    """
+    Packs the NUL-terminated strings into a single blob and returns it with the offset
+    of each string. Identical strings are only stored once, and a string that is the
+    end of another string (like "..." and "Options...") points into the longer one.
+    """
+    unique_strings = list(dict.fromkeys(strings))
+
+    # Sort the strings by their reversed bytes. Any string that is a suffix of another
+    # string is then a suffix of the string right after it.
+    by_reversed = sorted(unique_strings, key=lambda string: string[::-1])
+    owners = {}
+    for i in range(len(by_reversed) - 1, -1, -1):
+        string = by_reversed[i]
+        if i + 1 < len(by_reversed) and by_reversed[i + 1].endswith(string):
+            owners[string] = owners[by_reversed[i + 1]]
+        else:
+            owners[string] = string
+
+    # Lay out the strings that aren't stored inside another one in their original order
+    owner_offsets = {}
+    pool = bytearray()
+    for string in unique_strings:
+        if owners[string] is string:
+            owner_offsets[string] = len(pool)
+            pool += string
+
+    offsets = []
+    for string in strings:
+        owner = owners[string]
+        offsets.append(owner_offsets[owner] + len(owner) - len(string))
+
+    return bytes(pool), offsets
 
 class Strings:
     """
     This class reads a csv file and generates a pnach file with the strings
     and popoulates an array of pointers to the strings
     """
-    def __init__(self, csv_file: str, start_address: int, csv_encoding: str, out_encoding: str):
+    def __init__(self, csv_file: Union[str, TextIO, Iterable[List[str]]], start_address: int, csv_encoding: str, out_encoding: str):
         """
-        Initializes the Strings object
+        Initializes the Strings object. The csv can be a file path, a file object opened in
+        text mode, or the rows themselves.
         """
         self.csv_file = csv_file
         self.csv_encoding = csv_encoding
         self.out_encoding = out_encoding
         self.start_address = start_address
+        self.bytes_saved = 0
+        self.decompressor = None
+
+        # Encoded strings read from the csv file, which can be shared by Strings objects
+        # that read the same file with the same encodings
+        self.parsed = None
+
+    def _iter_rows(self) -> Iterator[List[str]]:
+        """
+        Returns an iterator over the rows of the csv
+        """
+        if isinstance(self.csv_file, str):
+            with open(self.csv_file, 'r', encoding=self.csv_encoding) as file:
+                yield from csv.reader(file)
+        elif hasattr(self.csv_file, "read"):
+            yield from csv.reader(self.csv_file)
+        else:
+            yield from self.csv_file
 
-    def gen_pnach_chunks(self, patch_format: str) -> Tuple[pnach.Chunk, List[pnach.Chunk], List[Tuple[int, int]]]:
+    def read_strings(self) -> Tuple[List[Tuple[int, bytes]], List[Tuple[int, bytes, int]]]:
+        """
+        Reads the csv file (unless it was already read) and returns the encoded strings without
+        a target address as (id, string) pairs and the ones with one as (id, string, address)
+
+        CSV rows are in the following format:
+        <string_id>,<string>,<optional_target_address>
+        """
+        if self.parsed is not None:
+            return self.parsed
+
+        strings = []
+        manual_address_strings = []
+        # iterate over rows and add the string to the list, checking if the string has a target address
+        # create an array of strings from the file
+        for row in self._iter_rows():
+            # if the length of the row is 3, add the address and string to the manual address strings array
+            if len(row) > 2 and row[2] != '':
+                manual_address_strings.append((int(row[0]), row[1].encode(self.out_encoding) + b'\x00', int(row[2], 16)))
+            # otherwise add the string to the strings array
+            else:
+                strings.append((int(row[0]), self.encode_string(row[1])))
+
+        self.parsed = (strings, manual_address_strings)
+        return self.parsed
+
+    def gen_pnach_chunks(self, patch_format: str, compressed: bool = False, layout: StringLayout = None) -> Tuple[pnach.Chunk, List[pnach.Chunk], List[Tuple[int, int]]]:
         """
         Generates a pnach file with the strings from the csv file and returns
         a tuple with the pnach object and the array of pointers to the strings
 
+        If compressed is set, the chunk holds the compressed strings instead, placed after
+        the expanded strings and a flag word, and self.decompressor is set to the
+        Decompressor that expands them to the start address.
+
+        If a layout is given, each string goes in its slot of the layout instead of being
+        packed with the other strings.
+
         CSV rows are in the following format:
         <string_id>,<string>,<optional_target_address>
         """
         # 1 - Read the csv file and extract the strings
         id_string_pointer_pairs = []
-
-        strings = []
-        manual_address_strings = []
-        with open(self.csv_file, 'r', encoding=self.csv_encoding) as file:
-            reader = csv.reader(file)
-            # iterate over rows and add the string to the list, checking if the string has a target address
-            # create an array of strings from the file
-            for row in reader:
-                # if the length of the row is 3, add the address and string to the manual address strings array
-                if len(row) > 2 and row[2] != '':
-                    manual_address_strings.append((int(row[0]), row[1].encode(self.out_encoding) + b'\x00', int(row[2], 16)))
-                # otherwise add the string to the strings array
-                else:
-                    try:
-                        strings.append((int(row[0]), row[1].encode(self.out_encoding) + b'\x00'))
-                    except UnicodeEncodeError as err:
-                        print(f"Failed to encode string '{row[1]}'\nError: {err}")
-                        strings.append((int(row[0]), "[error encoding string]".encode(self.out_encoding) + b'\x00'))
+        strings, manual_address_strings = self.read_strings()
 
         # 2 - Generate the pnach file
 
-        # gen pnach chunk for the strings that don't have a target address
+        # gen pnach chunk for the strings that don't have a target address,
+        # sharing the bytes of identical strings and suffixes
         offset = self.start_address
-        string_data = b''.join([string[1] for string in strings])
-        auto_chunk = pnach.Chunk(offset, string_data, patch_format=patch_format)
+        if layout is not None:
+            string_data, string_offsets = layout.place([str(string[0]) for string in strings], [string[1] for string in strings])
+        else:
+            string_data, string_offsets = gen_string_pool([string[1] for string in strings])
+            self.bytes_saved = sum(len(string[1]) for string in strings) - len(string_data)
+        auto_chunk = self._gen_auto_chunk(string_data, patch_format, compressed)
 
         # gen pnach chunks for strings that have a target address
         manual_chunks = []
@@ -65,22 +144,92 @@ class Strings:
         # 3 - Generate the pointers to the strings
 
         # generate pointers for the strings that don't have a target address
-        for string in strings:
-            id_string_pointer_pairs.append((string[0], offset))
-            offset += len(string[1])
+        for string, string_offset in zip(strings, string_offsets):
+            id_string_pointer_pairs.append((string[0], offset + string_offset))
 
         # generate pointers for the strings that have a target address
         for string in manual_address_strings:
             id_string_pointer_pairs.append((string[0], string[2]))
 
         # set header for the pnach chunks
-        auto_chunk.set_header(f"Writing {len(id_string_pointer_pairs)} strings ({len(auto_chunk.get_bytes())} bytes) at {hex(self.start_address)}")
+        self._set_auto_chunk_header(auto_chunk, len(id_string_pointer_pairs), len(string_data))
         for chunk in manual_chunks:
             chunk.set_header(f"Writing 1 string ({len(chunk.get_bytes())} bytes) at {hex(self.start_address)}")
 
         # 4 - Return the pnach lines and the array of pointers
         return (auto_chunk, manual_chunks, id_string_pointer_pairs)
 
+    def gen_language_chunks(self, patch_format: str, compressed: bool = False, layout: StringLayout = None) -> Tuple[pnach.Chunk, Dict[str, List[Tuple[int, int]]]]:
+        """
+        Generates the pnach chunk with the strings of every language from a csv with a
+        column per language, and returns it with the pointers to the strings of each
+        language (keyed by the language codes in the header row)
+
+        The first row is the header, the rest are in the following format:
+        <string_id>,<string for the first language>,<string for the second language>,...
+
+        Empty cells keep the original string, and columns with an empty header are ignored.
+        If a layout is given, each string goes in its slot of the layout.
+        """
+        strings = []
+        rows = self._iter_rows()
+        header = next(rows, [])
+        languages = [cell.strip().lower() for cell in header[1:]]
+        for row in rows:
+            if len(row) == 0:
+                continue
+            for language, string in zip(languages, row[1:]):
+                if language != '' and string != '':
+                    strings.append((language, int(row[0]), self.encode_string(string)))
+
+        # All languages share one blob, so strings that are the same in several languages
+        # are only stored once
+        if layout is not None:
+            string_data, string_offsets = layout.place([f"{string[0]}:{string[1]}" for string in strings], [string[2] for string in strings])
+        else:
+            string_data, string_offsets = gen_string_pool([string[2] for string in strings])
+            self.bytes_saved = sum(len(string[2]) for string in strings) - len(string_data)
+        auto_chunk = self._gen_auto_chunk(string_data, patch_format, compressed)
+        self._set_auto_chunk_header(auto_chunk, len(strings), len(string_data))
+
+        language_pointers = {language: [] for language in languages if language != ''}
+        for (language, string_id, _), string_offset in zip(strings, string_offsets):
+            language_pointers[language].append((string_id, self.start_address + string_offset))
+
+        return (auto_chunk, language_pointers)
+
+    def encode_string(self, string: str) -> bytes:
+        """
+        Encodes a string to the game's encoding with a NUL terminator
+        """
+        try:
+            return string.encode(self.out_encoding) + b'\x00'
+        except UnicodeEncodeError as err:
+            logger.warning(f"Failed to encode string '{string}'\nError: {err}")
+            return "[error encoding string]".encode(self.out_encoding) + b'\x00'
+
+    def _gen_auto_chunk(self, string_data: bytes, patch_format: str, compressed: bool) -> pnach.Chunk:
+        """
+        Generates the chunk for the blob of strings at the start address, or for the compressed
+        blob after it and a flag word (setting self.decompressor) if compressed is set
+        """
+        if not compressed:
+            return pnach.Chunk(self.start_address, string_data, patch_format=patch_format)
+
+        flag_address = (self.start_address + len(string_data) + 3) & ~3
+        compressed_data = compress(string_data)
+        self.decompressor = Decompressor(compressed_data, flag_address + 4, self.start_address, len(string_data), flag_address)
+        return pnach.Chunk(flag_address + 4, compressed_data, patch_format=patch_format)
+
+    def _set_auto_chunk_header(self, auto_chunk: pnach.Chunk, num_strings: int, expanded_size: int) -> None:
+        """
+        Sets the header of the chunk for the blob of strings
+        """
+        if self.decompressor is not None:
+            auto_chunk.set_header(f"Writing {num_strings} compressed strings ({len(auto_chunk.get_bytes())} bytes, {expanded_size} expanded) at {hex(auto_chunk.get_address())}")
+        else:
+            auto_chunk.set_header(f"Writing {num_strings} strings ({len(auto_chunk.get_bytes())} bytes) at {hex(self.start_address)}")
+
 if __name__ == "__main__":
     sample_strings = Strings('strings.csv', 0x203C7980)
     sample_pnach = sample_strings.gen_pnach_chunks()
@@ -3,6 +3,10 @@ This file contains the Trampoline class, which generates the trampoline assembly
 for accessing the custom string table.
 """
 import csv
+import struct
+from typing import List, Tuple
+from generator.perfect_hash import PerfectHash
+from utils.encoder import Encoder
 
 class Trampoline:
     """
@@ -17,31 +21,300 @@ class Trampoline:
         else:
             self.id_string_pairs = id_string_pairs
 
-    def gen_asm(self, hook_delayslot) -> str:
+    def gen_code(self, encoder: Encoder, hook_delayslot: str) -> None:
+        """
+        Generates the trampoline code from the ID/string pairs on the object
+        """
+        encoder.label("trampoline")
+        encoder.parse(hook_delayslot)
+
+        for i, (string_id, string_ptr) in enumerate(self.id_string_pairs):
+            encoder.comment(f"check matched string ID {string_id}")
+            encoder.load_imm("$t0", string_id)
+            encoder.branch("bne", "$t0", "$a1", f"done{i}")
+            encoder.nop()
+            encoder.lui("$v0", string_ptr >> 16)
+            encoder.ori("$v0", "$v0", string_ptr & 0xFFFF)
+            encoder.label(f"done{i}")
+
+        encoder.comment("return from the original function")
+        encoder.label("return")
+        encoder.jr("$ra")
+        encoder.nop()
+
+    def gen_asm(self, hook_delayslot: str) -> str:
         """
         Generates the trampoline assembly code from the ID/string pairs on the object
         """
-        asm = "trampoline:\n"
-        asm += f"{hook_delayslot}\n"
+        encoder = Encoder(keep_asm=True)
+        self.gen_code(encoder, hook_delayslot)
+        return encoder.get_asm()
 
+    def get_sorted_pairs(self) -> list:
+        """
+        Returns the ID/string pairs sorted by ID, keeping the last pointer for duplicate IDs
+        (the same one the linear trampoline ends up returning)
+        """
+        pointers = {}
         for string_id, string_ptr in self.id_string_pairs:
-            asm += f"# check matched string ID {string_id}\n"
-            asm += f"ori $t0, $zero, {string_id}\n"
-            asm += f"bne $t0, $a1, done{string_id}\n"
-            #asm += "nop\n"
-            asm += f"lui $v0, {hex(string_ptr >> 16)}\n"
-            asm += f"ori $v0, $v0, {hex(string_ptr & 0xFFFF)}\n"
-            #asm += "nop\n"
-            asm += f"done{string_id}:\n"
-
-        asm += "# return from the original function\n"
-        asm += "return:\n"
-        asm += "jr $ra\n"
-        asm += "nop\n"
+            pointers[string_id] = string_ptr
+        return sorted(pointers.items())
 
-        return asm
+    def gen_binsearch_table(self) -> bytes:
+        """
+        Generates the lookup table for the binary search trampoline, which is an
+        array of little-endian (id, ptr) word pairs sorted by ID
+        """
+        table = bytearray()
+        for string_id, string_ptr in self.get_sorted_pairs():
+            table += struct.pack('<II', string_id, string_ptr)
+        return bytes(table)
+
+    def gen_code_binsearch(self, encoder: Encoder, hook_delayslot: str, table_address: int) -> None:
+        """
+        Generates the binary search trampoline code, which looks up the string ID
+        in the sorted table generated by gen_binsearch_table at the given address
+        """
+        table_end = table_address + len(self.get_sorted_pairs()) * 8
+
+        encoder.label("trampoline")
+        encoder.parse(hook_delayslot)
+
+        encoder.comment("$t0 = low bound, $t1 = high bound (exclusive) of the table")
+        encoder.lui("$t0", table_address >> 16)
+        encoder.ori("$t0", "$t0", table_address & 0xFFFF)
+        encoder.lui("$t1", table_end >> 16)
+        encoder.ori("$t1", "$t1", table_end & 0xFFFF)
+        self._gen_binsearch_loop(encoder)
+
+    @staticmethod
+    def _gen_binsearch_loop(encoder: Encoder) -> None:
+        """
+        Generates the binary search loop over the (id, ptr) table entries between
+        the addresses in $t0 and $t1, which returns from the hooked function
+        """
+        encoder.comment("loop until the bounds meet")
+        encoder.label("search")
+        encoder.branch("beq", "$t1", "$t0", "return")
+        encoder.register("subu", "$t2", "$t1", "$t0")
+        encoder.comment("$t2 = address of the middle entry")
+        encoder.shift("srl", "$t2", "$t2", 4)
+        encoder.shift("sll", "$t2", "$t2", 3)
+        encoder.register("addu", "$t2", "$t2", "$t0")
+        encoder.memory("lw", "$t3", 0, "$t2")
+        encoder.nop()
+        encoder.branch("beq", "$t3", "$a1", "found")
+        encoder.register("sltu", "$t3", "$t3", "$a1")
+        encoder.branch("bne", "$t3", "$zero", "upper")
+        encoder.nop()
+        encoder.comment("continue in the lower half")
+        encoder.branch("beq", "$zero", "$zero", "search")
+        encoder.register("or", "$t1", "$t2", "$zero")
+        encoder.comment("continue in the upper half")
+        encoder.label("upper")
+        encoder.branch("beq", "$zero", "$zero", "search")
+        encoder.immediate("addiu", "$t0", "$t2", 8)
+
+        encoder.comment("matched string ID, return the custom string pointer")
+        encoder.label("found")
+        encoder.jr("$ra")
+        encoder.memory("lw", "$v0", 4, "$t2")
+
+        encoder.comment("return from the original function")
+        encoder.label("return")
+        encoder.jr("$ra")
+        encoder.nop()
+
+    @staticmethod
+    def gen_code_binsearch_languages(encoder: Encoder, hook_delayslot: str, lang_address: int, index_address: int, num_languages: int) -> None:
+        """
+        Generates the multi-language binary search trampoline code, which reads the game
+        language byte and looks up the string ID in that language's sorted table. The index
+        table at the given address has a (start, end) word pair for each language ID.
+        """
+        encoder.label("trampoline")
+        encoder.parse(hook_delayslot)
+
+        encoder.comment("$t0 = game language")
+        encoder.lui("$t0", lang_address >> 16)
+        encoder.ori("$t0", "$t0", lang_address & 0xFFFF)
+        encoder.memory("lbu", "$t0", 0, "$t0")
+        encoder.nop()
+        encoder.immediate("sltiu", "$t1", "$t0", num_languages)
+        encoder.branch("beq", "$t1", "$zero", "return")
+        encoder.shift("sll", "$t0", "$t0", 3)
+
+        encoder.comment("$t0 = low bound, $t1 = high bound (exclusive) of the language's table")
+        encoder.lui("$t1", index_address >> 16)
+        encoder.ori("$t1", "$t1", index_address & 0xFFFF)
+        encoder.register("addu", "$t0", "$t0", "$t1")
+        encoder.memory("lw", "$t1", 4, "$t0")
+        encoder.memory("lw", "$t0", 0, "$t0")
+        encoder.nop()
+        Trampoline._gen_binsearch_loop(encoder)
+
+    def get_perfect_hash(self) -> PerfectHash:
+        """
+        Builds the perfect hash over the string IDs
+        """
+        return PerfectHash([string_id for string_id, _ in self.get_sorted_pairs()])
+
+    def gen_hash_table(self, perfect_hash: PerfectHash) -> bytes:
+        """
+        Generates the lookup tables for the hash trampoline, which are an array of
+        little-endian (id, ptr) word pairs ordered by hash slot, followed by the
+        halfword displacement of each hash bucket
+        """
+        pairs = self.get_sorted_pairs()
+        table = bytearray()
+        for index in perfect_hash.slots:
+            table += struct.pack('<II', *pairs[index])
+        table += perfect_hash.gen_displacement_table()
+        return bytes(table)
+
+    def gen_code_hash(self, encoder: Encoder, hook_delayslot: str, perfect_hash: PerfectHash, table_address: int) -> None:
+        """
+        Generates the hash trampoline code, which looks up the string ID in the
+        tables generated by gen_hash_table at the given address
+        """
+        num_keys = perfect_hash.num_keys
+        num_buckets = perfect_hash.num_buckets
+        displacements_address = table_address + num_keys * 8
+
+        encoder.label("trampoline")
+        encoder.parse(hook_delayslot)
+
+        if num_keys > 0:
+            encoder.comment("$t0 = first level hash of the string ID")
+            encoder.lui("$t0", perfect_hash.mul1 >> 16)
+            encoder.ori("$t0", "$t0", perfect_hash.mul1 & 0xFFFF)
+            encoder.multu("$a1", "$t0")
+            encoder.mflo("$t0")
+
+            encoder.comment("$t1 = hash bucket")
+            encoder.lui("$t1", num_buckets >> 16)
+            encoder.ori("$t1", "$t1", num_buckets & 0xFFFF)
+            encoder.multu("$t0", "$t1")
+            encoder.mfhi("$t1")
+
+            encoder.comment("$t0 = slot before displacement, $t2 = number of slots")
+            encoder.lui("$t2", perfect_hash.mul2 >> 16)
+            encoder.ori("$t2", "$t2", perfect_hash.mul2 & 0xFFFF)
+            encoder.multu("$t0", "$t2")
+            encoder.mflo("$t0")
+            encoder.lui("$t2", num_keys >> 16)
+            encoder.ori("$t2", "$t2", num_keys & 0xFFFF)
+            encoder.multu("$t0", "$t2")
+            encoder.mfhi("$t0")
+
+            encoder.comment("add the bucket displacement to get the slot")
+            encoder.shift("sll", "$t1", "$t1", 1)
+            encoder.lui("$t3", displacements_address >> 16)
+            encoder.ori("$t3", "$t3", displacements_address & 0xFFFF)
+            encoder.register("addu", "$t1", "$t1", "$t3")
+            encoder.memory("lhu", "$t1", 0, "$t1")
+            encoder.nop()
+            encoder.register("addu", "$t0", "$t0", "$t1")
+            encoder.register("sltu", "$t1", "$t0", "$t2")
+            encoder.branch("bne", "$t1", "$zero", "probe")
+            encoder.shift("sll", "$t1", "$t0", 3)
+            encoder.register("subu", "$t0", "$t0", "$t2")
+            encoder.shift("sll", "$t1", "$t0", 3)
+
+            encoder.comment("check the string ID in the slot")
+            encoder.label("probe")
+            encoder.lui("$t3", table_address >> 16)
+            encoder.ori("$t3", "$t3", table_address & 0xFFFF)
+            encoder.register("addu", "$t1", "$t1", "$t3")
+            encoder.memory("lw", "$t3", 0, "$t1")
+            encoder.nop()
+            encoder.branch("bne", "$t3", "$a1", "return")
+            encoder.nop()
+
+            encoder.comment("matched string ID, return the custom string pointer")
+            encoder.memory("lw", "$v0", 4, "$t1")
+
+        encoder.comment("return from the original function")
+        encoder.label("return")
+        encoder.jr("$ra")
+        encoder.nop()
+
+    def get_id_ranges(self, min_length: int) -> Tuple[List[Tuple[int, List[int]]], List[Tuple[int, int]]]:
+        """
+        Splits the ID/string pairs into runs of at least min_length consecutive IDs and
+        the leftover pairs. Each run is returned as its first ID and the list of pointers.
+        """
+        ranges = []
+        leftovers = []
+
+        run = []
+        for string_id, string_ptr in self.get_sorted_pairs() + [(None, None)]:
+            if run and string_id == run[-1][0] + 1:
+                run.append((string_id, string_ptr))
+                continue
+            if len(run) >= min_length:
+                ranges.append((run[0][0], [ptr for _, ptr in run]))
+            else:
+                leftovers += run
+            run = [(string_id, string_ptr)]
+
+        return ranges, leftovers
+
+    def gen_range_tables(self, min_length: int) -> bytes:
+        """
+        Generates the lookup tables for the range trampoline, which are the pointer
+        arrays of each ID range as little-endian words, one range after another
+        """
+        ranges, _ = self.get_id_ranges(min_length)
+        table = bytearray()
+        for _, pointers in ranges:
+            table += struct.pack(f'<{len(pointers)}I', *pointers)
+        return bytes(table)
+
+    def gen_code_ranges(self, encoder: Encoder, hook_delayslot: str, table_address: int, min_length: int) -> None:
+        """
+        Generates the range trampoline code, which indexes the pointer tables
+        generated by gen_range_tables at the given address for IDs in a range, and
+        checks the leftover IDs one by one
+        """
+        ranges, leftovers = self.get_id_ranges(min_length)
+
+        encoder.label("trampoline")
+        encoder.parse(hook_delayslot)
+
+        range_address = table_address
+        for first_id, pointers in ranges:
+            last_id = first_id + len(pointers) - 1
+            encoder.comment(f"check string ID range {first_id}-{last_id}")
+            encoder.load_imm("$t0", first_id)
+            encoder.register("subu", "$t0", "$a1", "$t0")
+            encoder.load_imm("$t1", len(pointers))
+            encoder.register("sltu", "$t1", "$t0", "$t1")
+            encoder.branch("beq", "$t1", "$zero", f"done{first_id}_{last_id}")
+            encoder.shift("sll", "$t0", "$t0", 2)
+            encoder.lui("$t1", range_address >> 16)
+            encoder.ori("$t1", "$t1", range_address & 0xFFFF)
+            encoder.register("addu", "$t0", "$t0", "$t1")
+            encoder.jr("$ra")
+            encoder.memory("lw", "$v0", 0, "$t0")
+            encoder.label(f"done{first_id}_{last_id}")
+            range_address += len(pointers) * 4
+
+        for string_id, string_ptr in leftovers:
+            encoder.comment(f"check matched string ID {string_id}")
+            encoder.load_imm("$t0", string_id)
+            encoder.branch("bne", "$t0", "$a1", f"done{string_id}")
+            encoder.lui("$t1", string_ptr >> 16)
+            encoder.jr("$ra")
+            encoder.ori("$v0", "$t1", string_ptr & 0xFFFF)
+            encoder.label(f"done{string_id}")
+
+        encoder.comment("return from the original function")
+        encoder.label("return")
+        encoder.jr("$ra")
+        encoder.nop()
 
-    def gen_asm_from_csv(self, filename: str) -> str:
+    def gen_asm_from_csv(self, filename: str, hook_delayslot: str) -> str:
         """
         Read the ID/string pairs from a csv and generates the assembly code
         """
@@ -52,7 +325,7 @@ class Trampoline:
             for row in reader:
                 self.id_string_pairs.append((int(row[0], 16), int(row[1], 16)))
 
-        asm = self.gen_asm()
+        asm = self.gen_asm(hook_delayslot)
         return asm
 
 def main():
@@ -60,8 +333,7 @@ def main():
     Main function for testing
     """
     trampoline = Trampoline()
-    trampoline.gen_asm_from_csv("strings.csv")
-    print(trampoline.gen_asm())
+    print(trampoline.gen_asm_from_csv("strings.csv", "lw $v0, 0x4($a0)"))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+"""
+This file contains the LiveEditWatcher class, which rebuilds a live-edited mod on a background
+thread when its csv file is saved, waiting for a burst of file events to settle first.
+"""
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+from watchdog.events import FileSystemEventHandler
+from generator.live import LiveBuild, DEFAULT_DEBOUNCE_MS
+
+if TYPE_CHECKING:
+    from generator.injector import PatchInjector
+
+# Types of file events that can mean the csv was saved (opening or reading it doesn't count,
+# since the build reads it too)
+SAVE_EVENT_TYPES = ["modified", "created", "moved", "closed"]
+
+class LiveEditWatcher(FileSystemEventHandler):
+    """
+    LiveEditWatcher class, a watchdog event handler for the directory of the csv file
+    """
+    def __init__(self, live_build: LiveBuild, debounce_ms: int = DEFAULT_DEBOUNCE_MS, injector: "PatchInjector" = None):
+        """
+        Initializes the watcher for the input file of the live build. Builds start once
+        no event for the file has come in for debounce_ms milliseconds. If an injector is
+        given, each build is also written into the running emulator.
+        """
+        super().__init__()
+        self.live_build = live_build
+        self.injector = injector
+        self.logger = live_build.generator.logger
+        self.path = self._normalize_path(live_build.input_file)
+        self.debounce = debounce_ms / 1000
+
+        # Time of the last event that hasn't been built yet (None if there isn't one)
+        self.last_event = None
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.worker = threading.Thread(target=self._run, name="live-edit-build", daemon=True)
+
+    def get_directory(self) -> str:
+        """
+        Returns the directory to watch. Editors often save by writing a temporary file
+        and renaming it over the csv, so the whole directory has to be watched.
+        """
+        return os.path.dirname(self.path)
+
+    def start(self) -> None:
+        """
+        Starts the build thread, and queues the first build
+        """
+        self.worker.start()
+        self._queue_build(time.monotonic() - self.debounce)
+
+    def stop(self) -> None:
+        """
+        Stops the build thread after the build in progress (if any) finishes
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.worker.join()
+
+    def on_any_event(self, event) -> None:
+        """
+        Queues a build if the event is for the csv file (including a file renamed to it)
+        """
+        if event.is_directory or event.event_type not in SAVE_EVENT_TYPES:
+            return
+        paths = [event.src_path, getattr(event, "dest_path", None)]
+        if any(path and self._normalize_path(path) == self.path for path in paths):
+            self._queue_build(time.monotonic())
+
+    def _queue_build(self, event_time: float) -> None:
+        """
+        Records an event for the csv file and wakes up the build thread
+        """
+        with self.condition:
+            self.last_event = event_time
+            self.condition.notify()
+
+    def _is_superseded(self) -> bool:
+        """
+        Returns whether the csv was saved again since the current build started
+        """
+        with self.condition:
+            return self.last_event is not None
+
+    def _run(self) -> None:
+        """
+        Waits for the file events to settle, then builds, until the watcher is stopped
+        """
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    if self.last_event is None:
+                        self.condition.wait()
+                        continue
+                    remaining = self.last_event + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.stopped:
+                    return
+                self.last_event = None
+
+            self._build()
+
+    def _build(self) -> None:
+        """
+        Rebuilds the patch, logging how long it took, or the error instead of stopping the thread
+        """
+        start = time.perf_counter()
+        try:
+            result = self.live_build.build(self._is_superseded)
+        except Exception as err:
+            self.logger.error(f"Failed to generate the patch: {err}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if result is None:
+            if self._is_superseded():
+                self.logger.info(f"Dropped a build after {elapsed_ms:.1f} ms, the csv was saved again")
+        elif result:
+            self.logger.info(f"Updated the patch in place in {elapsed_ms:.1f} ms")
+        else:
+            self.logger.info(f"Generated the patch in {elapsed_ms:.1f} ms")
+
+        if result is not None and self.injector is not None:
+            self._inject()
+
+    def _inject(self) -> None:
+        """
+        Writes the changes of the last build into the emulator, logging how long it took
+        """
+        start = time.perf_counter()
+        try:
+            num_words, num_messages = self.injector.inject(self.live_build.patches)
+        except Exception as err:
+            self.logger.error(f"Failed to write the patch into the emulator: {err}")
+            # The emulator's memory is unknown now, so send everything next time
+            self.injector.reset()
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.logger.info(f"Wrote {num_words} changed words into the emulator ({num_messages} messages) in {elapsed_ms:.1f} ms")
+
+    @staticmethod
+    def _normalize_path(path: str) -> str:
+        """
+        Returns the path in a form that can be compared with other paths
+        """
+        return os.path.normcase(os.path.realpath(path))
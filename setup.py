@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='sly-string-toolkit',
     version='1.2.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=[
         'keystone-engine',
         'watchdog'
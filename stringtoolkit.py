@@ -2,32 +2,140 @@
 Driver for Sly String Toolkit.
 """
 import os
+import sys
 import argparse
+import logging
 import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from generator import Generator
+from generator.generator import LOOKUP_MODES, STATIC_PLACEMENTS, LANG_GATES
 
 DEBUG_ENABLED = False
 
+# Modules that take a while to import (watchdog, the process pool and the server), and the
+# ones only live editing and PINE use, are imported by the commands that use them, so --help
+# and plain builds start quickly
+
+def create_injector(generator, slot):
+    """
+    Returns an injector that writes the generator's patches into the emulator over PINE
+    """
+    from generator.injector import PatchInjector
+    from utils.pine import PineClient, DEFAULT_SLOT
+
+    return PatchInjector(PineClient(DEFAULT_SLOT if slot is None else slot), generator.hook_adr, generator.get_cancel_hook_code())
+
+def build_main(argv):
+    """
+    Build subcommand, builds every target of a manifest (or of the csv files, games, regions,
+    languages and formats given on the command line) on a pool of worker processes
+    """
+    parser = argparse.ArgumentParser(prog='stringtoolkit.py build', description='Builds a matrix of patches from CSV files in parallel.')
+    parser.add_argument('manifest', type=str, nargs='?', help='JSON manifest with the targets to build (instead of --csv)')
+    parser.add_argument('--csv', type=str, nargs='+', help='Input CSV files, can be glob patterns')
+    parser.add_argument('-g', '--game', type=int, nargs='+', help='Games to build for (2 and/or 3)')
+    parser.add_argument('-r', '--region', type=str, nargs='+', help='Regions to build for (ntsc and/or pal)')
+    parser.add_argument('-l', '--lang', type=str, nargs='+', help='Languages to build for with PAL (default affects all languages)')
+    parser.add_argument('--format', type=str, nargs='+', choices=["pnach", "clps2c"], help='Formats to output (default is pnach)', default=["pnach"])
+    parser.add_argument('-a', '--author', type=str, help='Name of the author (default is Sly String Toolkit)', default="Sly String Toolkit")
+    parser.add_argument('-o', '--output-dir', type=str, help='Output directory (default is ./out/)', default="./out/")
+    parser.add_argument('-e', '--csv_encoding', type=str, help='Encoding of the input CSV files (default is utf-8)', default="utf-8")
+    parser.add_argument('-j', '--jobs', type=int, help='Number of worker processes (default is one per CPU)')
+    parser.add_argument('--cache-dir', type=str, help='Directory of a build cache to reuse unchanged builds from, like ~/.cache/sly-string-toolkit (default is no cache)')
+    args = parser.parse_args(argv)
+    from generator.batch import load_manifest, expand_targets, build_all, print_summary
+
+    if args.manifest is not None:
+        specs = load_manifest(args.manifest)
+    elif args.csv is not None and args.game is not None and args.region is not None:
+        specs = [{"csv": args.csv, "game": args.game, "region": args.region, "lang": args.lang, "format": args.format,
+            "author": args.author, "output_dir": args.output_dir, "csv_encoding": args.csv_encoding}]
+    else:
+        print(parser.format_help())
+        print("Error: Either a manifest or --csv, --game and --region are required.")
+        return 1
+
+    targets = []
+    try:
+        for spec in specs:
+            spec.setdefault("cache_dir", args.cache_dir)
+            targets += expand_targets(spec)
+    except ValueError as err:
+        print(err)
+        return 1
+
+    print(f"Building {len(targets)} targets")
+    start = time.perf_counter()
+    results = build_all(targets, args.jobs)
+    print_summary(results, time.perf_counter() - start)
+    return 1 if any(result["error"] is not None for result in results) else 0
+
+def serve_main(argv):
+    """
+    Serve subcommand, keeps the generator loaded and builds the requests sent to a Unix socket
+    """
+    parser = argparse.ArgumentParser(prog='stringtoolkit.py serve', description='Runs a build server that builds patches for requests sent over a Unix socket.')
+    parser.add_argument('--socket', type=str, help='Path of the socket (default is sly-string-toolkit.sock in the runtime directory)')
+    parser.add_argument('--cache-dir', type=str, help='Directory of a build cache to reuse unchanged builds from, like ~/.cache/sly-string-toolkit (default is no cache)')
+    args = parser.parse_args(argv)
+    from generator.server import BuildServer
+
+    try:
+        server = BuildServer(args.socket, args.cache_dir)
+    except Exception as err:
+        print(err)
+        return 1
+
+    server.warm_up()
+    print(f"Build server listening on {server.socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
 def main():
     """
     Main function, parses command line arguments and calls the pnach generator
     """
+    # Print the generator's messages like the rest of the output
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        sys.exit(build_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        sys.exit(serve_main(sys.argv[2:]))
+
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Tool for generating PNACH from CSV to replace strings in Sly 2/3.')
     parser.add_argument('input_file', type=str, help='input CSV file name (default is strings.csv)', default="strings.csv")
     parser.add_argument('-g', '--game', type=int, required=True, help="Which game the mod supports, as a number (2 or 3)")
     parser.add_argument('-r', '--region', type=str, required=True, help='Which region the mod supports (ntsc or pal)')
     parser.add_argument('-l', '--lang', type=str, help='Game language the mod should affect (default affects all languages)')
+    parser.add_argument('--lang-gate', type=str, choices=LANG_GATES, help='What the language check applies to with --lang: the whole mod or only the hook (default is all; once and sentinel placement always only gate the hook)', default="all")
+    parser.add_argument('--multi-lang', action='store_true', help='Input CSV has a header row and a column per language; builds one patch for all languages (PAL only)')
     parser.add_argument('-n', '--name', type=str, help='Name of the mod (default is same as input file)')
     parser.add_argument('-a', '--author', type=str, help='Name of the author (default is Sly String Toolkit)', default="Sly String Toolkit")
     parser.add_argument('-o', '--output-dir', type=str, help='Output directory (default is ./out/)', default="./out/")
     parser.add_argument('-c', '--code-address', type=str, help='Address where the pnach will inject the asm code')
     parser.add_argument('-s', '--strings-address', type=str, help='Address where the pnach will inject the custom strings')
+    parser.add_argument('--lookup', type=str, choices=LOOKUP_MODES, help='How the trampoline looks up string IDs (default is linear)', default="linear")
+    parser.add_argument('--range-threshold', type=int, help='Minimum number of consecutive string IDs that get a direct table with --lookup ranges (default is 3)', default=3)
+    parser.add_argument('--compress-strings', action='store_true', help='Write the strings compressed and expand them in game RAM on the first string load')
+    parser.add_argument('--baseline-dump', type=str, help="PCSX2 EE RAM dump of the game without the mod, used to leave out words that don't change")
+    parser.add_argument('--static-placement', type=str, choices=STATIC_PLACEMENTS, help='How the code, strings and tables are written; only the hook is always written continuously with once or sentinel (default is continuous)', default="continuous")
+    parser.add_argument('--string-table-dump', type=str, help="PCSX2 EE RAM dump with the game's string table loaded; strings already in the table get their pointer patched directly instead of going through the hook")
+    parser.add_argument('--string-table', type=str, help='Address of the string table in the dump (default depends on game and region)')
+    parser.add_argument('--stable-layout', action='store_true', help='Keep each string at the same address between builds, saving the layout next to the csv file')
+    parser.add_argument('--keystone-check', action='store_true', help='Cross-check the generated machine code against Keystone')
     parser.add_argument('-e', '--csv_encoding', type=str, help='Encoding of the input CSV file (default is utf-8)', default="utf-8")
+    parser.add_argument('--cache-dir', type=str, help='Directory of a build cache to reuse unchanged builds from, like ~/.cache/sly-string-toolkit (default is no cache)')
     parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
     parser.add_argument('--live-edit', action='store_true', help='Enable live editing of strings csv file')
+    parser.add_argument('--debounce', type=int, help='Milliseconds to wait after the csv file is saved before rebuilding in live edit mode (default is 100)')
+    parser.add_argument('--pine', action='store_true', help='Write the mod straight into the memory of the running emulator over PINE (with --live-edit, on every save)')
+    parser.add_argument('--pine-slot', type=int, help='PINE slot of the emulator (default is 28011)')
     parser.add_argument('--clps2c', action='store_true', help='Output CLPS2C code instead of pnach')
     args = parser.parse_args()
 
@@ -46,21 +154,49 @@ def main():
     if args.clps2c:
         patch_format = "clps2c"
 
-    # Set static flags on generator
-    Generator.set_verbose(args.verbose)
-    Generator.set_debug(DEBUG_ENABLED)
+    if args.verbose:
+        print("Verbose output enabled")
+    debug_dir = None
+    if DEBUG_ENABLED:
+        print("Debug output enabled")
+        debug_dir = args.output_dir
 
     # Create the generator and generate pnach
-    generator = Generator(args.game, args.region, args.lang, args.strings_address, args.code_address)
+    generator = Generator(args.game, args.region, args.lang,
+        strings_address=args.strings_address,
+        code_address=args.code_address,
+        lookup=args.lookup,
+        range_threshold=args.range_threshold,
+        keystone_check=args.keystone_check,
+        cache_dir=args.cache_dir,
+        compress_strings=args.compress_strings,
+        baseline_dump=args.baseline_dump,
+        static_placement=args.static_placement,
+        lang_gate=args.lang_gate,
+        multi_lang=args.multi_lang,
+        string_table_dump=args.string_table_dump,
+        string_table_address=args.string_table,
+        stable_layout=args.stable_layout,
+        verbose=args.verbose,
+        debug_dir=debug_dir)
     if args.live_edit:
+        from watchdog.observers import Observer
+        from generator.live import LiveBuild, DEFAULT_DEBOUNCE_MS
+        from generator.watcher import LiveEditWatcher
+
         print("Live editing enabled. The pnach will be updated automatically when you save the csv file.")
+        # Keep the last build in memory so small edits are fast, and build on a background
+        # thread once the events of each save settle
+        live_build = LiveBuild(generator, args.input_file, args.output_dir, args.name, args.author, args.csv_encoding, patch_format)
+        injector = create_injector(generator, args.pine_slot) if args.pine else None
+        watcher = LiveEditWatcher(live_build, DEFAULT_DEBOUNCE_MS if args.debounce is None else args.debounce, injector)
+
         # Create the observer and schedule the event handler
         observer = Observer()
-        event_handler = FileSystemEventHandler()
-        event_handler.on_modified = lambda event: generator.generate_patch_file(args.input_file, args.output_dir, args.name, args.author, args.csv_encoding, patch_format)
-        observer.schedule(event_handler, path=os.path.dirname(args.input_file), recursive=False)
+        observer.schedule(watcher, path=watcher.get_directory(), recursive=False)
 
         # Start the observer and wait for keyboard interrupt
+        watcher.start()
         observer.start()
         try:
             while True:
@@ -68,8 +204,14 @@ def main():
         except KeyboardInterrupt:
             observer.stop()
 
-        # Stop the observer
+        # Stop the observer and the build thread
         observer.join()
+        watcher.stop()
+    elif args.pine:
+        patches = generator.generate_patches(args.input_file, args.name, args.author, args.csv_encoding, patch_format)
+        injector = create_injector(generator, args.pine_slot)
+        num_words, num_messages = injector.inject(patches)
+        print(f"Wrote {num_words} words into the emulator ({num_messages} messages)")
     else:
         print("FORMAT:", patch_format)
         generator.generate_patch_file(args.input_file, args.output_dir, args.name, args.author, args.csv_encoding, patch_format)
@@ -0,0 +1,21 @@
+"""
+Helpers shared by the tests
+"""
+from generator.generator import DATE_LINE
+
+def write_csv(path, rows) -> str:
+    """
+    Writes the rows to a strings csv, one row per line, and returns its path
+    """
+    with open(path, "w", encoding="utf-8", newline="\n") as file:
+        file.write("".join(",".join(str(value) for value in row) + "\n" for row in rows))
+    return str(path)
+
+def strip_date(patch) -> bytes:
+    """
+    Returns the patch text (or its bytes) without the date in the header, to compare builds
+    made at different times
+    """
+    if isinstance(patch, str):
+        patch = patch.encode("iso-8859-1")
+    return DATE_LINE.sub(b"\\1", patch)
@@ -0,0 +1,126 @@
+"""
+Stand-in for the emulator's PINE server, which keeps EE memory in a dict and records the
+commands of every message it gets
+"""
+import os
+import socketserver
+import struct
+import tempfile
+import threading
+from utils.pine import MSG_READ16, MSG_READ32, MSG_WRITE32, IPC_OK, IPC_FAIL
+
+class PineRequestHandler(socketserver.BaseRequestHandler):
+    """
+    PineRequestHandler class, replies to the messages of one client until it disconnects
+    """
+    def handle(self) -> None:
+        """
+        Reads each message, runs its commands and writes the reply
+        """
+        while True:
+            header = self._recv_exactly(4)
+            if header is None:
+                return
+            message = self._recv_exactly(struct.unpack("<I", header)[0] - 4)
+            if message is None:
+                return
+            reply = self.server.run_commands(message)
+            self.request.sendall(struct.pack("<I", len(reply) + 4) + reply)
+
+    def _recv_exactly(self, size: int) -> bytes:
+        """
+        Receives exactly the given number of bytes, or returns None if the client disconnected
+        """
+        data = bytearray()
+        while len(data) < size:
+            part = self.request.recv(size - len(data))
+            if not part:
+                return None
+            data += part
+        return bytes(data)
+
+class RecordingPineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    RecordingPineServer class, a PINE server on a Unix socket in a temporary folder. Memory is
+    a dict of words by address, and messages has the commands of each message as (opcode,
+    address, value) tuples (the value is None for reads).
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        """
+        Initializes the server with empty memory
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.temp_dir.name, "pine.sock")
+        self.memory = {}
+        self.messages = []
+        self.lock = threading.Lock()
+        super().__init__(self.socket_path, PineRequestHandler)
+
+    def __enter__(self):
+        """
+        Starts serving on a background thread
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """
+        Stops the server and removes its socket
+        """
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def read16(self, address: int) -> int:
+        """
+        Returns the 16-bit value at the address
+        """
+        return (self.memory.get(address & ~3, 0) >> ((address & 2) * 8)) & 0xFFFF
+
+    def write16(self, address: int, value: int) -> None:
+        """
+        Sets the 16-bit value at the address, like the game setting its language
+        """
+        shift = (address & 2) * 8
+        word = self.memory.get(address & ~3, 0) & ~(0xFFFF << shift)
+        self.memory[address & ~3] = word | (value << shift)
+
+    def get_writes(self) -> list:
+        """
+        Returns the (address, value) pairs of every Write32 command, in order
+        """
+        return [(address, value) for message in self.messages for opcode, address, value in message if opcode == MSG_WRITE32]
+
+    def run_commands(self, message: bytes) -> bytes:
+        """
+        Runs the commands of a message and returns the result byte and the data of the reply
+        """
+        commands = []
+        data = bytearray()
+        pos = 0
+        with self.lock:
+            while pos < len(message):
+                opcode = message[pos]
+                if opcode == MSG_WRITE32:
+                    address, value = struct.unpack_from("<II", message, pos + 1)
+                    self.memory[address] = value
+                    commands.append((opcode, address, value))
+                    pos += 9
+                elif opcode == MSG_READ16:
+                    address = struct.unpack_from("<I", message, pos + 1)[0]
+                    data += struct.pack("<H", self.read16(address))
+                    commands.append((opcode, address, None))
+                    pos += 5
+                elif opcode == MSG_READ32:
+                    address = struct.unpack_from("<I", message, pos + 1)[0]
+                    data += struct.pack("<I", self.memory.get(address, 0))
+                    commands.append((opcode, address, None))
+                    pos += 5
+                else:
+                    return bytes([IPC_FAIL])
+            self.messages.append(commands)
+        return bytes([IPC_OK]) + data
@@ -0,0 +1,82 @@
+"""
+Tests for building many targets at once
+"""
+import json
+import os
+from pathlib import Path
+import pytest
+from generator import Generator
+from generator.batch import load_manifest, expand_targets, build_all, create_generator, get_target_name
+from tests.helpers import write_csv, strip_date
+
+def gen_rows(name, count):
+    """
+    Returns rows of string IDs and strings with the name in them
+    """
+    return [[1000 + i, f"{name} string {i}"] for i in range(count)]
+
+def test_expand_targets(tmp_path):
+    write_csv(tmp_path / "a.csv", gen_rows("a", 3))
+    write_csv(tmp_path / "b.csv", gen_rows("b", 3))
+    targets = expand_targets({"csv": str(tmp_path / "*.csv"), "game": 2, "region": ["NTSC", "pal"], "lang": ["fr", "it"], "format": ["pnach", "clps2c"]})
+
+    # NTSC targets are built once without a language
+    combinations = [(os.path.basename(target["csv"]), target["region"], target["lang"], target["format"]) for target in targets]
+    assert len(combinations) == 2 * (1 + 2) * 2
+    assert ("a.csv", "ntsc", None, "clps2c") in combinations
+    assert ("b.csv", "pal", "it", "pnach") in combinations
+    assert all(target["author"] == "Sly String Toolkit" for target in targets)
+    assert get_target_name(targets[-1]) == "b_it"
+
+def test_expand_targets_rejects_bad_specs(tmp_path):
+    write_csv(tmp_path / "a.csv", gen_rows("a", 3))
+    with pytest.raises(ValueError, match="Unknown target options"):
+        expand_targets({"csv": str(tmp_path / "a.csv"), "game": 2, "region": "ntsc", "colour": "red"})
+    with pytest.raises(ValueError, match="missing the region"):
+        expand_targets({"csv": str(tmp_path / "a.csv"), "game": 2})
+    with pytest.raises(ValueError, match="No csv files match"):
+        expand_targets({"csv": str(tmp_path / "missing*.csv"), "game": 2, "region": "ntsc"})
+
+def test_create_generator_passes_options_by_name(tmp_path):
+    write_csv(tmp_path / "a.csv", gen_rows("a", 3))
+    [target] = expand_targets({"csv": str(tmp_path / "a.csv"), "game": 3, "region": "ntsc", "strings_address": "400000",
+        "code_address": "500000", "lookup": "binsearch", "range_threshold": 5, "cache_dir": str(tmp_path / "cache"),
+        "compress_strings": True, "lang_gate": "hook", "string_table": "47A2E0", "stable_layout": True})
+    generator = create_generator(target)
+    assert (generator.strings_adr, generator.code_address, generator.string_table) == (0x400000, 0x500000, 0x47A2E0)
+    assert (generator.lookup, generator.range_threshold, generator.lang_gate) == ("binsearch", 5, "hook")
+    assert generator.compress_strings and generator.stable_layout and not generator.keystone_check
+    assert generator.cache.cache_dir == str(tmp_path / "cache")
+
+def test_load_manifest_paths_are_relative_to_it(tmp_path):
+    manifest_file = tmp_path / "manifest.json"
+    manifest_file.write_text(json.dumps({
+        "defaults": {"output_dir": "out", "author": "Me"},
+        "targets": [{"csv": ["mods/*.csv"], "game": 2, "region": "ntsc"}],
+    }), encoding="utf-8")
+    [spec] = load_manifest(str(manifest_file))
+    assert spec["csv"] == [os.path.join(str(tmp_path), "mods/*.csv")]
+    assert spec["output_dir"] == os.path.join(str(tmp_path), "out")
+    assert spec["author"] == "Me"
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_build_all(tmp_path, jobs):
+    write_csv(tmp_path / "a.csv", gen_rows("a", 20))
+    write_csv(tmp_path / "b.csv", gen_rows("b", 30))
+    out_dir = str(tmp_path / "out")
+    targets = expand_targets({"csv": str(tmp_path / "*.csv"), "game": 2, "region": ["ntsc", "pal"], "lang": "fr", "format": ["pnach", "clps2c"], "output_dir": out_dir})
+    targets += expand_targets({"csv": str(tmp_path / "a.csv"), "game": 4, "region": "ntsc"})
+    results = build_all(targets, jobs)
+
+    # Results are in the order of the targets, and match building each target on its own
+    assert len(results) == len(targets) == 9
+    for target, result in zip(targets[:-1], results[:-1]):
+        assert result["error"] is None
+        generator = Generator(target["game"], target["region"], target["lang"])
+        expected = generator.build(target["csv"], get_target_name(target), patch_format=target["format"]).text
+        assert strip_date(Path(result["outfile"]).read_bytes()) == strip_date(expected)
+    assert len(set(result["outfile"] for result in results[:-1])) == 8
+
+    # A target that fails doesn't stop the others
+    assert results[-1]["outfile"] is None
+    assert results[-1]["error"] is not None
@@ -0,0 +1,116 @@
+"""
+Tests for the build cache and for skipping the rewrite of unchanged patch files
+"""
+import os
+import re
+from generator import Generator
+from generator import generator as generator_module
+from generator.cache import write_file_if_changed, hash_files
+from generator.generator import DATE_LINE
+from tests.helpers import write_csv, strip_date
+
+OLD_DATE = "2000-01-01 00:00:00"
+
+def gen_rows(strings):
+    """
+    Returns rows with a string ID for each of the strings
+    """
+    return [[1000 + i, string] for i, string in enumerate(strings)]
+
+def set_date(path, date):
+    """
+    Replaces the date in the header of a patch file
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(DATE_LINE.sub(lambda match: match.group(1) + date.encode(), data))
+
+def get_date(path):
+    """
+    Returns the date in the header of a patch file
+    """
+    with open(path, "rb") as file:
+        return re.search(rb'date=([^"\n]*)', file.read()).group(1).decode()
+
+def test_write_file_if_changed(tmp_path):
+    path = str(tmp_path / "file.txt")
+    assert write_file_if_changed(path, b"a\ndate=1\nb\n")
+    assert not write_file_if_changed(path, b"a\ndate=1\nb\n")
+    assert write_file_if_changed(path, b"a\ndate=2\nb\n")
+    assert not write_file_if_changed(path, b"a\ndate=3\nb\n", DATE_LINE)
+    assert write_file_if_changed(path, b"a\ndate=3\nc\n", DATE_LINE)
+
+def test_cache_is_off_by_default():
+    assert Generator(2, "ntsc").cache is None
+
+def test_unchanged_patch_is_not_rewritten(tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "World"]))
+    for patch_format in ["pnach", "clps2c"]:
+        generator = Generator(2, "ntsc")
+        generator.generate_patch_file(csv_file, str(tmp_path / "out"), format=patch_format)
+        outfile = generator.get_output_path(csv_file, str(tmp_path / "out"), format=patch_format)
+
+        # Only the date would change, so the file keeps the old one
+        set_date(outfile, OLD_DATE)
+        generator.generate_patch_file(csv_file, str(tmp_path / "out"), format=patch_format)
+        assert get_date(outfile) == OLD_DATE
+
+        write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "There"]))
+        generator.generate_patch_file(csv_file, str(tmp_path / "out"), format=patch_format)
+        assert get_date(outfile) != OLD_DATE
+        write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "World"]))
+
+def test_cache_hit_has_the_current_date(tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "World"]))
+    cache_dir = tmp_path / "cache"
+    generator = Generator(2, "ntsc", cache_dir=str(cache_dir))
+    generator.generate_patch_file(csv_file, str(tmp_path / "out"))
+    outfile = generator.get_output_path(csv_file, str(tmp_path / "out"))
+    with open(outfile, "rb") as file:
+        built = file.read()
+
+    # The cached patch still has the date of the build that stored it
+    # (marked so the test can tell it was used)
+    (entry,) = os.listdir(cache_dir)
+    cached_patch = os.path.join(cache_dir, entry, "patch.txt")
+    set_date(cached_patch, OLD_DATE)
+    with open(cached_patch, "ab") as file:
+        file.write(b"comment=cached\n")
+    os.remove(outfile)
+    generator.generate_patch_file(csv_file, str(tmp_path / "out"))
+    with open(outfile, "rb") as file:
+        cached = file.read()
+    assert get_date(outfile) != OLD_DATE
+    assert strip_date(cached) == strip_date(built) + b"comment=cached\n"
+
+def test_hash_files(tmp_path):
+    (tmp_path / "a.py").write_text("A = 1\n", encoding="utf-8")
+    (tmp_path / "b.py").write_text("B = 2\n", encoding="utf-8")
+    pattern = str(tmp_path / "*.py")
+    first = hash_files([pattern])
+    assert hash_files([pattern]) == first
+    (tmp_path / "b.py").write_text("B = 3\n", encoding="utf-8")
+    assert hash_files([pattern]) != first
+
+def test_code_changes_miss_the_cache(tmp_path, monkeypatch):
+    csv_file = write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "World"]))
+    cache_dir = tmp_path / "cache"
+    Generator(2, "ntsc", cache_dir=str(cache_dir)).generate_patch_file(csv_file, str(tmp_path / "out"))
+    Generator(2, "ntsc", cache_dir=str(cache_dir)).generate_patch_file(csv_file, str(tmp_path / "out"))
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A build after the code generation changed gets its own entry
+    monkeypatch.setattr(generator_module, "get_code_hash", lambda: "changed")
+    Generator(2, "ntsc", cache_dir=str(cache_dir)).generate_patch_file(csv_file, str(tmp_path / "out"))
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_debug_builds_skip_the_cache(tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", gen_rows(["Hello", "World"]))
+    cache_dir = str(tmp_path / "cache")
+    Generator(2, "ntsc", cache_dir=cache_dir).generate_patch_file(csv_file, str(tmp_path / "out"))
+
+    # The assembly and machine code are written even though the build is cached
+    debug_dir = tmp_path / "debug"
+    Generator(2, "ntsc", cache_dir=cache_dir, debug_dir=str(debug_dir)).generate_patch_file(csv_file, str(tmp_path / "out"))
+    assert (debug_dir / "mod.asm").is_file() and (debug_dir / "mod.bin").is_file()
@@ -0,0 +1,69 @@
+"""
+Tests for the strings compressor and the MIPS decompressor
+"""
+import random
+import pytest
+from generator.compression import compress, decompress, Decompressor, MAX_MATCH, WINDOW_SIZE
+from utils.encoder import Encoder
+from utils.mips_simulator import MipsSimulator
+
+def gen_text(size, seed=0):
+    """
+    Returns text made of a few words, which compresses like strings do
+    """
+    rng = random.Random(seed)
+    words = [b"Bentley", b"Murray", b"Sly", b"Cooper", b"press", b"START", b"\x00", b" "]
+    out = bytearray()
+    while len(out) < size:
+        out += rng.choice(words)
+    return bytes(out[:size])
+
+SAMPLES = [
+    b"",
+    b"a",
+    b"abc",
+    b"aaaa",
+    b"a" * 1000,
+    b"abcabcabcabcabcabcabcabc",
+    bytes(range(256)) * 4,
+    gen_text(5000),
+    random.Random(1).getrandbits(8 * 3000).to_bytes(3000, "little"),
+    # A match just outside of the window, which has to be sent as literals
+    b"0123456789" + gen_text(WINDOW_SIZE - 9, seed=2) + b"0123456789",
+]
+
+@pytest.mark.parametrize("data", SAMPLES)
+def test_round_trip(data):
+    assert decompress(compress(data), len(data)) == data
+
+def test_repeated_text_gets_smaller():
+    data = gen_text(20000)
+    assert len(compress(data)) < len(data) // 2
+
+def test_long_runs_use_the_longest_matches():
+    # One literal and 100 matches of MAX_MATCH bytes, with a control byte for every 8 tokens
+    data = b"x" * (1 + MAX_MATCH * 100)
+    compressed = compress(data)
+    assert len(compressed) == 1 + 100 * 2 + 13
+    assert decompress(compressed, len(data)) == data
+
+@pytest.mark.parametrize("data", [SAMPLES[5], SAMPLES[7], SAMPLES[8]])
+def test_mips_decompressor(data):
+    compressed_address, out_address, flag_address, code_address = 0x20000, 0x40000, 0x30000, 0x10000
+    compressed = compress(data)
+    decompressor = Decompressor(compressed, compressed_address, out_address, len(data), flag_address)
+
+    encoder = Encoder()
+    decompressor.gen_code(encoder)
+    encoder.jr("$ra")
+    encoder.nop()
+
+    simulator = MipsSimulator()
+    simulator.load(code_address, encoder.get_bytes())
+    simulator.load(compressed_address, compressed)
+    first_count = simulator.run(code_address)
+    assert bytes(simulator.read_byte(out_address + i) for i in range(len(data))) == data
+
+    # Once the flag is set, the strings aren't expanded again
+    assert simulator.read_word(flag_address) == decompressor.flag_value
+    assert simulator.run(code_address) < min(first_count, 20)
@@ -0,0 +1,124 @@
+"""
+Tests for the Encoder class, comparing its machine code against known words and Keystone
+"""
+import struct
+import pytest
+from generator import Generator
+from generator.generator import GAME_INFO, LOOKUP_MODES
+from utils.encoder import Encoder
+from tests.helpers import write_csv
+
+def get_words(encoder):
+    """
+    Returns the encoded instructions as words
+    """
+    data = encoder.get_bytes()
+    return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+def test_known_words():
+    encoder = Encoder()
+    encoder.ori("$t0", "$zero", 5)
+    encoder.lui("$v0", 0x3C)
+    encoder.immediate("addiu", "$t4", "$t4", -1)
+    encoder.memory("lw", "$v0", 4, "$a0")
+    encoder.jr("$ra")
+    encoder.nop()
+    assert get_words(encoder) == [0x34080005, 0x3C02003C, 0x258CFFFF, 0x8C820004, 0x03E00008, 0x00000000]
+
+def test_branches_are_resolved():
+    encoder = Encoder()
+    encoder.label("start")
+    encoder.branch("bne", "$t0", "$a1", "end")
+    encoder.nop()
+    encoder.branch("beq", "$zero", "$zero", "start")
+    encoder.nop()
+    encoder.label("end")
+    assert get_words(encoder) == [0x1505_0003, 0, 0x1000_FFFD, 0]
+
+def test_load_imm():
+    small = Encoder()
+    small.load_imm("$t0", 0xFFFF)
+    assert get_words(small) == [0x3408FFFF]
+
+    wide = Encoder()
+    wide.load_imm("$t0", 0x12345)
+    assert get_words(wide) == [0x3C080001, 0x35082345]
+
+@pytest.mark.parametrize("emit", [
+    lambda encoder: encoder.ori("$t0", "$zero", 0x10000),
+    lambda encoder: encoder.ori("$t0", "$zero", -1),
+    lambda encoder: encoder.immediate("andi", "$t0", "$t0", 0x10000),
+    lambda encoder: encoder.immediate("addiu", "$t0", "$t0", 0x8000),
+    lambda encoder: encoder.immediate("addiu", "$t0", "$t0", -0x8001),
+    lambda encoder: encoder.immediate("sltiu", "$t0", "$t0", 0x8000),
+    lambda encoder: encoder.memory("lw", "$t0", 0x8000, "$t1"),
+    lambda encoder: encoder.lui("$t0", 0x10000),
+    lambda encoder: encoder.shift("sll", "$t0", "$t0", 32),
+    lambda encoder: encoder.load_imm("$t0", 0x100000000),
+    lambda encoder: encoder.j(0x10000000),
+    lambda encoder: encoder.j(0x2E60B2),
+    lambda encoder: encoder.parse("lw $v0, 0x8000($a0)"),
+])
+def test_out_of_range_operands_are_rejected(emit):
+    with pytest.raises(ValueError):
+        emit(Encoder())
+
+@pytest.mark.parametrize("game, region", [(game, region) for game, regions in GAME_INFO.items() for region in regions])
+def test_precomputed_hook_code(game, region):
+    game_info = GAME_INFO[game][region]
+    hook_encoder = Encoder()
+    hook_encoder.j(game_info.asm_adr)
+    hook_encoder.nop()
+    assert hook_encoder.get_bytes() == game_info.hook_code
+
+    cancel_hook_encoder = Encoder()
+    cancel_hook_encoder.jr("$ra")
+    cancel_hook_encoder.parse(game_info.hook_delayslot)
+    assert cancel_hook_encoder.get_bytes() == game_info.cancel_hook_code
+
+def test_every_instruction_matches_keystone():
+    pytest.importorskip("keystone")
+    encoder = Encoder(keep_asm=True)
+    encoder.label("start")
+    for mnemonic in ["addu", "subu", "and", "or", "xor", "sltu"]:
+        encoder.register(mnemonic, "$t0", "$t1", "$t2")
+    encoder.shift("sll", "$t0", "$t1", 31)
+    encoder.shift("srl", "$t0", "$t1", 3)
+    for mnemonic, imm in [("addiu", -0x8000), ("addiu", 0x7FFF), ("sltiu", 12), ("andi", 0xFFFF), ("ori", 0x8000)]:
+        encoder.immediate(mnemonic, "$t3", "$t4", imm)
+    for mnemonic, offset in [("lw", -4), ("lbu", 1), ("lhu", 2), ("sb", 0x7FFF), ("sw", 8)]:
+        encoder.memory(mnemonic, "$t5", offset, "$t6")
+    encoder.branch("bne", "$t0", "$a1", "end")
+    encoder.nop()
+    encoder.branch("beq", "$t0", "$zero", "start")
+    encoder.nop()
+    encoder.load_imm("$t0", 0x12345678)
+    encoder.multu("$t0", "$t1")
+    encoder.mfhi("$t2")
+    encoder.mflo("$t3")
+    encoder.j(0x2E60B0)
+    encoder.nop()
+    encoder.label("end")
+    encoder.jr("$ra")
+    encoder.parse("lw $v0, 0x4($v1)")
+    assert encoder.get_bytes() == Generator.assemble(encoder.get_asm())[0]
+
+@pytest.mark.parametrize("lookup", LOOKUP_MODES)
+@pytest.mark.parametrize("options", [
+    {"game": 2, "region": "ntsc"},
+    {"game": 2, "region": "pal", "lang": "fr"},
+    {"game": 3, "region": "ntsc", "compress_strings": True},
+])
+def test_builds_match_keystone(tmp_path, lookup, options):
+    pytest.importorskip("keystone")
+    csv_file = write_csv(tmp_path / "strings.csv", [[string_id, f"String {string_id}"] for string_id in list(range(10, 30)) + [500, 70000]])
+
+    # With keystone_check, the build fails if any code the encoder generates doesn't match Keystone
+    generator = Generator(lookup=lookup, keystone_check=True, **options)
+    generator.generate_patches(csv_file)
+
+def test_multi_language_build_matches_keystone(tmp_path):
+    pytest.importorskip("keystone")
+    csv_file = write_csv(tmp_path / "strings.csv", [["id", "en", "fr", "de"], [5, "Press START", "Appuyez sur START", "Drücke START"], [8, "Menu", "Menu", ""]])
+    generator = Generator(2, "pal", multi_lang=True, keystone_check=True)
+    generator.generate_patches(csv_file)
@@ -0,0 +1,92 @@
+"""
+Tests for how the Generator splits a mod into patches
+"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+from generator import Generator
+from tests.helpers import write_csv, strip_date
+
+ROWS = [[str(1000 + i), f"String number {i}"] for i in range(50)]
+
+# Types of the conditionals
+EQUAL = 0
+NOT_EQUAL = 1
+
+def get_conditional(patch):
+    """
+    Returns the address and type of the conditional of a patch, or None if it has none
+    """
+    conditional = patch.get_conditionals()
+    return (conditional["address"], conditional["type"]) if len(conditional) != 0 else None
+
+def test_lang_gate_all_gates_the_whole_mod():
+    generator = Generator(2, "pal", "fr")
+    mod_patch, cancel_hook_patch = generator.build(ROWS).patches
+    assert get_conditional(mod_patch) == (generator.lang_adr, EQUAL)
+    assert generator.strings_adr in [chunk.get_address() for chunk in mod_patch.get_chunks()]
+    assert get_conditional(cancel_hook_patch) == (generator.lang_adr, NOT_EQUAL)
+
+def test_lang_gate_hook_only_gates_the_hook():
+    generator = Generator(2, "pal", "fr", lang_gate="hook")
+    mod_patch, payload_patch, _ = generator.build(ROWS).patches
+    assert [chunk.get_address() for chunk in mod_patch.get_chunks()] == [generator.hook_adr]
+    assert get_conditional(mod_patch) == (generator.lang_adr, EQUAL)
+    assert get_conditional(payload_patch) is None
+
+def test_static_placement_only_gates_the_hook():
+    for static_placement in ["once", "sentinel"]:
+        generator = Generator(2, "pal", "fr", static_placement=static_placement)
+        mod_patch, payload_patch, _ = generator.build(ROWS).patches
+        assert [chunk.get_address() for chunk in mod_patch.get_chunks()] == [generator.hook_adr]
+        assert get_conditional(mod_patch) == (generator.lang_adr, EQUAL)
+        if static_placement == "once":
+            assert get_conditional(payload_patch) is None
+            assert all(chunk.is_once() for chunk in payload_patch.get_chunks())
+        else:
+            assert get_conditional(payload_patch)[1] == NOT_EQUAL
+
+def test_builds_are_quiet_unless_verbose(caplog):
+    caplog.set_level("INFO")
+    Generator(2, "pal", "fr", lang_gate="hook").build(ROWS)
+    assert caplog.records == []
+
+    Generator(2, "pal", "fr", lang_gate="hook", verbose=True).build(ROWS)
+    assert any("removed" in record.getMessage() for record in caplog.records)
+
+def test_concurrent_builds_match_serial_builds(tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", ROWS)
+    with open(csv_file, "r", encoding="utf-8") as file:
+        csv_text = file.read()
+    generators = [Generator(2, "ntsc"), Generator(2, "pal", "fr", lookup="hash"), Generator(3, "ntsc", compress_strings=True)]
+
+    def open_source(kind):
+        """
+        Returns the csv as a path, a text file object or rows
+        """
+        if kind == "path":
+            return csv_file
+        if kind == "file":
+            return io.StringIO(csv_text)
+        return [list(row) for row in ROWS]
+
+    def build(generator, kind, patch_format):
+        return strip_date(generator.build(open_source(kind), "mod", patch_format=patch_format).text)
+
+    cases = [(generator, kind, patch_format) for generator in generators for kind in ["path", "file", "rows"] for patch_format in ["pnach", "clps2c"]]
+    serial = [build(*case) for case in cases]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        concurrent = list(executor.map(lambda case: build(*case), cases * 4))
+    assert concurrent == serial * 4
+
+    # Every kind of source gives the same patch
+    for i in range(0, len(serial), 6):
+        assert serial[i] == serial[i + 2] == serial[i + 4]
+        assert serial[i + 1] == serial[i + 3] == serial[i + 5]
+
+def test_build_from_an_open_file(tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", ROWS)
+    generator = Generator(2, "ntsc")
+    with open(csv_file, "r", encoding="utf-8") as file:
+        result = generator.build(file, "mod")
+    assert strip_date(result.text) == strip_date(generator.build(csv_file, "mod").text)
+    assert sorted(dict(result.string_pointers)) == [int(row[0]) for row in ROWS]
@@ -0,0 +1,116 @@
+"""
+Tests for the PatchInjector class, against a stand-in PINE server
+"""
+import struct
+import pytest
+from generator import Generator
+from generator.injector import PatchInjector
+from generator.pnach import Pnach, Chunk
+from utils import pine
+from utils.pine import PineClient, MSG_READ16
+from tests.pine_server import RecordingPineServer
+
+def gen_rows(first_letter="S"):
+    """
+    Returns rows of string IDs and strings, with the strings starting with the letter
+    """
+    return [[str(1000 + i), f"{first_letter}tring number {i}"] for i in range(100)]
+
+def get_words(chunk):
+    """
+    Returns the (address, value) pairs of the chunk's words, with a partial word padded
+    """
+    data = bytes(chunk.get_bytes()) + b"\x00" * (-chunk.size % 4)
+    return [(chunk.get_address() + i * 4, value) for i, value in enumerate(struct.unpack(f"<{len(data) // 4}I", data))]
+
+@pytest.fixture
+def server():
+    """
+    Runs a stand-in PINE server
+    """
+    with RecordingPineServer() as pine_server:
+        yield pine_server
+
+def create_injector(server, generator):
+    """
+    Returns an injector for the generator's hook, connected to the server
+    """
+    return PatchInjector(PineClient(socket_path=server.socket_path), generator.hook_adr, generator.get_cancel_hook_code())
+
+def test_first_inject_writes_the_hook_last(server):
+    generator = Generator(2, "ntsc")
+    injector = create_injector(server, generator)
+    result = generator.build(gen_rows())
+    hook_words = get_words(next(chunk for chunk in result.chunks if chunk.get_address() == generator.hook_adr))
+    unhook_words = get_words(Chunk(generator.hook_adr, generator.get_cancel_hook_code()))
+
+    num_words, num_messages = injector.inject(result.patches)
+    writes = server.get_writes()
+    assert (num_words, num_messages) == (len(writes), 1)
+
+    # The hook might already be in memory from the pnach, so it's taken out before anything else
+    assert writes[:len(unhook_words)] == unhook_words
+    assert writes[-len(hook_words):] == hook_words
+    for chunk in result.chunks:
+        assert all(server.memory[address] == value for address, value in get_words(chunk))
+
+def test_second_inject_only_sends_changed_words(server):
+    generator = Generator(2, "ntsc")
+    injector = create_injector(server, generator)
+    first = generator.build(gen_rows("S"))
+    injector.inject(first.patches)
+
+    # Nothing is sent if nothing changed
+    server.messages.clear()
+    assert injector.inject(generator.build(gen_rows("S")).patches) == (0, 0)
+    assert server.messages == []
+
+    # Strings of the same length only change the words of their text
+    second = generator.build(gen_rows("Z"))
+    changed = []
+    for old_chunk, new_chunk in zip(first.chunks, second.chunks):
+        changed += [word for word in get_words(new_chunk) if word not in get_words(old_chunk)]
+    assert len(changed) != 0 and all(address != generator.hook_adr for address, _ in changed)
+
+    injector.inject(second.patches)
+    writes = server.get_writes()
+    hook_words = get_words(next(chunk for chunk in second.chunks if chunk.get_address() == generator.hook_adr))
+    unhook_words = get_words(Chunk(generator.hook_adr, generator.get_cancel_hook_code()))
+    assert writes == unhook_words + changed + hook_words
+
+def test_conditionals_are_read_from_memory(server):
+    generator = Generator(2, "pal", "fr")
+    result = generator.build(gen_rows())
+    mod_patch, cancel_patch = result.patches
+    language = mod_patch.get_conditionals()["value"]
+
+    # The mod is written when the game is in the language
+    server.write16(generator.lang_adr, language)
+    create_injector(server, generator).inject(result.patches)
+    assert server.messages[0] == [(MSG_READ16, generator.lang_adr, None)]
+    assert server.get_writes()[-2:] == get_words(mod_patch.get_chunks()[0])
+
+    # Otherwise only the hook is cancelled
+    server.messages.clear()
+    server.write16(generator.lang_adr, language + 1)
+    create_injector(server, generator).inject(result.patches)
+    assert server.get_writes() == get_words(cancel_patch.get_chunks()[0])
+
+def test_large_writes_are_split_into_messages(server):
+    # A chunk with more words than fit in one message
+    words_per_message = (pine.MAX_IPC_SIZE - 4) // 9
+    patch = Pnach()
+    patch.add_chunk(Chunk(0x100000, bytes(range(256)) * ((words_per_message + 10) * 4 // 256 + 1)))
+    injector = PatchInjector(PineClient(socket_path=server.socket_path), 0x200000)
+    num_words, num_messages = injector.inject([patch])
+
+    assert num_messages == 2
+    assert [len(message) for message in server.messages] == [words_per_message, num_words - words_per_message]
+    assert server.get_writes() == get_words(patch.get_chunks()[0])
+
+def test_large_reads_are_split_into_messages(server, monkeypatch):
+    monkeypatch.setattr(pine, "MAX_IPC_RETURN_SIZE", 5 + 2 * 3)
+    for i in range(8):
+        server.write16(0x1000 + i * 2, i + 1)
+    assert PineClient(socket_path=server.socket_path).read16_batch([0x1000 + i * 2 for i in range(8)]) == list(range(1, 9))
+    assert [len(message) for message in server.messages] == [3, 3, 2]
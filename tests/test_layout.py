@@ -0,0 +1,76 @@
+"""
+Tests for the StringLayout class
+"""
+from generator.layout import StringLayout, get_slot_capacity, RESERVE_ALIGNMENT
+
+def place(layout, strings):
+    """
+    Places the strings by key and checks that each one is in the blob at its offset
+    """
+    keys = list(strings)
+    blob, offsets = layout.place(keys, [strings[key] for key in keys])
+    for key, offset in zip(keys, offsets):
+        assert offset % 4 == 0
+        assert blob[offset:offset + len(strings[key])] == strings[key]
+    return blob, dict(zip(keys, offsets))
+
+def test_slot_capacity():
+    assert get_slot_capacity(1) == 4
+    assert get_slot_capacity(8) == 12
+    assert get_slot_capacity(100) == 128
+
+def test_edits_that_fit_keep_their_slot():
+    layout = StringLayout(0x1000)
+    _, first = place(layout, {"1": b"Hello\x00", "2": b"World\x00", "3": b"Quit\x00"})
+    blob, second = place(layout, {"1": b"Hi\x00", "2": b"World!\x00", "3": b"Quit\x00"})
+    assert second == first
+    assert layout.moved == 0
+    assert len(blob) % RESERVE_ALIGNMENT == 0
+
+def test_strings_that_outgrow_their_slot_move():
+    layout = StringLayout(0x1000)
+    _, first = place(layout, {"1": b"Hello\x00", "2": b"World\x00"})
+    _, second = place(layout, {"1": b"Hello there, this is longer\x00", "2": b"World\x00"})
+    assert second["1"] != first["1"]
+    assert second["2"] == first["2"]
+    assert layout.moved == 1
+
+def test_freed_slots_are_reused_and_merged():
+    layout = StringLayout(0x1000)
+    _, first = place(layout, {"1": b"aaaaaaa\x00", "2": b"bbbbbbb\x00", "3": b"ccccccc\x00"})
+    size = layout.size
+
+    # Removing two neighbouring strings frees one block that a longer string fits in
+    place(layout, {"3": b"ccccccc\x00"})
+    assert layout.free == [(0, first["3"])] # the slots of 1 and 2 are everything before 3
+    _, third = place(layout, {"3": b"ccccccc\x00", "4": b"dddddddddddddd\x00"})
+    assert third["4"] == 0
+    assert layout.size == size
+
+def test_reserved_space_only_grows_past_the_end():
+    layout = StringLayout(0x1000)
+    blob, _ = place(layout, {"1": b"a\x00"})
+    reserved = len(blob)
+    blob, _ = place(layout, {"1": b"a\x00", "2": b"b\x00", "3": b"c\x00"})
+    assert len(blob) == reserved
+
+def test_duplicate_keys_use_the_last_string():
+    layout = StringLayout(0x1000)
+    blob, offsets = layout.place(["1", "1"], [b"first\x00", b"second\x00"])
+    assert offsets[0] == offsets[1]
+    assert blob[offsets[0]:offsets[0] + 7] == b"second\x00"
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "strings.csv.layout.json")
+    layout = StringLayout(0x1000)
+    place(layout, {"1": b"Hello\x00", "2": b"World\x00"})
+    place(layout, {"2": b"World\x00"})
+    assert layout.save(path)
+    assert not layout.save(path)
+
+    loaded = StringLayout.load(path, 0x1000)
+    assert (loaded.size, loaded.reserved, loaded.slots, loaded.free) == (layout.size, layout.reserved, layout.slots, layout.free)
+
+    # A layout for another strings address, or a missing file, starts empty
+    assert StringLayout.load(path, 0x2000).slots == {}
+    assert StringLayout.load(str(tmp_path / "missing.json"), 0x1000).slots == {}
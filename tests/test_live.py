@@ -0,0 +1,61 @@
+"""
+Tests for the LiveBuild class
+"""
+from pathlib import Path
+import pytest
+from generator import Generator
+from generator.live import LiveBuild
+from tests.helpers import write_csv, strip_date
+
+def gen_rows(count):
+    """
+    Returns rows of string IDs and strings, with a few lines in between the IDs
+    """
+    return [[str(1000 + i * 3), f"String number {i}"] for i in range(count)]
+
+@pytest.mark.parametrize("patch_format", ["pnach", "clps2c"])
+def test_edits_that_fit_are_updated_in_place(tmp_path, patch_format):
+    csv_file = tmp_path / "mod.csv"
+    rows = gen_rows(600)
+    write_csv(csv_file, rows)
+    generator = Generator(2, "ntsc")
+    live = LiveBuild(generator, str(csv_file), str(tmp_path / "out"), patch_format=patch_format)
+
+    assert live.build() is False
+    assert live.build() is None
+
+    # Shorter strings fit their slots, including ones far apart in the blob
+    rows[3][1] = "Short"
+    rows[550][1] = "Also short"
+    write_csv(csv_file, rows)
+    assert live.build() is True
+    assert strip_date(Path(live.outfile).read_bytes()) == strip_date(generator.build(str(csv_file), patch_format=patch_format).text)
+
+def test_edits_that_outgrow_their_slot_build_again(tmp_path):
+    csv_file = tmp_path / "mod.csv"
+    rows = gen_rows(50)
+    write_csv(csv_file, rows)
+    generator = Generator(2, "ntsc")
+    live = LiveBuild(generator, str(csv_file), str(tmp_path / "out"))
+    assert live.build() is False
+
+    rows[10][1] = "This string is a lot longer than the one that was in its slot before"
+    write_csv(csv_file, rows)
+    assert live.build() is False
+    assert strip_date(Path(live.outfile).read_bytes()) == strip_date(generator.build(str(csv_file)).text)
+
+    # Adding a row can't be matched up by line
+    rows.append(["5000", "New string"])
+    write_csv(csv_file, rows)
+    assert live.build() is False
+
+def test_options_that_need_a_full_build(tmp_path):
+    csv_file = tmp_path / "mod.csv"
+    rows = gen_rows(50)
+    write_csv(csv_file, rows)
+    live = LiveBuild(Generator(2, "ntsc", compress_strings=True), str(csv_file), str(tmp_path / "out"))
+    assert live.build() is False
+
+    rows[10][1] = "Short"
+    write_csv(csv_file, rows)
+    assert live.build() is False
@@ -0,0 +1,84 @@
+"""
+Tests for the lookup modes of the trampoline, running the generated code in the MIPS simulator
+"""
+import pytest
+from generator import Generator
+from generator.generator import LOOKUP_MODES, LANGUAGE_IDS
+from utils.benchmark_lookup import get_miss_ids, load_mod, measure_lookups, ORIGINAL_STRING_POINTER
+from tests.helpers import write_csv
+
+# Runs of consecutive IDs (for the ranges lookup) and IDs with gaps between them
+STRING_IDS = list(range(100, 140)) + list(range(500, 1000, 7)) + [3000, 3001, 3002, 40000]
+
+def gen_rows(string_ids):
+    """
+    Returns rows with a different string for each ID, and a manual address for a few of them
+    """
+    return [[string_id, f"Manual string {i}", f"{0x1000000 + i * 0x40:X}"] if i % 10 == 5 else [string_id, f"String number {i}"]
+        for i, string_id in enumerate(string_ids)]
+
+def check_lookups(generator, csv_file, string_ids):
+    """
+    Returns the number of lookups of the strings and of some other IDs that returned the wrong pointer
+    """
+    simulator, expected_pointers = load_mod(generator, csv_file)
+    assert sorted(expected_pointers) == sorted(set(string_ids))
+    _, hit_errors = measure_lookups(simulator, generator.hook_adr, string_ids, expected_pointers)
+    _, miss_errors = measure_lookups(simulator, generator.hook_adr, get_miss_ids(string_ids, 200), expected_pointers)
+    return hit_errors + miss_errors
+
+@pytest.mark.parametrize("lookup", LOOKUP_MODES)
+@pytest.mark.parametrize("game, region", [(2, "ntsc"), (2, "pal"), (3, "ntsc")])
+def test_lookup_returns_the_right_pointer(tmp_path, lookup, game, region):
+    csv_file = write_csv(tmp_path / "strings.csv", gen_rows(STRING_IDS))
+    assert check_lookups(Generator(game, region, lookup=lookup), csv_file, STRING_IDS) == 0
+
+@pytest.mark.parametrize("lookup", LOOKUP_MODES)
+def test_lookup_with_compressed_strings(tmp_path, lookup):
+    csv_file = write_csv(tmp_path / "strings.csv", gen_rows(STRING_IDS))
+    assert check_lookups(Generator(2, "ntsc", lookup=lookup, compress_strings=True), csv_file, STRING_IDS) == 0
+
+def test_wrong_pointer_is_an_error(tmp_path):
+    csv_file = write_csv(tmp_path / "strings.csv", gen_rows(STRING_IDS))
+    generator = Generator(2, "ntsc", lookup="binsearch")
+    simulator, expected_pointers = load_mod(generator, csv_file)
+    first, second = STRING_IDS[:2]
+    expected_pointers[first], expected_pointers[second] = expected_pointers[second], expected_pointers[first]
+    assert measure_lookups(simulator, generator.hook_adr, STRING_IDS, expected_pointers)[1] == 2
+
+@pytest.mark.parametrize("lookup", LOOKUP_MODES)
+def test_lookup_with_wide_string_ids(tmp_path, lookup):
+    string_ids = [5, 0xFFFF, 0x10000, 0x10001, 0x10002, 0x10005, 70000, 0x123456]
+    csv_file = write_csv(tmp_path / "strings.csv", gen_rows(string_ids))
+    simulator, expected_pointers = load_mod(Generator(2, "ntsc", lookup=lookup), csv_file)
+    # IDs that only match the wide IDs in their lower 16 bits must not be found
+    miss_ids = [0, 1, 2, 0x2345, 70000 & 0xFFFF, 0x20000]
+    assert measure_lookups(simulator, Generator(2, "ntsc").hook_adr, string_ids + miss_ids, expected_pointers)[1] == 0
+
+def test_multi_language_lookup(tmp_path):
+    # German has an empty cell, and the other languages have no column
+    csv_file = write_csv(tmp_path / "strings.csv", [
+        ["id", "en", "fr", "de"],
+        [5, "Press START", "Appuyez sur START", "Drücke START"],
+        [8, "Menu", "Menu", ""],
+        [300, "Quit", "Quitter", "Beenden"],
+    ] + [[1000 + i, f"String {i}", f"Chaîne {i}", f"Zeichenkette {i}"] for i in range(20)])
+    generator = Generator(2, "pal", multi_lang=True)
+    simulator, _ = load_mod(generator, csv_file)
+    language_pointers = generator.build(csv_file).string_pointers
+    string_ids = [5, 8, 300] + list(range(1000, 1020))
+    miss_ids = [0, 6, 299, 1020, 0xFFFF]
+
+    for language in list(LANGUAGE_IDS.values()) + [len(LANGUAGE_IDS), 0xFF]:
+        simulator.write_byte(generator.lang_adr, language)
+        expected_pointers = dict(language_pointers.get(language, []))
+        if language in [LANGUAGE_IDS["en"], LANGUAGE_IDS["fr"], LANGUAGE_IDS["de"]]:
+            assert len(expected_pointers) == (22 if language == LANGUAGE_IDS["de"] else 23)
+        else:
+            assert len(expected_pointers) == 0
+        assert measure_lookups(simulator, generator.hook_adr, string_ids + miss_ids, expected_pointers)[1] == 0, language
+
+    # Languages share the pointers of strings that are the same
+    assert dict(language_pointers[LANGUAGE_IDS["en"]])[8] == dict(language_pointers[LANGUAGE_IDS["fr"]])[8]
+    assert dict(language_pointers[LANGUAGE_IDS["en"]])[5] != dict(language_pointers[LANGUAGE_IDS["fr"]])[5]
+    assert all(pointer != ORIGINAL_STRING_POINTER for pairs in language_pointers.values() for _, pointer in pairs)
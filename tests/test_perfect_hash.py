@@ -0,0 +1,40 @@
+"""
+Tests for the PerfectHash class
+"""
+import random
+import struct
+import pytest
+from generator import PerfectHash
+
+def test_every_key_gets_its_own_slot():
+    keys = random.Random(1).sample(range(0x10000), 1000)
+    perfect_hash = PerfectHash(keys)
+    slots = [perfect_hash.get_slot(key) for key in keys]
+    assert sorted(slots) == list(range(len(keys)))
+    for index, key in enumerate(keys):
+        assert perfect_hash.slots[perfect_hash.get_slot(key)] == index
+
+def test_small_key_sets():
+    for keys in [[7], [1, 2], [5, 100, 1000]]:
+        perfect_hash = PerfectHash(keys)
+        assert sorted(perfect_hash.get_slot(key) for key in keys) == list(range(len(keys)))
+
+def test_same_seed_gives_same_hash():
+    keys = list(range(1000, 1500, 3))
+    first = PerfectHash(keys, seed=5)
+    second = PerfectHash(keys, seed=5)
+    assert (first.mul1, first.mul2, first.displacements) == (second.mul1, second.mul2, second.displacements)
+
+def test_displacement_table():
+    perfect_hash = PerfectHash(list(range(100)))
+    table = perfect_hash.gen_displacement_table()
+    assert len(table) == perfect_hash.num_buckets * 2
+    assert list(struct.unpack(f"<{perfect_hash.num_buckets}H", table)) == perfect_hash.displacements
+
+def test_duplicate_keys_are_rejected():
+    with pytest.raises(ValueError):
+        PerfectHash([1, 2, 2])
+
+def test_too_many_keys_are_rejected():
+    with pytest.raises(ValueError):
+        PerfectHash(range(0x10001))
@@ -0,0 +1,47 @@
+"""
+Tests for the Chunk class
+"""
+import struct
+from generator import Generator
+from generator.pnach import Chunk
+
+def test_split_changed():
+    data = bytes(range(64)) + b"\xAA\xBB"
+    baseline = bytearray(0x2000)
+    baseline[0x1000:0x1000 + 64] = data[:64]
+
+    # Words 2, 3 and 10 and the partial word at the end differ from the dump
+    baseline[0x1008:0x1010] = b"\xFF" * 8
+    baseline[0x1028] = 0xFF
+    chunk = Chunk(0x1000, data, "Strings")
+    parts = chunk.split_changed(bytes(baseline))
+    assert [(part.get_address(), bytes(part.get_bytes())) for part in parts] == [
+        (0x1008, data[8:16]),
+        (0x1028, data[40:44]),
+        (0x1040, data[64:]),
+    ]
+    assert [part.get_header() for part in parts] == ["comment=Strings", "comment=", "comment="]
+
+def test_split_changed_uses_the_ee_ram_address():
+    # Addresses in the uncached mirror of EE RAM (0x20000000) index the same dump
+    baseline = bytearray(0x2000)
+    baseline[0x1000:0x1004] = struct.pack("<I", 5)
+    chunk = Chunk(0x20001000, struct.pack("<II", 5, 6))
+    assert [part.get_address() for part in chunk.split_changed(bytes(baseline))] == [0x20001004]
+
+def test_baseline_of_the_mod_itself_leaves_only_the_hook(tmp_path):
+    rows = [[str(1000 + i), f"String number {i}"] for i in range(50)]
+    patches = Generator(2, "ntsc").build(rows).patches
+
+    # Dump of the game with the mod already written
+    dump_file = tmp_path / "eeMemory.bin"
+    with open(dump_file, "wb") as file:
+        file.truncate(0x2000000)
+        for patch in patches:
+            for chunk in patch.get_chunks():
+                file.seek(chunk.get_address())
+                file.write(chunk.get_bytes())
+
+    generator = Generator(2, "ntsc", baseline_dump=str(dump_file))
+    chunks = generator.build(rows).chunks
+    assert [chunk.get_address() for chunk in chunks] == [generator.hook_adr]
@@ -0,0 +1,68 @@
+"""
+Tests for the build server and its client
+"""
+import os
+import socket
+import tempfile
+import threading
+import pytest
+from generator import Generator
+from generator.server import BuildServer
+from utils.build_client import send_request
+from tests.helpers import write_csv, strip_date
+
+ROWS = [[str(1000 + i), f"Served string {i}"] for i in range(20)]
+
+@pytest.fixture
+def server():
+    """
+    Runs a build server on a socket in a temporary folder (short enough for a Unix socket path)
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        build_server = BuildServer(os.path.join(temp_dir, "build.sock"))
+        thread = threading.Thread(target=build_server.serve_forever, daemon=True)
+        thread.start()
+        yield build_server
+        build_server.shutdown()
+        build_server.server_close()
+        thread.join()
+
+def test_rows_are_built_to_text(server):
+    for patch_format in ["pnach", "clps2c"]:
+        reply = send_request({"rows": ROWS, "game": 2, "region": "pal", "lang": "fr", "format": patch_format}, server.socket_path)
+        assert "error" not in reply
+        expected = Generator(2, "pal", "fr").build(ROWS, patch_format=patch_format).text
+        assert strip_date(reply["text"]) == strip_date(expected)
+        assert set(reply["timings"]) == {"setup", "wait", "build", "total"}
+
+    # Generators are reused for the same options
+    send_request({"rows": ROWS, "game": 2, "region": "PAL", "lang": "fr"}, server.socket_path)
+    assert len(server.generators) == 1
+
+def test_csv_is_built_to_a_file(server, tmp_path):
+    csv_file = write_csv(tmp_path / "mod.csv", ROWS)
+    reply = send_request({"csv": csv_file, "game": 3, "region": "ntsc", "output_dir": str(tmp_path / "out")}, server.socket_path)
+    assert "error" not in reply
+    with open(reply["outfile"], "rb") as file:
+        assert strip_date(file.read()) == strip_date(Generator(3, "ntsc").build(csv_file).text)
+
+def test_errors_are_replied(server):
+    assert "Unknown request options" in send_request({"rows": ROWS, "game": 2, "region": "ntsc", "colour": "red"}, server.socket_path)["error"]
+    assert "csv path or rows" in send_request({"game": 2, "region": "ntsc"}, server.socket_path)["error"]
+    assert "missing the region" in send_request({"rows": ROWS, "game": 2}, server.socket_path)["error"]
+    assert "error" in send_request({"rows": ROWS, "game": 4, "region": "ntsc"}, server.socket_path)
+
+    # A line that isn't a JSON object gets an error too, and the server keeps running
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock, sock.makefile("rb") as reply_file:
+        sock.connect(server.socket_path)
+        sock.sendall(b"[1, 2]\n")
+        assert b"JSON object" in reply_file.readline()
+    assert "text" in send_request({"rows": ROWS, "game": 2, "region": "ntsc"}, server.socket_path)
+
+def test_a_second_server_on_the_same_socket_fails(server):
+    with pytest.raises(Exception, match="already running"):
+        BuildServer(server.socket_path)
+
+def test_client_fails_without_a_server(tmp_path):
+    with pytest.raises(Exception, match="is it running"):
+        send_request({"rows": ROWS, "game": 2, "region": "ntsc"}, str(tmp_path / "missing.sock"))
@@ -0,0 +1,69 @@
+"""
+Tests for pointing the entries of the game's string table straight at the custom strings
+"""
+import struct
+import pytest
+from generator import Generator
+from generator.generator import GAME_INFO
+from utils.benchmark_lookup import load_mod, measure_lookups
+
+# String IDs in the synthetic string table, with 11 in it twice
+TABLE_IDS = [10, 11, 12, 11, 40]
+
+@pytest.fixture
+def dump_file(tmp_path):
+    """
+    Returns the path of an EE RAM dump with a string table at the address of Sly 3 NTSC
+    """
+    path = tmp_path / "eeMemory.bin"
+    with open(path, "wb") as file:
+        file.truncate(0x2000000)
+        file.seek(GAME_INFO[3]["ntsc"].string_table)
+        for i, string_id in enumerate(TABLE_IDS):
+            file.write(struct.pack("<II", string_id, 0x300000 + i * 0x10))
+    return str(path)
+
+def get_direct_patches(result):
+    """
+    Returns the patches that write a string table entry, by the address of the entry
+    """
+    return {patch.get_conditionals()["address"]: patch for patch in result.patches if len(patch.get_conditionals()) != 0}
+
+def test_table_ids_get_a_pointer_write(dump_file):
+    generator = Generator(3, "ntsc", string_table_dump=dump_file)
+    result = generator.build([["10", "Ten"], ["11", "Eleven"], ["50", "Fifty"]])
+    pointers = dict(result.string_pointers)
+    table = GAME_INFO[3]["ntsc"].string_table
+
+    # Every entry with the ID is written, only while it still has that ID
+    direct_patches = get_direct_patches(result)
+    assert sorted(direct_patches) == [table, table + 8, table + 24]
+    for slot in [0, 1, 3]:
+        entry_address = table + slot * 8
+        string_id = TABLE_IDS[slot]
+        patch = direct_patches[entry_address]
+        assert patch.get_conditionals() == {"address": entry_address, "value": string_id, "type": 0}
+        [chunk] = patch.get_chunks()
+        assert chunk.get_address() == entry_address + 4
+        assert bytes(chunk.get_bytes()) == struct.pack("<I", pointers[string_id])
+        assert f"E001{string_id:04X},extended,{entry_address:08X}" in result.text
+
+def test_other_ids_go_through_the_hook(dump_file):
+    generator = Generator(3, "ntsc", string_table_dump=dump_file)
+    rows = [["10", "Ten"], ["12", "Twelve"], ["50", "Fifty"], ["51", "Fifty-one"]]
+    assert any(chunk.get_address() == generator.hook_adr for chunk in generator.build(rows).chunks)
+
+    # IDs in the table get the original pointer from the hook, since their entry is patched
+    simulator, pointers = load_mod(generator, rows)
+    expected_pointers = {string_id: pointers[string_id] for string_id in [50, 51]}
+    _, errors = measure_lookups(simulator, generator.hook_adr, [10, 12, 50, 51, 52, 0], expected_pointers)
+    assert errors == 0
+
+def test_only_table_ids_drop_the_hook(dump_file):
+    generator = Generator(3, "ntsc", string_table_dump=dump_file)
+    result = generator.build([["10", "Ten"], ["40", "Forty"]])
+    addresses = [chunk.get_address() for chunk in result.chunks]
+    assert generator.hook_adr not in addresses
+    assert generator.code_address not in addresses
+    assert generator.strings_adr in addresses
+    assert len(get_direct_patches(result)) == 2
@@ -0,0 +1,54 @@
+"""
+Tests for the strings blob and the Strings class
+"""
+import random
+from generator.strings import gen_string_pool, Strings
+
+def check_pool(strings):
+    """
+    Packs the strings and checks that every offset points to its string
+    """
+    pool, offsets = gen_string_pool(strings)
+    assert len(offsets) == len(strings)
+    for string, offset in zip(strings, offsets):
+        assert pool[offset:offset + len(string)] == string
+    return pool, offsets
+
+def test_identical_strings_are_stored_once():
+    pool, offsets = check_pool([b"Menu\x00", b"Quit\x00", b"Menu\x00"])
+    assert pool == b"Menu\x00Quit\x00"
+    assert offsets == [0, 5, 0]
+
+def test_suffixes_point_into_longer_strings():
+    pool, offsets = check_pool([b"...\x00", b"Options...\x00", b"s...\x00", b"Quit\x00"])
+    assert pool == b"Options...\x00Quit\x00"
+    assert offsets == [7, 0, 6, 11]
+
+def test_strings_that_only_share_a_prefix_are_not_merged():
+    pool, _ = check_pool([b"Option\x00", b"Options\x00"])
+    assert pool == b"Option\x00Options\x00"
+
+def test_random_strings():
+    rng = random.Random(0)
+    strings = [bytes(rng.choice(b"ab") for _ in range(rng.randint(0, 6))) + b"\x00" for _ in range(500)]
+    pool, _ = check_pool(strings)
+    assert len(pool) <= len(b"".join(set(strings)))
+
+def test_empty_pool():
+    assert gen_string_pool([]) == (b"", [])
+
+def test_pointers_point_to_the_strings():
+    rows = [["10", "Options..."], ["11", "..."], ["12", "Options..."], ["13", "Quit"]]
+    strings_obj = Strings(rows, 0x1000, "utf-8", "iso-8859-1")
+    auto_chunk, _, string_pointers = strings_obj.gen_pnach_chunks("pnach")
+    data = auto_chunk.get_bytes()
+    expected = {int(string_id): string for string_id, string in rows}
+    pointers = dict(string_pointers)
+    assert sorted(pointers) == sorted(expected)
+    for string_id, pointer in pointers.items():
+        start = pointer - auto_chunk.get_address()
+        assert data[start:data.index(b"\x00", start)] == expected[string_id].encode("iso-8859-1")
+
+    # The duplicate and the suffix don't take any space of their own
+    assert pointers[12] == pointers[10]
+    assert pointers[11] == pointers[10] + len("Options")
@@ -0,0 +1,117 @@
+"""
+Tests for the LiveEditWatcher class, with a stand-in for the live build and synthetic file events
+"""
+import logging
+import os
+import threading
+import time
+import pytest
+from watchdog.events import FileModifiedEvent, FileMovedEvent, FileOpenedEvent, FileDeletedEvent, DirModifiedEvent
+from generator.watcher import LiveEditWatcher
+
+# Debounce of the watchers in the tests, in milliseconds
+DEBOUNCE_MS = 200
+
+class FakeGenerator:
+    """
+    FakeGenerator class, only has the logger the watcher reports to
+    """
+    logger = logging.getLogger(__name__)
+
+class FakeLiveBuild:
+    """
+    FakeLiveBuild class, counts the builds and can hold a build until it's released
+    """
+    def __init__(self, input_file):
+        self.input_file = input_file
+        self.generator = FakeGenerator()
+        self.patches = []
+        self.results = []
+        self.started = threading.Semaphore(0)
+        self.release = None
+
+    def build(self, is_superseded):
+        self.started.release()
+        if self.release is not None:
+            self.release.wait(5)
+
+        # Like LiveBuild.build, a superseded build isn't written
+        result = None if is_superseded() else False
+        self.results.append(result)
+        return result
+
+def wait_for(condition, timeout=5):
+    """
+    Waits until the condition is true, and returns whether it is
+    """
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """
+    Returns the path of an empty csv file
+    """
+    path = tmp_path / "mod.csv"
+    path.write_text("", encoding="utf-8")
+    return str(path)
+
+def test_only_saves_of_the_csv_queue_a_build(csv_file):
+    watcher = LiveEditWatcher(FakeLiveBuild(csv_file), DEBOUNCE_MS)
+    other_file = os.path.join(os.path.dirname(csv_file), "other.csv")
+    ignored = [
+        FileModifiedEvent(other_file),
+        FileOpenedEvent(csv_file),
+        FileDeletedEvent(csv_file),
+        DirModifiedEvent(os.path.dirname(csv_file)),
+    ]
+    for event in ignored:
+        watcher.on_any_event(event)
+        assert watcher.last_event is None, event
+
+    # Editors that save by renaming a temporary file over the csv
+    watcher.on_any_event(FileMovedEvent(other_file, csv_file))
+    assert watcher.last_event is not None
+    watcher.last_event = None
+    watcher.on_any_event(FileModifiedEvent(os.path.join(os.path.dirname(csv_file), ".", "mod.csv")))
+    assert watcher.last_event is not None
+
+def test_burst_of_events_builds_once(csv_file):
+    live_build = FakeLiveBuild(csv_file)
+    watcher = LiveEditWatcher(live_build, DEBOUNCE_MS)
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(live_build.results) == 1)
+
+        # Events closer together than the debounce are one save
+        for _ in range(5):
+            watcher.on_any_event(FileModifiedEvent(csv_file))
+            time.sleep(0.01)
+        assert wait_for(lambda: len(live_build.results) == 2)
+        time.sleep(DEBOUNCE_MS / 1000 * 3)
+        assert live_build.results == [False, False]
+    finally:
+        watcher.stop()
+
+def test_save_during_a_build_drops_it(csv_file, caplog):
+    live_build = FakeLiveBuild(csv_file)
+    live_build.release = threading.Event()
+    watcher = LiveEditWatcher(live_build, DEBOUNCE_MS)
+    caplog.set_level(logging.INFO, logger=__name__)
+    watcher.start()
+    try:
+        assert live_build.started.acquire(timeout=5)
+        watcher.on_any_event(FileModifiedEvent(csv_file))
+        live_build.release.set()
+
+        # The first build is dropped, and the save is built once the events settle
+        assert wait_for(lambda: len(live_build.results) == 2)
+        assert live_build.results == [None, False]
+        assert any("Dropped a build" in record.message for record in caplog.records)
+        assert any("Generated the patch" in record.message for record in caplog.records)
+    finally:
+        watcher.stop()
@@ -2,3 +2,5 @@
 Utils module
 """
 from .assembler import Assembler
+from .mips_simulator import MipsSimulator
+from .encoder import Encoder
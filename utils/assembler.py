@@ -5,13 +5,14 @@ import os
 import struct
 import argparse
 from typing import Tuple
-import keystone
 
 class Assembler():
     """
     Assembler class, used to translate assembly code to binary
     """
     def __init__(self, arch: int, mode: int):
+        # Keystone takes a while to import, so it's only imported once it's used
+        import keystone
         self.arch = arch
         self.mode = mode
         self.ks = keystone.Ks(self.arch, self.mode)
@@ -53,6 +54,7 @@ def main():
         return
 
     # Init the assembler
+    import keystone
     assembler = Assembler(keystone.KS_ARCH_MIPS, keystone.KS_MODE_MIPS32 + keystone.KS_MODE_LITTLE_ENDIAN)
 
     # Assemble the code to file
@@ -0,0 +1,64 @@
+"""
+Script for timing how long it takes to render the code lines of a large chunk, comparing
+Chunk.get_code_text against formatting one line per word like the toolkit used to.
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+from generator.pnach import Chunk
+
+# Address of the chunk, the default strings address of Sly 2 NTSC
+CHUNK_ADDRESS = 0x3C7980
+
+def get_code_lines_per_word(address: int, data: bytes, patch_format: str) -> List[str]:
+    """
+    Returns the code lines of the data with one formatted string per word
+    """
+    code_lines = []
+    for i in range(0, len(data), 4):
+        value = int.from_bytes(data[i:i + 4][::-1], "big")
+        if patch_format == "pnach":
+            code_lines.append(f"patch=1,EE,2{address + i:07X},extended,{value:08X}")
+        else:
+            code_lines.append(f"W32 {address + i:08X} 0x{value:08X}")
+    return code_lines
+
+def time_best(func: Callable, runs: int) -> float:
+    """
+    Runs the function the given number of times and returns the fastest time in seconds
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    """
+    Main function, times rendering a chunk of random bytes in each patch format
+    """
+    parser = argparse.ArgumentParser(description="Times rendering the code lines of a large chunk.")
+    parser.add_argument("-s", "--size", type=int, default=4 * 1024 * 1024 + 2, help="Size of the chunk in bytes (default is 4 MB + 2, to include a partial word)")
+    parser.add_argument("--format", type=str, nargs="+", choices=["pnach", "clps2c"], default=["pnach", "clps2c"], help="Patch formats to time (default is both)")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Number of runs of each method, the fastest is kept (default is 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random bytes (default is 0)")
+    args = parser.parse_args()
+
+    data = random.Random(args.seed).getrandbits(args.size * 8).to_bytes(args.size, "little")
+    print(f"Rendering {args.size} bytes at {hex(CHUNK_ADDRESS)}")
+    print(f"{'format':<8} {'per word s':>12} {'get_code_text s':>16} {'speedup':>8}")
+    for patch_format in args.format:
+        chunk = Chunk(CHUNK_ADDRESS, data, patch_format=patch_format)
+
+        # Make sure both methods give the same text before timing them
+        if chunk.get_code_text() != "\n".join(get_code_lines_per_word(CHUNK_ADDRESS, data, patch_format)):
+            raise Exception(f"Error: get_code_text doesn't match the per word lines for {patch_format}")
+
+        per_word = time_best(lambda: "\n".join(get_code_lines_per_word(CHUNK_ADDRESS, data, patch_format)), args.runs)
+        bulk = time_best(chunk.get_code_text, args.runs)
+        print(f"{patch_format:<8} {per_word:>12.3f} {bulk:>16.3f} {per_word / bulk:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Script for measuring how many EE instructions the generated string lookup costs per string load.
+"""
+import argparse
+import csv
+import statistics
+from typing import Dict, List, Tuple
+from generator import Generator
+from generator.generator import LOOKUP_MODES
+from utils.mips_simulator import MipsSimulator
+
+# Fake entry of the game's string table, which the hooked function returns the pointer from
+ORIGINAL_ENTRY_ADDRESS = 0x00000200
+ORIGINAL_STRING_POINTER = 0x00000400
+
+def read_string_ids(csv_file: str, csv_encoding: str = "utf-8") -> List[int]:
+    """
+    Reads the string IDs from the first column of a strings csv
+    """
+    with open(csv_file, 'r', encoding=csv_encoding) as file:
+        return [int(row[0]) for row in csv.reader(file) if len(row) > 1]
+
+def get_miss_ids(string_ids: List[int], count: int) -> List[int]:
+    """
+    Returns up to count IDs that aren't in the list, spread over the range of the list
+    """
+    id_set = set(string_ids)
+    candidates = [i for i in range(max(string_ids, default=0) + 2) if i not in id_set]
+    step = max(1, len(candidates) // max(1, count))
+    return candidates[::step][:count]
+
+def load_mod(generator: Generator, csv_file: str, csv_encoding: str = "utf-8") -> Tuple[MipsSimulator, Dict[int, int]]:
+    """
+    Generates the mod for the csv and loads it into a simulator's memory, along with
+    a fake string table entry for the hooked function to load the original pointer from.
+    Returns the simulator and the pointer to the custom string of each string ID.
+    """
+    result = generator.build(csv_file, csv_encoding=csv_encoding)
+    simulator = MipsSimulator()
+    for chunk in result.chunks:
+        simulator.load(chunk.get_address(), chunk.get_bytes())
+    simulator.write_word(ORIGINAL_ENTRY_ADDRESS + 4, ORIGINAL_STRING_POINTER)
+    return simulator, dict(result.string_pointers)
+
+def measure_lookups(simulator: MipsSimulator, hook_address: int, string_ids: List[int], expected_pointers: Dict[int, int]) -> Tuple[List[int], int]:
+    """
+    Runs the hooked function once for each string ID. Returns the instruction count
+    of each lookup and the number of lookups that returned the wrong pointer.
+    """
+    counts = []
+    errors = 0
+    for string_id in string_ids:
+        # Set both registers the hook delay slot can load the original pointer from
+        simulator.set_register("a0", ORIGINAL_ENTRY_ADDRESS)
+        simulator.set_register("v1", ORIGINAL_ENTRY_ADDRESS)
+        simulator.set_register("a1", string_id)
+        counts.append(simulator.run(hook_address))
+
+        # Custom strings should get the pointer to their string, all other strings the original one
+        if simulator.get_register("v0") != expected_pointers.get(string_id, ORIGINAL_STRING_POINTER):
+            errors += 1
+
+    return counts, errors
+
+def format_counts(counts: List[int]) -> str:
+    """
+    Formats the min/mean/max of a list of instruction counts
+    """
+    if len(counts) == 0:
+        return "-"
+    return f"{min(counts)}/{statistics.mean(counts):.1f}/{max(counts)}"
+
+def main():
+    """
+    Main function, benchmarks each lookup mode on the given csv
+    """
+    # parse command line arguments
+    parser = argparse.ArgumentParser(description="Measures the instructions per string lookup of the generated code.")
+    parser.add_argument("input_file", help="The strings csv file.")
+    parser.add_argument("-g", "--game", type=int, default=2, help="Which game to generate the code for (default is 2)")
+    parser.add_argument("-r", "--region", type=str, default="ntsc", help="Which region to generate the code for (default is ntsc)")
+    parser.add_argument("-e", "--csv_encoding", type=str, default="utf-8", help="Encoding of the input CSV file (default is utf-8)")
+    parser.add_argument("-m", "--misses", type=int, default=1000, help="Number of string IDs not in the csv to look up (default is 1000)")
+    parser.add_argument("--lookup", type=str, nargs="+", choices=LOOKUP_MODES, default=LOOKUP_MODES, help="Lookup modes to benchmark (default is all)")
+    parser.add_argument("--range-threshold", type=int, default=3, help="Range threshold for the ranges lookup mode (default is 3)")
+    args = parser.parse_args()
+
+    hit_ids = read_string_ids(args.input_file, args.csv_encoding)
+    miss_ids = get_miss_ids(hit_ids, args.misses)
+    print(f"Looking up {len(hit_ids)} hits and {len(miss_ids)} misses from {args.input_file}")
+    print(f"{'lookup':<10} {'hits min/mean/max':>20} {'misses min/mean/max':>20} {'errors':>7}")
+
+    for lookup in args.lookup:
+        generator = Generator(args.game, args.region, lookup=lookup, range_threshold=args.range_threshold)
+        simulator, expected_pointers = load_mod(generator, args.input_file, args.csv_encoding)
+        hit_counts, hit_errors = measure_lookups(simulator, generator.hook_adr, hit_ids, expected_pointers)
+        miss_counts, miss_errors = measure_lookups(simulator, generator.hook_adr, miss_ids, expected_pointers)
+        print(f"{lookup:<10} {format_counts(hit_counts):>20} {format_counts(miss_counts):>20} {hit_errors + miss_errors:>7}")
+
+if __name__ == "__main__":
+    main()
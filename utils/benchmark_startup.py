@@ -0,0 +1,91 @@
+"""
+Script for measuring how long stringtoolkit.py takes to start, for --help and for a small build.
+Each run is a new Python process, like when an editor runs the tool.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+# Path of the toolkit's main script
+TOOLKIT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "stringtoolkit.py")
+
+def write_csv(csv_file: str, num_rows: int) -> None:
+    """
+    Writes a strings csv with the given number of rows
+    """
+    with open(csv_file, "w", encoding="utf-8", newline="\n") as file:
+        for i in range(num_rows):
+            file.write(f"{1000 + i},String number {i}\n")
+
+def time_runs(args: List[str], runs: int) -> List[float]:
+    """
+    Runs the toolkit with the arguments the given number of times and returns how long each run took in ms
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, TOOLKIT_SCRIPT] + args, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def get_slowest_imports(args: List[str], count: int) -> List[tuple]:
+    """
+    Returns the modules that took the longest to import (including their own imports) when
+    running the toolkit with the arguments, as (module, ms) pairs
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", TOOLKIT_SCRIPT] + args, check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # Only count the top-level imports, the others are part of them
+        module = parts[2].rstrip()
+        if module.startswith("  "):
+            continue
+        imports.append((module.strip(), int(parts[1]) / 1000))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return imports[:count]
+
+def format_times(times: List[float]) -> str:
+    """
+    Formats the min/mean/max of a list of times
+    """
+    return f"{min(times):.1f}/{statistics.mean(times):.1f}/{max(times):.1f}"
+
+def main():
+    """
+    Main function, times the cold start of --help and of a small build
+    """
+    parser = argparse.ArgumentParser(description="Measures the cold start time of stringtoolkit.py.")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Number of runs of each command (default is 10)")
+    parser.add_argument("--rows", type=int, default=10, help="Number of rows in the csv of the build (default is 10)")
+    parser.add_argument("-g", "--game", type=str, default="2", help="Which game to build for (default is 2)")
+    parser.add_argument("-r", "--region", type=str, default="ntsc", help="Which region to build for (default is ntsc)")
+    parser.add_argument("--imports", type=int, default=5, help="Number of the slowest imports to show for each command (default is 5)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_file = os.path.join(temp_dir, "startup.csv")
+        write_csv(csv_file, args.rows)
+        commands = [
+            ("--help", ["--help"]),
+            (f"{args.rows}-row build", [csv_file, "-g", args.game, "-r", args.region, "-o", temp_dir]),
+        ]
+
+        print(f"{'command':<16} {'min/mean/max ms':>20}")
+        for name, command in commands:
+            print(f"{name:<16} {format_times(time_runs(command, args.runs)):>20}")
+
+        for name, command in commands:
+            imports = get_slowest_imports(command, args.imports)
+            print(f"Slowest imports for {name}: " + ", ".join(f"{module} {ms:.1f} ms" for module, ms in imports))
+
+if __name__ == "__main__":
+    main()
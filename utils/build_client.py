@@ -0,0 +1,90 @@
+"""
+This file contains a thin client for the build server (`python stringtoolkit.py serve`). It only
+uses the standard library, so it starts quickly and exits as soon as the server replies.
+
+Run it as a script (`python utils/build_client.py`) rather than as a module of the utils package,
+which would import the assembler.
+"""
+import os
+import sys
+import json
+import socket
+import argparse
+
+def get_default_socket_path() -> str:
+    """
+    Returns the default path of the build server's Unix socket
+    """
+    runtime_dir = os.environ.get("TMPDIR" if sys.platform == "darwin" else "XDG_RUNTIME_DIR", "/tmp")
+    return os.path.join(runtime_dir, "sly-string-toolkit.sock")
+
+def send_request(request: dict, socket_path: str = None) -> dict:
+    """
+    Sends a build request to the server and returns its reply. Requests and replies are
+    JSON objects on a single line.
+    """
+    path = get_default_socket_path() if socket_path is None else socket_path
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError as err:
+        sock.close()
+        raise Exception(f"Error: Couldn't connect to the build server at {path}, is it running? ({err})")
+
+    with sock, sock.makefile("rb") as reply_file:
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        reply = reply_file.readline()
+    if not reply:
+        raise Exception("Error: The build server closed the connection without replying")
+    return json.loads(reply)
+
+def main():
+    """
+    Main function, sends a build request to the server and prints the output file or the patch text
+    """
+    parser = argparse.ArgumentParser(description='Builds a patch on the running build server.')
+    parser.add_argument('input_file', type=str, help='Input CSV file')
+    parser.add_argument('-g', '--game', type=int, required=True, help='Which game the mod supports, as a number (2 or 3)')
+    parser.add_argument('-r', '--region', type=str, required=True, help='Which region the mod supports (ntsc or pal)')
+    parser.add_argument('-l', '--lang', type=str, help='Game language the mod should affect (default affects all languages)')
+    parser.add_argument('-n', '--name', type=str, help='Name of the mod (default is same as input file)')
+    parser.add_argument('-a', '--author', type=str, help='Name of the author (default is Sly String Toolkit)')
+    parser.add_argument('-o', '--output-dir', type=str, help='Output directory (default prints the patch instead of writing a file)')
+    parser.add_argument('-e', '--csv_encoding', type=str, help='Encoding of the input CSV file (default is utf-8)')
+    parser.add_argument('--clps2c', action='store_true', help='Output CLPS2C code instead of pnach')
+    parser.add_argument('--socket', type=str, help='Path of the build server socket')
+    parser.add_argument('--timings', action='store_true', help='Print how long the server took')
+    args = parser.parse_args()
+
+    # The server has its own working directory
+    request = {
+        "csv": os.path.abspath(args.input_file),
+        "game": args.game,
+        "region": args.region,
+        "lang": args.lang,
+        "format": "clps2c" if args.clps2c else "pnach",
+    }
+    if args.output_dir is not None:
+        request["output_dir"] = os.path.abspath(args.output_dir)
+    for key in ["name", "author", "csv_encoding"]:
+        if getattr(args, key) is not None:
+            request[key] = getattr(args, key)
+
+    try:
+        reply = send_request(request, args.socket)
+    except Exception as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)
+
+    if "error" in reply:
+        print(reply["error"], file=sys.stderr)
+    elif "outfile" in reply:
+        print(f"Wrote pnach file to {reply['outfile']}")
+    else:
+        sys.stdout.write(reply["text"])
+    if args.timings:
+        print(", ".join(f"{key} {value:.1f} ms" for key, value in reply.get("timings", {}).items()), file=sys.stderr)
+    sys.exit(1 if "error" in reply else 0)
+
+if __name__ == "__main__":
+    main()
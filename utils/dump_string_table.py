@@ -2,6 +2,22 @@
 Script for extracting the string table from a ps2 memory dump to a csv file.
 """
 import argparse
+from typing import List, Tuple
+
+def read_string_table(mem: bytes, string_table_start: int, max_entries: int = 1000) -> List[Tuple[int, int]]:
+    """
+    Reads the id/string pointer pairs of the string table starting at the given offset in a
+    memory dump, up to the first entry with a null pointer or an invalid ID.
+    """
+    entries = []
+    cur = string_table_start
+    while len(entries) < max_entries:
+        string_id, string_pointer = int.from_bytes(mem[cur:cur+4], "little"), int.from_bytes(mem[cur+4:cur+8], "little")
+        if (string_pointer == 0x000000) or (string_id > 0xFFFF):
+            break
+        entries.append((string_id, string_pointer))
+        cur += 8
+    return entries
 
 def dump_string_table(mem: bytes, string_table_start: int, mem_dump_start: int = 0x00000000):
     """
@@ -9,16 +25,8 @@ def dump_string_table(mem: bytes, string_table_start: int, mem_dump_start: int =
     The original string table is an array list of id/string pointer pairs.
     """
     with open("strings.csv", "w+", encoding="iso-8859-1") as file:
-        cur = string_table_start
-        i = 0
-
-        while True:
-            i += 1
-
-            string_id, string_pointer = int.from_bytes(mem[cur:cur+4], "little"), int.from_bytes(mem[cur+4:cur+8], "little")
+        for string_id, string_pointer in read_string_table(mem, string_table_start):
             print(f"{string_id:X}, {string_pointer:X}")
-            if (string_pointer == 0x000000) or (string_id > 0xFFFF) or (i > 1000):
-                break
             string_pointer = string_pointer - mem_dump_start
 
             string = ""
@@ -35,7 +43,6 @@ def dump_string_table(mem: bytes, string_table_start: int, mem_dump_start: int =
                 # if so, wrap the string in quotation marks
                 string = f"\"{string}\""
             file.write(f"{string_id},{string}\n")
-            cur += 8
 
 if __name__ == "__main__":
     # get the command line arguments
@@ -0,0 +1,241 @@
+"""
+This file contains the Encoder class which turns the MIPS instructions used by the
+generator into machine code directly, without going through assembly text and Keystone
+"""
+import re
+import struct
+from typing import List, Tuple
+
+REGISTERS = {name: index for index, name in enumerate([
+    "$zero", "$at", "$v0", "$v1", "$a0", "$a1", "$a2", "$a3",
+    "$t0", "$t1", "$t2", "$t3", "$t4", "$t5", "$t6", "$t7",
+    "$s0", "$s1", "$s2", "$s3", "$s4", "$s5", "$s6", "$s7",
+    "$t8", "$t9", "$k0", "$k1", "$gp", "$sp", "$fp", "$ra",
+])}
+
+# Opcodes of the I-type instructions
+IMMEDIATE_OPCODES = {"addiu": 0x09, "sltiu": 0x0B, "andi": 0x0C, "ori": 0x0D}
+MEMORY_OPCODES = {"lw": 0x23, "lbu": 0x24, "lhu": 0x25, "sb": 0x28, "sw": 0x2B}
+BRANCH_OPCODES = {"beq": 0x04, "bne": 0x05}
+
+# Values that fit in the 16-bit immediate of each instruction: arithmetic sign-extends it,
+# logic zero-extends it
+SIGNED_RANGE = (-0x8000, 0x7FFF)
+UNSIGNED_RANGE = (0, 0xFFFF)
+IMMEDIATE_RANGES = {"addiu": SIGNED_RANGE, "sltiu": SIGNED_RANGE, "andi": UNSIGNED_RANGE, "ori": UNSIGNED_RANGE}
+
+# Function codes of the R-type instructions
+REGISTER_FUNCTS = {"addu": 0x21, "subu": 0x23, "and": 0x24, "or": 0x25, "xor": 0x26, "sltu": 0x2B}
+SHIFT_FUNCTS = {"sll": 0x00, "srl": 0x02}
+
+MEMORY_OPERAND = re.compile(r"^(-?(?:0x[0-9a-fA-F]+|\d+))\((\$\w+)\)$")
+
+class Encoder:
+    """
+    Encoder class, builds a block of MIPS machine code one instruction at a time.
+    Delay slots are never filled automatically, like Keystone with .set noreorder.
+    """
+    def __init__(self, keep_asm: bool = False):
+        """
+        Initializes an empty block of code. If keep_asm is set, the matching assembly
+        text is also kept so it can be printed or cross-checked with Keystone.
+        """
+        self._words: List[int] = []
+        self._labels = {}
+        self._branches: List[Tuple[int, str]] = []
+        self._asm_lines = [".set noreorder"] if keep_asm else None
+
+    def _emit(self, word: int, mnemonic: str, *operands) -> None:
+        """
+        Appends an encoded instruction
+        """
+        self._words.append(word)
+        if self._asm_lines is not None:
+            self._asm_lines.append(f"{mnemonic} {', '.join(str(operand) for operand in operands)}".rstrip())
+
+    @staticmethod
+    def _check_range(mnemonic: str, value: int, value_range: Tuple[int, int]) -> None:
+        """
+        Raises an exception if the operand doesn't fit in the instruction
+        """
+        low, high = value_range
+        if not low <= value <= high:
+            raise ValueError(f"Operand {hex(value)} of {mnemonic} is out of range ({hex(low)} to {hex(high)})")
+
+    def label(self, name: str) -> None:
+        """
+        Marks the position of the next instruction with a label
+        """
+        if name in self._labels:
+            raise ValueError(f"Label {name} is already defined")
+        self._labels[name] = len(self._words)
+        if self._asm_lines is not None:
+            self._asm_lines.append(f"{name}:")
+
+    def comment(self, text: str) -> None:
+        """
+        Adds a comment to the assembly text
+        """
+        if self._asm_lines is not None:
+            self._asm_lines.append(f"# {text}")
+
+    # Instructions
+    def register(self, mnemonic: str, rd: str, rs: str, rt: str) -> None:
+        """
+        Encodes a three register instruction (addu, subu, and, or, xor, sltu)
+        """
+        word = (REGISTERS[rs] << 21) | (REGISTERS[rt] << 16) | (REGISTERS[rd] << 11) | REGISTER_FUNCTS[mnemonic]
+        self._emit(word, mnemonic, rd, rs, rt)
+
+    def shift(self, mnemonic: str, rd: str, rt: str, shamt: int) -> None:
+        """
+        Encodes a shift by a constant (sll, srl)
+        """
+        self._check_range(mnemonic, shamt, (0, 0x1F))
+        word = (REGISTERS[rt] << 16) | (REGISTERS[rd] << 11) | (shamt << 6) | SHIFT_FUNCTS[mnemonic]
+        self._emit(word, mnemonic, rd, rt, shamt)
+
+    def immediate(self, mnemonic: str, rt: str, rs: str, imm: int) -> None:
+        """
+        Encodes an instruction with a 16-bit immediate (addiu, sltiu, andi, ori)
+        """
+        self._check_range(mnemonic, imm, IMMEDIATE_RANGES[mnemonic])
+        word = (IMMEDIATE_OPCODES[mnemonic] << 26) | (REGISTERS[rs] << 21) | (REGISTERS[rt] << 16) | (imm & 0xFFFF)
+        self._emit(word, mnemonic, rt, rs, hex(imm))
+
+    def memory(self, mnemonic: str, rt: str, offset: int, base: str) -> None:
+        """
+        Encodes a load or store (lw, lbu, lhu, sb, sw)
+        """
+        self._check_range(mnemonic, offset, SIGNED_RANGE)
+        word = (MEMORY_OPCODES[mnemonic] << 26) | (REGISTERS[base] << 21) | (REGISTERS[rt] << 16) | (offset & 0xFFFF)
+        self._emit(word, mnemonic, rt, f"{hex(offset)}({base})")
+
+    def branch(self, mnemonic: str, rs: str, rt: str, label: str) -> None:
+        """
+        Encodes a conditional branch (beq, bne) to a label
+        """
+        self._branches.append((len(self._words), label))
+        word = (BRANCH_OPCODES[mnemonic] << 26) | (REGISTERS[rs] << 21) | (REGISTERS[rt] << 16)
+        self._emit(word, mnemonic, rs, rt, label)
+
+    def lui(self, rt: str, imm: int) -> None:
+        """
+        Encodes a load upper immediate
+        """
+        self._check_range("lui", imm, UNSIGNED_RANGE)
+        self._emit((0x0F << 26) | (REGISTERS[rt] << 16) | imm, "lui", rt, hex(imm))
+
+    def ori(self, rt: str, rs: str, imm: int) -> None:
+        """
+        Encodes a bitwise or with an immediate
+        """
+        self.immediate("ori", rt, rs, imm)
+
+    def load_imm(self, reg: str, value: int) -> None:
+        """
+        Loads a 32-bit value into a register, using a single ori if it fits in 16 bits
+        """
+        if value <= 0xFFFF:
+            self.ori(reg, "$zero", value)
+        else:
+            self.lui(reg, value >> 16)
+            self.ori(reg, reg, value & 0xFFFF)
+
+    def multu(self, rs: str, rt: str) -> None:
+        """
+        Encodes an unsigned multiply into hi/lo
+        """
+        self._emit((REGISTERS[rs] << 21) | (REGISTERS[rt] << 16) | 0x19, "multu", rs, rt)
+
+    def mfhi(self, rd: str) -> None:
+        """
+        Encodes a move from hi
+        """
+        self._emit((REGISTERS[rd] << 11) | 0x10, "mfhi", rd)
+
+    def mflo(self, rd: str) -> None:
+        """
+        Encodes a move from lo
+        """
+        self._emit((REGISTERS[rd] << 11) | 0x12, "mflo", rd)
+
+    def j(self, address: int) -> None:
+        """
+        Encodes a jump to an absolute address
+        """
+        # The upper 4 bits of the target come from the jump's own address, which is in the first 256 MB
+        self._check_range("j", address, (0, 0x0FFFFFFC))
+        if address & 3 != 0:
+            raise ValueError(f"Jump target {hex(address)} is not word aligned")
+        self._emit((0x02 << 26) | ((address >> 2) & 0x3FFFFFF), "j", hex(address))
+
+    def jr(self, rs: str) -> None:
+        """
+        Encodes a jump to the address in a register
+        """
+        self._emit((REGISTERS[rs] << 21) | 0x08, "jr", rs)
+
+    def nop(self) -> None:
+        """
+        Encodes a nop
+        """
+        self._emit(0, "nop")
+
+    def parse(self, line: str) -> None:
+        """
+        Encodes a single line of assembly text, such as the hook delay slot of a game
+        """
+        mnemonic, _, rest = line.strip().partition(" ")
+        operands = [operand.strip() for operand in rest.split(",") if operand.strip() != ""]
+
+        if mnemonic in REGISTER_FUNCTS:
+            self.register(mnemonic, *operands)
+        elif mnemonic in SHIFT_FUNCTS:
+            self.shift(mnemonic, operands[0], operands[1], int(operands[2], 0))
+        elif mnemonic in IMMEDIATE_OPCODES:
+            self.immediate(mnemonic, operands[0], operands[1], int(operands[2], 0))
+        elif mnemonic in MEMORY_OPCODES:
+            match = MEMORY_OPERAND.match(operands[1])
+            if match is None:
+                raise ValueError(f"Invalid memory operand in '{line}'")
+            self.memory(mnemonic, operands[0], int(match.group(1), 0), match.group(2))
+        elif mnemonic in BRANCH_OPCODES:
+            self.branch(mnemonic, *operands)
+        elif mnemonic == "lui":
+            self.lui(operands[0], int(operands[1], 0))
+        elif mnemonic == "j":
+            self.j(int(operands[0], 0))
+        elif mnemonic in ("jr", "mfhi", "mflo", "multu", "nop"):
+            getattr(self, mnemonic)(*operands)
+        else:
+            raise ValueError(f"Unsupported instruction '{line}'")
+
+    # Output
+    def get_asm(self) -> str:
+        """
+        Returns the assembly text of the code (only if keep_asm was set)
+        """
+        if self._asm_lines is None:
+            raise ValueError("Encoder was created without keep_asm")
+        return '\n'.join(self._asm_lines) + '\n'
+
+    def get_bytes(self) -> bytes:
+        """
+        Resolves the branch labels and returns the little-endian machine code
+        """
+        words = list(self._words)
+        for index, label in self._branches:
+            if label not in self._labels:
+                raise ValueError(f"Undefined label {label}")
+            offset = self._labels[label] - index - 1
+            if not -0x8000 <= offset <= 0x7FFF:
+                raise ValueError(f"Branch to {label} is out of range")
+            words[index] |= offset & 0xFFFF
+        return struct.pack(f'<{len(words)}I', *words)
+
+    def __len__(self) -> int:
+        """
+        Returns the size of the code in bytes
+        """
+        return len(self._words) * 4
@@ -0,0 +1,198 @@
+"""
+This file contains the MipsSimulator class, which runs the MIPS code generated by the
+toolkit so the cost of a string lookup can be measured without booting an emulator
+"""
+from typing import Dict
+
+REGISTER_NAMES = [
+    "zero", "at", "v0", "v1", "a0", "a1", "a2", "a3",
+    "t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7",
+    "s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7",
+    "t8", "t9", "k0", "k1", "gp", "sp", "fp", "ra",
+]
+
+# Address the simulated code returns to when it's done
+RETURN_ADDRESS = 0x00000100
+
+WORD_MASK = 0xFFFFFFFF
+
+def sign_extend(value: int) -> int:
+    """
+    Sign extends a 16-bit immediate to 32 bits
+    """
+    return (value | ~0xFFFF) & WORD_MASK if value & 0x8000 else value
+
+class MipsSimulator:
+    """
+    MipsSimulator class, interprets the subset of MIPS instructions that the
+    generator emits, including branch delay slots
+    """
+    def __init__(self):
+        """
+        Initializes the simulator with empty memory and cleared registers
+        """
+        self.memory: Dict[int, int] = {}
+        self.registers = [0] * 32
+        self.hi = 0
+        self.lo = 0
+        self.instruction_count = 0
+
+    def load(self, address: int, data: bytes) -> None:
+        """
+        Writes the given bytes to memory starting at the given address
+        """
+        for i, byte in enumerate(data):
+            self.write_byte(address + i, byte)
+
+    def read_word(self, address: int) -> int:
+        """
+        Reads a little-endian word from memory
+        """
+        if address & 3:
+            raise ValueError(f"Unaligned word read at {hex(address)}")
+        return self.memory.get(address, 0)
+
+    def write_word(self, address: int, value: int) -> None:
+        """
+        Writes a little-endian word to memory
+        """
+        if address & 3:
+            raise ValueError(f"Unaligned word write at {hex(address)}")
+        self.memory[address] = value & WORD_MASK
+
+    def read_half(self, address: int) -> int:
+        """
+        Reads a little-endian halfword from memory
+        """
+        if address & 1:
+            raise ValueError(f"Unaligned halfword read at {hex(address)}")
+        return (self.read_word(address & ~3) >> ((address & 2) * 8)) & 0xFFFF
+
+    def read_byte(self, address: int) -> int:
+        """
+        Reads a byte from memory
+        """
+        return (self.read_word(address & ~3) >> ((address & 3) * 8)) & 0xFF
+
+    def write_byte(self, address: int, value: int) -> None:
+        """
+        Writes a byte to memory
+        """
+        shift = (address & 3) * 8
+        word = self.read_word(address & ~3) & ~(0xFF << shift)
+        self.write_word(address & ~3, word | ((value & 0xFF) << shift))
+
+    def get_register(self, name: str) -> int:
+        """
+        Returns the value of the register with the given name (without the $)
+        """
+        return self.registers[REGISTER_NAMES.index(name)]
+
+    def set_register(self, name: str, value: int) -> None:
+        """
+        Sets the value of the register with the given name (without the $)
+        """
+        index = REGISTER_NAMES.index(name)
+        if index != 0:
+            self.registers[index] = value & WORD_MASK
+
+    def run(self, address: int, max_instructions: int = 1000000) -> int:
+        """
+        Runs the code at the given address until it returns to $ra, and returns
+        the number of instructions executed (including delay slots)
+        """
+        self.set_register("ra", RETURN_ADDRESS)
+        self.instruction_count = 0
+
+        pc = address
+        next_pc = address + 4
+        while pc != RETURN_ADDRESS:
+            if self.instruction_count >= max_instructions:
+                raise ValueError(f"Code at {hex(address)} did not return after {max_instructions} instructions")
+            target = self._execute(pc, self.read_word(pc))
+            self.instruction_count += 1
+            pc, next_pc = next_pc, (next_pc + 4 if target is None else target)
+
+        return self.instruction_count
+
+    def _execute(self, pc: int, word: int):
+        """
+        Executes a single instruction and returns the jump target if it's a taken branch
+        """
+        regs = self.registers
+        opcode = word >> 26
+        rs = (word >> 21) & 0x1F
+        rt = (word >> 16) & 0x1F
+        rd = (word >> 11) & 0x1F
+        shamt = (word >> 6) & 0x1F
+        imm = word & 0xFFFF
+
+        target = None
+        dest = None
+        value = 0
+
+        if opcode == 0x00:
+            funct = word & 0x3F
+            dest = rd
+            if funct == 0x00: # sll (and nop)
+                value = regs[rt] << shamt
+            elif funct == 0x02: # srl
+                value = regs[rt] >> shamt
+            elif funct == 0x08: # jr
+                target = regs[rs]
+                dest = None
+            elif funct == 0x10: # mfhi
+                value = self.hi
+            elif funct == 0x12: # mflo
+                value = self.lo
+            elif funct == 0x19: # multu
+                product = regs[rs] * regs[rt]
+                self.hi = (product >> 32) & WORD_MASK
+                self.lo = product & WORD_MASK
+                dest = None
+            elif funct == 0x21: # addu
+                value = regs[rs] + regs[rt]
+            elif funct == 0x23: # subu
+                value = regs[rs] - regs[rt]
+            elif funct == 0x24: # and
+                value = regs[rs] & regs[rt]
+            elif funct == 0x25: # or
+                value = regs[rs] | regs[rt]
+            elif funct == 0x26: # xor
+                value = regs[rs] ^ regs[rt]
+            elif funct == 0x2B: # sltu
+                value = int(regs[rs] < regs[rt])
+            else:
+                raise ValueError(f"Unsupported instruction {word:08X} at {hex(pc)}")
+        elif opcode == 0x02: # j
+            target = ((pc + 4) & 0xF0000000) | ((word & 0x3FFFFFF) << 2)
+        elif opcode in (0x04, 0x05): # beq, bne
+            if (regs[rs] == regs[rt]) == (opcode == 0x04):
+                target = (pc + 4 + (sign_extend(imm) << 2)) & WORD_MASK
+        elif opcode == 0x09: # addiu
+            dest, value = rt, regs[rs] + sign_extend(imm)
+        elif opcode == 0x0B: # sltiu
+            dest, value = rt, int(regs[rs] < sign_extend(imm))
+        elif opcode == 0x0C: # andi
+            dest, value = rt, regs[rs] & imm
+        elif opcode == 0x0D: # ori
+            dest, value = rt, regs[rs] | imm
+        elif opcode == 0x0F: # lui
+            dest, value = rt, imm << 16
+        elif opcode == 0x23: # lw
+            dest, value = rt, self.read_word((regs[rs] + sign_extend(imm)) & WORD_MASK)
+        elif opcode == 0x24: # lbu
+            dest, value = rt, self.read_byte((regs[rs] + sign_extend(imm)) & WORD_MASK)
+        elif opcode == 0x25: # lhu
+            dest, value = rt, self.read_half((regs[rs] + sign_extend(imm)) & WORD_MASK)
+        elif opcode == 0x28: # sb
+            self.write_byte((regs[rs] + sign_extend(imm)) & WORD_MASK, regs[rt])
+        elif opcode == 0x2B: # sw
+            self.write_word((regs[rs] + sign_extend(imm)) & WORD_MASK, regs[rt])
+        else:
+            raise ValueError(f"Unsupported instruction {word:08X} at {hex(pc)}")
+
+        if dest:
+            regs[dest] = value & WORD_MASK
+
+        return target
@@ -0,0 +1,176 @@
+"""
+This file contains the PineClient class, which talks to a running emulator (like PCSX2) over the
+PINE IPC protocol to read and write EE memory.
+
+Each message is a little-endian u32 with the size of the whole message, followed by one or
+more commands (an opcode byte and its arguments). The reply is the u32 size, a result byte
+(0 for success) and the data returned by each command, in order.
+"""
+import os
+import socket
+import struct
+import sys
+import argparse
+from typing import List, Tuple
+
+# Default PINE slot of PCSX2, which is also the TCP port on Windows
+DEFAULT_SLOT = 28011
+
+# Largest message the emulator accepts, and largest reply it sends
+MAX_IPC_SIZE = 650000
+MAX_IPC_RETURN_SIZE = 450000
+
+# Command opcodes
+MSG_READ8 = 0x00
+MSG_READ16 = 0x01
+MSG_READ32 = 0x02
+MSG_WRITE32 = 0x06
+MSG_VERSION = 0x08
+
+# Result codes
+IPC_OK = 0x00
+IPC_FAIL = 0xFF
+
+def get_socket_path(slot: int = DEFAULT_SLOT) -> str:
+    """
+    Returns the path of the emulator's PINE socket for the slot (Linux and macOS)
+    """
+    runtime_dir = os.environ.get("TMPDIR" if sys.platform == "darwin" else "XDG_RUNTIME_DIR", "/tmp")
+    if slot == DEFAULT_SLOT:
+        return os.path.join(runtime_dir, "pcsx2.sock")
+    return os.path.join(runtime_dir, f"pcsx2.sock.{slot}")
+
+class PineClient:
+    """
+    PineClient class, a connection to the emulator's PINE server
+    """
+    def __init__(self, slot: int = DEFAULT_SLOT, socket_path: str = None):
+        """
+        Initializes the client for the given slot, or for a Unix socket at socket_path.
+        Windows uses a TCP connection on the slot's port instead.
+        """
+        self.slot = slot
+        self.socket_path = socket_path
+        self.sock = None
+
+    def connect(self) -> None:
+        """
+        Connects to the emulator, if not already connected
+        """
+        if self.sock is not None:
+            return
+
+        if self.socket_path is None and os.name == "nt":
+            self.sock = socket.create_connection(("127.0.0.1", self.slot))
+            return
+
+        path = get_socket_path(self.slot) if self.socket_path is None else self.socket_path
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError as err:
+            sock.close()
+            raise Exception(f"Error: Couldn't connect to the emulator at {path}, is PINE enabled? ({err})")
+        self.sock = sock
+
+    def close(self) -> None:
+        """
+        Closes the connection
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _send(self, commands: bytes, reply_size: int) -> bytes:
+        """
+        Sends one message with the commands and returns the data of the reply
+        """
+        self.connect()
+        try:
+            self.sock.sendall(struct.pack('<I', len(commands) + 4) + commands)
+            reply = self._recv_exactly(4)
+            size = struct.unpack('<I', reply)[0]
+            reply = self._recv_exactly(size - 4)
+        except OSError:
+            # Reconnect on the next message, in case the emulator was restarted
+            self.close()
+            raise
+
+        if reply[0] != IPC_OK:
+            raise Exception("Error: The emulator couldn't run the PINE commands")
+        if len(reply) - 1 != reply_size:
+            raise Exception(f"Error: Expected {reply_size} bytes of PINE reply data, got {len(reply) - 1}")
+        return reply[1:]
+
+    def _recv_exactly(self, size: int) -> bytes:
+        """
+        Receives exactly the given number of bytes from the socket
+        """
+        data = bytearray()
+        while len(data) < size:
+            part = self.sock.recv(size - len(data))
+            if not part:
+                self.close()
+                raise ConnectionError("The emulator closed the PINE connection")
+            data += part
+        return bytes(data)
+
+    def write32_batch(self, words: List[Tuple[int, int]]) -> int:
+        """
+        Writes the (address, value) words in order, packing as many Write32 commands into
+        each message as fit. Returns the number of messages sent.
+        """
+        command_size = 9
+        words_per_message = (MAX_IPC_SIZE - 4) // command_size
+        num_messages = 0
+        for start in range(0, len(words), words_per_message):
+            commands = b''.join(struct.pack('<BII', MSG_WRITE32, address, value) for address, value in words[start:start + words_per_message])
+            self._send(commands, 0)
+            num_messages += 1
+        return num_messages
+
+    def read16_batch(self, addresses: List[int]) -> List[int]:
+        """
+        Reads the 16-bit values at the addresses, packing the Read16 commands into as few messages as fit
+        """
+        reads_per_message = min((MAX_IPC_SIZE - 4) // 5, (MAX_IPC_RETURN_SIZE - 5) // 2)
+        values = []
+        for start in range(0, len(addresses), reads_per_message):
+            batch = addresses[start:start + reads_per_message]
+            commands = b''.join(struct.pack('<BI', MSG_READ16, address) for address in batch)
+            reply = self._send(commands, len(batch) * 2)
+            values += struct.unpack(f'<{len(batch)}H', reply)
+        return values
+
+    def read32(self, address: int) -> int:
+        """
+        Reads the 32-bit value at the address
+        """
+        return struct.unpack('<I', self._send(struct.pack('<BI', MSG_READ32, address), 4))[0]
+
+    def write32(self, address: int, value: int) -> None:
+        """
+        Writes the 32-bit value to the address
+        """
+        self.write32_batch([(address, value)])
+
+def main():
+    """
+    Main function, reads or writes a word of EE memory in the running emulator
+    """
+    parser = argparse.ArgumentParser(description='Reads or writes a 32-bit word of EE memory over PINE.')
+    parser.add_argument('address', type=str, help='Address of the word, in hex')
+    parser.add_argument('value', type=str, nargs='?', help='Value to write, in hex (reads the word if not set)')
+    parser.add_argument('--slot', type=int, help=f'PINE slot of the emulator (default is {DEFAULT_SLOT})', default=DEFAULT_SLOT)
+    args = parser.parse_args()
+
+    client = PineClient(args.slot)
+    address = int(args.address, 16)
+    if args.value is None:
+        print(f"{address:08X}: {client.read32(address):08X}")
+    else:
+        client.write32(address, int(args.value, 16))
+    client.close()
+
+if __name__ == "__main__":
+    main()